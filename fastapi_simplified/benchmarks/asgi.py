@@ -0,0 +1,49 @@
+import asyncio
+
+
+async def asgi_get(app, path:str) -> tuple[int, bytes]:
+    """
+    Call an ASGI application with a `GET` request the way a server would, without a network or an
+    HTTP client, so that benchmarks only measure the application.
+
+    Parameters
+    ----------
+    * app : `ASGIApp` \\
+        The application.
+    * path : `str` \\
+        The requested path, without a query string.
+
+    Returns
+    -------
+    * `tuple[int, bytes]` \\
+        The status code and the body of the response.
+    """
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 50000), "server": ("benchmark", 80),
+    }
+    status, body = None, []
+    requested, finished = False, asyncio.Event()
+
+    async def receive():
+        # The request has no body. After it, the client only disconnects once the response is complete,
+        # which streaming responses wait for
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    return status, b"".join(body)
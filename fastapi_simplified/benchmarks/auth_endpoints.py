@@ -0,0 +1,316 @@
+"""
+In-process load and latency benchmark of `auth_router`.
+
+Runs `/signUp`, `/token` and `/me` against a throw-away SQLite database (or `--database-url`) at a
+given concurrency, and reports throughput and p50/p95/p99 latency per endpoint and per phase
+(token encode/decode, database, credential check, password hash/verify, response serialization).
+
+```bash
+python -m fastapi_simplified.benchmarks.auth_endpoints --users 20 --requests 500 --concurrency 16 --output bench.json
+python -m fastapi_simplified.benchmarks.auth_endpoints --baseline bench.json --tolerance 0.2
+```
+
+With `--baseline`, the run fails (exit code 1) if the p95 latency of an endpoint or phase regressed by
+more than `--tolerance` compared to a previous result.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from fastapi import FastAPI
+from fastapi_simplified.config import database_config
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.metrics.timing import add_timing_listener, enable_timing, remove_timing_listener, timing_enabled
+from fastapi_simplified.models.custom_user import CustomUser
+from fastapi_simplified.security.service import authentication
+from fastapi_simplified.services.user_service import UserService
+
+
+class BenchmarkUser(CustomUser):
+    __tablename__ = "benchmark_users"
+
+
+def _percentile(values:list[float], percent:float) -> float:
+    # Nearest-rank percentile of already sorted values
+    if not values:
+        return None
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def _summarize(durations:list[float], wall_seconds:float = None) -> dict:
+    durations = sorted(durations)
+    summary = {
+        "count": len(durations),
+        "mean_ms": sum(durations) / len(durations) * 1000 if durations else None,
+        "p50_ms": _percentile(durations, 50),
+        "p95_ms": _percentile(durations, 95),
+        "p99_ms": _percentile(durations, 99),
+        "max_ms": durations[-1] if durations else None,
+    }
+    for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms"):
+        if summary[key] is not None:
+            summary[key] *= 1000
+    if wall_seconds:
+        summary["throughput_per_second"] = len(durations) / wall_seconds
+    return summary
+
+
+class _PhaseRecorder:
+    """
+    Collects the durations of the instrumented phases, grouped by the endpoint being benchmarked.
+    """
+    def __init__(self) -> None:
+        self.endpoint : str = None
+        self.durations : dict[str, dict[str, list[float]]] = {}
+
+    def record(self, phase:str, seconds:float) -> None:
+        self.durations.setdefault(self.endpoint, {}).setdefault(phase, []).append(seconds)
+
+    def wrap(self, function, phase:str):
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.record(phase, time.perf_counter() - started)
+        else:
+            @wraps(function)
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(phase, time.perf_counter() - started)
+        return timed
+
+    @contextmanager
+    def instrument(self):
+        """
+        Turns timing on and listens to the timed phases for the duration of the benchmark. Response
+        serialization happens inside FastAPI, so it is wrapped here instead.
+        """
+        import fastapi.routing
+
+        serialize_response = fastapi.routing.serialize_response
+        was_enabled = timing_enabled()
+        enable_timing()
+        add_timing_listener(self.record)
+        fastapi.routing.serialize_response = self.wrap(serialize_response, "response_serialization")
+        try:
+            yield self
+        finally:
+            fastapi.routing.serialize_response = serialize_response
+            remove_timing_listener(self.record)
+            enable_timing(was_enabled)
+
+
+def _build_app() -> FastAPI:
+    from fastapi_simplified.security.controller import authentication_controller
+
+    service = UserService(BenchmarkUser)
+    authentication_controller.auth = authentication.make_user_detail_Service(service)
+
+    app = FastAPI()
+    app.include_router(authentication_controller.auth_router)
+    return app
+
+
+async def _run_stage(client, requests:list, concurrency:int) -> tuple[list[float], int, float]:
+    """
+    Sends `requests` (`(method, url, kwargs)` tuples) with at most `concurrency` in flight.
+    Returns the latencies, the number of failed requests and the wall time of the stage.
+    """
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            method, url, kwargs = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def _benchmark(users:int, requests:int, concurrency:int, recorder:_PhaseRecorder) -> dict:
+    try:
+        import httpx
+    except ImportError:
+        raise ImportError("The benchmark needs the 'httpx' package")
+
+    app = _build_app()
+    run = uuid.uuid4().hex[:8]
+    credentials = [(f"bench-{run}-{index}", f"password-{index}") for index in range(users)]
+    results = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        recorder.endpoint = "/signUp"
+        sign_ups = [("POST", "/signUp", {"json": {"username": username, "password": password, "email": f"{username}@example.com",
+                                                   "name": "Bench", "surname": "Mark"}})
+                    for username, password in credentials]
+        latencies, errors, wall = await _run_stage(client, sign_ups, concurrency)
+        results["/signUp"] = {**_summarize(latencies, wall), "errors": errors}
+
+        recorder.endpoint = "/token"
+        logins = [("POST", "/token", {"data": {"username": username, "password": password}})
+                  for username, password in (credentials[index % users] for index in range(requests))]
+        latencies, errors, wall = await _run_stage(client, logins, concurrency)
+        results["/token"] = {**_summarize(latencies, wall), "errors": errors}
+
+        recorder.endpoint = None
+        tokens = []
+        for username, password in credentials:
+            response = await client.post("/token", data={"username": username, "password": password})
+            tokens.append(response.json()["access_token"])
+
+        recorder.endpoint = "/me"
+        reads = [("GET", "/me", {"headers": {"Authorization": f"Bearer {tokens[index % users]}"}})
+                 for index in range(requests)]
+        latencies, errors, wall = await _run_stage(client, reads, concurrency)
+        results["/me"] = {**_summarize(latencies, wall), "errors": errors}
+    return results
+
+
+def run_benchmark(users:int = 20, requests:int = 200, concurrency:int = 8, database_url:str = None) -> dict:
+    """
+    Benchmark `/signUp`, `/token` and `/me` in-process.
+
+    The settings are read from the environment as usual, except for the database, which is a temporary
+    SQLite file unless `database_url` is given. A random `JWT_SECRET_KEY` is used when none is configured,
+    and the login throttle is off unless `LOGIN_THROTTLE_ENABLED` is set.
+    Run it in its own process, since it replaces the user service of `auth_router`.
+
+    Parameters
+    ----------
+    * users : `int`, `optional` \\
+        Number of users signed up, each with its own request.
+    * requests : `int`, `optional` \\
+        Number of `/token` and of `/me` requests.
+    * concurrency : `int`, `optional` \\
+        Number of requests in flight at once.
+    * database_url : `str`, `optional` \\
+        Database to run against. Its `benchmark_users` table is created if missing.
+
+    Returns
+    -------
+    * `dict` \\
+        The configuration and environment of the run, then per endpoint its throughput, latency
+        percentiles in milliseconds and error count, and per endpoint and phase the latency percentiles.
+        Phases are the ones timed by `fastapi_simplified.metrics.timing`, plus `response_serialization`.
+    """
+    # The engine is created on first use, so the database can still be chosen here
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    get_settings.cache_clear()
+    if get_settings().jwt_secret_key is None and not get_settings().jwt_keys:
+        os.environ["JWT_SECRET_KEY"] = uuid.uuid4().hex
+    # Every request comes from the same client, which the login throttle would soon turn away
+    os.environ.setdefault("LOGIN_THROTTLE_ENABLED", "false")
+    get_settings.cache_clear()
+
+    recorder = _PhaseRecorder()
+    with recorder.instrument():
+        endpoints = asyncio.run(_benchmark(users, requests, concurrency, recorder))
+
+    phases = {endpoint: {phase: _summarize(durations) for phase, durations in by_phase.items()}
+              for endpoint, by_phase in recorder.durations.items() if endpoint is not None}
+    return {
+        "config": {"users": users, "requests": requests, "concurrency": concurrency},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": database_config.get_engine().url.render_as_string(hide_password=True),
+            "jwt_algorithm": get_settings().jwt_algorithm,
+        },
+        "endpoints": endpoints,
+        "phases": phases,
+    }
+
+
+def compare(results:dict, baseline:dict, tolerance:float = 0.2) -> list[str]:
+    """
+    Compare the p95 latencies of a run with a previous one.
+
+    Parameters
+    ----------
+    * results : `dict` \\
+        The result of `run_benchmark`.
+    * baseline : `dict` \\
+        A previous result of `run_benchmark`.
+    * tolerance : `float`, `optional` \\
+        Allowed relative slowdown, e.g. `0.2` for 20%.
+
+    Returns
+    -------
+    * `list[str]` \\
+        A description of every endpoint or phase whose p95 latency regressed beyond the tolerance.
+    """
+    pairs = [(endpoint, result, baseline.get("endpoints", {}).get(endpoint))
+             for endpoint, result in results["endpoints"].items()]
+    pairs += [(f"{endpoint} {phase}", result, baseline.get("phases", {}).get(endpoint, {}).get(phase))
+              for endpoint, by_phase in results["phases"].items() for phase, result in by_phase.items()]
+
+    regressions = []
+    for name, result, previous in pairs:
+        if not previous or not previous.get("p95_ms") or result.get("p95_ms") is None:
+            continue
+        change = result["p95_ms"] / previous["p95_ms"] - 1
+        if change > tolerance:
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.2f} ms -> {result['p95_ms']:.2f} ms (+{change:.0%})")
+    return regressions
+
+
+def main(arguments:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the authentication endpoints in-process.")
+    parser.add_argument("--users", type=int, default=20, help="users signed up (default: 20)")
+    parser.add_argument("--requests", type=int, default=200, help="/token and /me requests (default: 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight (default: 8)")
+    parser.add_argument("--database-url", help="database to run against (default: a temporary SQLite file)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="fail if p95 latencies regressed compared to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 regression (default: 0.2)")
+    options = parser.parse_args(arguments)
+
+    results = run_benchmark(options.users, options.requests, options.concurrency, options.database_url)
+
+    print(f"{'endpoint':<40} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for endpoint, result in results["endpoints"].items():
+        print(f"{endpoint:<40} {result['throughput_per_second']:>9.1f} {result['p50_ms']:>9.2f} "
+              f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['errors']:>7}")
+        for phase, timing in results["phases"].get(endpoint, {}).items():
+            print(f"  {phase:<38} {'':>9} {timing['p50_ms']:>9.2f} {timing['p95_ms']:>9.2f} {timing['p99_ms']:>9.2f}")
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            regressions = compare(results, json.load(file), options.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
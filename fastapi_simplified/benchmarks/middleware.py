@@ -0,0 +1,124 @@
+"""
+In-process benchmark of the overhead of the exception middleware.
+
+Serves a small JSON response, a streamed response and an error from three copies of one app: without
+exception middleware, with the `call_next`-based `exceptions_middleware` (through `@app.middleware("http")`)
+and with the pure ASGI `ExceptionMiddleware`. The routes are called through the ASGI interface, and the
+mean latency of each, and its overhead over the bare app, are reported. The errors logged by
+`ExceptionMiddleware` are muted during the run, as `exceptions_middleware` doesn't log them.
+
+```bash
+python -m fastapi_simplified.benchmarks.middleware --requests 2000 --output middleware.json
+```
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi_simplified.benchmarks.asgi import asgi_get
+from fastapi_simplified.exceptions.middleware.exception_catch import ExceptionMiddleware, exceptions_middleware, logger
+
+# Streamed responses send this many chunks
+STREAM_CHUNKS : int = 50
+
+
+def _build_app(variant:str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/json")
+    async def read_json():
+        return {"id": 1, "username": "benchmark", "disabled": False}
+
+    @app.get("/stream")
+    async def read_stream():
+        async def chunks():
+            for index in range(STREAM_CHUNKS):
+                yield b'{"index":%d}\n' % index
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    @app.get("/error")
+    async def read_error():
+        raise ValueError("benchmark")
+
+    if variant == "call_next":
+        app.middleware("http")(exceptions_middleware)
+    elif variant == "asgi":
+        app.add_middleware(ExceptionMiddleware)
+    return app
+
+
+async def _benchmark(requests:int) -> dict:
+    results = {}
+    for variant in ("none", "call_next", "asgi"):
+        app = _build_app(variant)
+        # The bare app lets errors escape, which isn't comparable
+        paths = ("/json", "/stream") if variant == "none" else ("/json", "/stream", "/error")
+        results[variant] = {}
+        for path in paths:
+            # Warm up the app and check the response before timing it
+            status, body = await asgi_get(app, path)
+            if path == "/stream" and body.count(b"\n") != STREAM_CHUNKS:
+                raise RuntimeError(f"{variant} truncated the streamed response")
+            started = time.perf_counter()
+            for _ in range(requests):
+                await asgi_get(app, path)
+            elapsed = time.perf_counter() - started
+            results[variant][path] = {"status": status, "mean_us": elapsed / requests * 1e6}
+
+    for variant in ("call_next", "asgi"):
+        for path in ("/json", "/stream"):
+            result = results[variant][path]
+            result["overhead_us"] = result["mean_us"] - results["none"][path]["mean_us"]
+    return results
+
+
+def run_benchmark(requests:int = 1000) -> dict:
+    """
+    Run the benchmark.
+
+    Parameters
+    ----------
+    * requests : `int`, `optional` \\
+        Requests sent to each route of each variant.
+
+    Returns
+    -------
+    * `dict` \\
+        By variant (`none`, `call_next`, `asgi`) and path, the status code, the mean latency and the
+        overhead over the bare app in microseconds, and the run `parameters`.
+    """
+    disabled, logger.disabled = logger.disabled, True
+    try:
+        results = asyncio.run(_benchmark(requests))
+    finally:
+        logger.disabled = disabled
+    results["parameters"] = {"requests": requests, "stream_chunks": STREAM_CHUNKS, "python": platform.python_version()}
+    return results
+
+
+def main(arguments:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the overhead of the exception middleware in-process.")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per route and variant (default: 1000)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    options = parser.parse_args(arguments)
+
+    results = run_benchmark(options.requests)
+
+    print(f"{'variant':<10} {'path':<8} {'status':>6} {'mean us':>9} {'overhead us':>12}")
+    for variant in ("none", "call_next", "asgi"):
+        for path, result in results[variant].items():
+            overhead = f"{result['overhead_us']:>12.1f}" if "overhead_us" in result else f"{'':>12}"
+            print(f"{variant:<10} {path:<8} {result['status']:>6} {result['mean_us']:>9.1f} {overhead}")
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+In-process benchmark of the response serialization of user pages.
+
+Serves the same `PaginatedUsersInfo` page of ORM entities from two routes: one returning the page for
+FastAPI to validate against its `response_model` and encode (the default path), the other returning a
+`FastJSONResponse` built with `row_serializer` (the fast path). The routes are called through the ASGI
+interface, without a network or an HTTP client, and the throughput of each is reported in bytes and
+responses per second.
+
+```bash
+python -m fastapi_simplified.benchmarks.serialization --rows 1000 --requests 200 --output serialization.json
+```
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+from fastapi import FastAPI
+from fastapi_simplified.benchmarks.asgi import asgi_get
+from fastapi_simplified.benchmarks.auth_endpoints import BenchmarkUser
+from fastapi_simplified.schemas.responses.user_response import PaginatedUsersInfo
+from fastapi_simplified.utils.serialization import FastJSONResponse, orjson, row_serializer
+
+
+def _build_app(users:list) -> FastAPI:
+    app = FastAPI()
+    serialize_page = row_serializer(PaginatedUsersInfo)
+
+    @app.get("/users", response_model=PaginatedUsersInfo)
+    def read_users():
+        return PaginatedUsersInfo(limit=len(users), data=users)
+
+    @app.get("/users/fast", response_model=PaginatedUsersInfo)
+    def read_users_fast():
+        return FastJSONResponse(serialize_page(PaginatedUsersInfo.model_construct(limit=len(users), data=users)))
+
+    return app
+
+
+async def _get(app:FastAPI, path:str) -> bytes:
+    status, body = await asgi_get(app, path)
+    if status != 200:
+        raise RuntimeError(f"GET {path} answered {status}")
+    return body
+
+
+async def _benchmark(rows:int, requests:int) -> dict:
+    users = [
+        BenchmarkUser(id=index, username=f"user{index}", password="not-serialized", email=f"user{index}@example.com",
+                      name="Benchmark", surname=f"User {index}", disabled=index % 10 == 0, created_date=datetime.now())
+        for index in range(rows)
+    ]
+    app = _build_app(users)
+
+    default, fast = await _get(app, "/users"), await _get(app, "/users/fast")
+    results = {"identical": json.loads(default) == json.loads(fast)}
+    for name, path in (("default", "/users"), ("fast", "/users/fast")):
+        started = time.perf_counter()
+        size = 0
+        for _ in range(requests):
+            size += len(await _get(app, path))
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            "response_bytes": size // requests,
+            "bytes_per_second": size / elapsed,
+            "responses_per_second": requests / elapsed,
+            "mean_ms": elapsed / requests * 1000,
+        }
+    results["speedup"] = results["fast"]["bytes_per_second"] / results["default"]["bytes_per_second"]
+    return results
+
+
+def run_benchmark(rows:int = 1000, requests:int = 100) -> dict:
+    """
+    Run the benchmark.
+
+    Parameters
+    ----------
+    * rows : `int`, `optional` \\
+        Users per page.
+    * requests : `int`, `optional` \\
+        Pages served by each path.
+
+    Returns
+    -------
+    * `dict` \\
+        The throughput of the `default` and `fast` paths, the `speedup` of the fast one, whether both
+        produced the `identical` JSON, and the run `parameters`.
+    """
+    results = asyncio.run(_benchmark(rows, requests))
+    results["parameters"] = {
+        "rows": rows,
+        "requests": requests,
+        "encoder": "orjson" if orjson is not None else "json",
+        "python": platform.python_version(),
+    }
+    return results
+
+
+def main(arguments:list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the serialization of user pages in-process.")
+    parser.add_argument("--rows", type=int, default=1000, help="users per page (default: 1000)")
+    parser.add_argument("--requests", type=int, default=100, help="pages served by each path (default: 100)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    options = parser.parse_args(arguments)
+
+    results = run_benchmark(options.rows, options.requests)
+
+    print(f"{'path':<10} {'MB/s':>9} {'pages/s':>9} {'mean ms':>9} {'bytes':>9}")
+    for name in ("default", "fast"):
+        result = results[name]
+        print(f"{name:<10} {result['bytes_per_second'] / 1e6:>9.2f} {result['responses_per_second']:>9.1f} "
+              f"{result['mean_ms']:>9.2f} {result['response_bytes']:>9}")
+    print(f"speedup {results['speedup']:.1f}x with {results['parameters']['encoder']}, identical output: {results['identical']}")
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(results, file, indent=2)
+    return 0 if results["identical"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+import marshal
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+from sqlalchemy import inspect
+from sqlalchemy.exc import NoInspectionAvailable
+from sqlalchemy.orm.attributes import set_committed_value
+from fastapi_simplified.cache.shared_memory_cache import SharedMemoryCache
+from fastapi_simplified.cache.ttl_cache import TTLCache
+from fastapi_simplified.config.database_config import Base
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.config.tenancy import tenant_key
+from fastapi_simplified.repositories.generics.write_events import add_write_listener
+from fastapi_simplified.security.utils.principal import Principal
+
+
+def _snapshot(principal:Any) -> Any:
+    """
+    Copy the column values of an ORM entity into a new instance that belongs to no session, so that it
+    can be shared between requests without lazy loads or expired attributes. Other objects are returned as is.
+    """
+    try:
+        mapper = inspect(principal).mapper
+    except NoInspectionAvailable:
+        return principal
+
+    snapshot = mapper.class_manager.new_instance()
+    for attribute in mapper.column_attrs:
+        set_committed_value(snapshot, attribute.key, getattr(principal, attribute.key))
+    return snapshot
+
+
+def _identity(entity:Any) -> Any:
+    # Entities and the principals built from them only have the row id in common
+    return getattr(entity, "id", None)
+
+
+def _tag(identity:Any) -> str:
+    # Label of the entries of an identity in the shared cache
+    return f"id:{identity}"
+
+
+# Column types that marshal can't store, by the tag they are encoded with
+_TAGGED_TYPES : dict[str, type] = {"datetime": datetime, "date": date, "time": time, "decimal": Decimal}
+_PLAIN_TYPES : frozenset[type] = frozenset((type(None), bool, int, float, str, bytes))
+# table name -> mapper, filled as entries of new tables are decoded
+_mappers : dict[str, Any] = {}
+
+
+def _plain(value:Any) -> Any:
+    # marshal only takes the exact built-in types, not their subclasses
+    if type(value) in _PLAIN_TYPES:
+        return value
+    # Checked in order, so that datetimes aren't taken for dates
+    tag = next((tag for tag, kind in _TAGGED_TYPES.items() if isinstance(value, kind)), None)
+    if tag is None:
+        raise TypeError(f"Can't share a value of type {type(value).__name__}")
+    return (tag, str(value) if tag == "decimal" else value.isoformat())
+
+
+def _restore(value:Any) -> Any:
+    if not isinstance(value, tuple):
+        return value
+    tag, value = value
+    return Decimal(value) if tag == "decimal" else _TAGGED_TYPES[tag].fromisoformat(value)
+
+
+def _encode(snapshot:Any) -> bytes:
+    """
+    Encode a principal or an entity snapshot for the shared cache. An entity is stored as its table
+    name followed by its values in column order. Returns `None` for other objects and unsupported
+    value types.
+    """
+    try:
+        if isinstance(snapshot, Principal):
+            profile = {name: _plain(value) for name, value in (snapshot.to_claims().get("profile") or {}).items()}
+            return marshal.dumps([None, _plain(snapshot.id), snapshot.username, snapshot.disabled, list(snapshot.scopes), profile])
+        mapper = inspect(snapshot).mapper
+        values = [str(mapper.local_table.name)]
+        values += [_plain(getattr(snapshot, attribute.key)) for attribute in mapper.column_attrs]
+        return marshal.dumps(values)
+    except (NoInspectionAvailable, TypeError, ValueError):
+        return None
+
+
+def _decode(data:bytes) -> Any:
+    """
+    Rebuild a principal or an entity snapshot encoded by `_encode`, or return `None` if its model
+    isn't mapped in this process.
+    """
+    table, *values = marshal.loads(data)
+    if table is None:
+        id, username, disabled, scopes, profile = values
+        return Principal(_restore(id), username, disabled, scopes, **{name: _restore(value) for name, value in profile.items()})
+
+    mapper = _mappers.get(table)
+    if mapper is None:
+        _mappers.update((mapper.local_table.name, mapper) for mapper in Base.registry.mappers)
+        mapper = _mappers.get(table)
+    if mapper is None or len(mapper.column_attrs) != len(values):
+        return None
+
+    snapshot = mapper.class_manager.new_instance()
+    for attribute, value in zip(mapper.column_attrs, values):
+        set_committed_value(snapshot, attribute.key, _restore(value))
+    return snapshot
+
+
+class PrincipalCache:
+    """
+    In-process cache of authenticated principals, keyed by username, optionally backed by a
+    `SharedMemoryCache` that the worker processes of a host share.
+
+    Cached principals are read-only snapshots: load the entity through its repository to modify it.
+    Entries are invalidated as soon as the matching entity is written through a repository, so changes
+    such as disabling a user take effect on the next request. Inside a tenant (see `resolve_tenant`)
+    usernames are qualified with the tenant, so tenants can't see each other's users.
+
+    With `SHARED_CACHE_PATH` set, a principal looked up by one worker is served to the others from the
+    shared cache, and a write in any worker invalidates the entry in all of them: every local entry
+    remembers the version of its shared slot and is dropped once the version changes. Only `Principal`s
+    and ORM entities whose values are plain, dates, times or decimals are shared.
+
+    A lookup that missed may race with a write: if it read the row before the write, it mustn't cache
+    it after the invalidation. Take a `generation()` stamp before reading the row and pass it to `put`,
+    which then skips caching if anything was invalidated in the meantime.
+
+    Attributes
+    ----------
+    * max_entries : `int` \\
+        Maximum number of cached principals. A value of `0` disables the cache.
+        Defaults to `PRINCIPAL_CACHE_MAX_ENTRIES`.
+    * ttl : `float` \\
+        Lifetime of an entry in seconds. Defaults to `PRINCIPAL_CACHE_TTL`.
+    * shared : `SharedMemoryCache`, `optional` \\
+        The shared tier. Defaults to one opened at `SHARED_CACHE_PATH`, if set.
+
+    Methods
+    -------
+    * get(username: `str`) -> `Any` \\
+        Returns the cached principal or `None`.
+    * generation(username: `str`) -> `tuple` \\
+        Returns a stamp to take before loading a principal, for `put`.
+    * put(username: `str`, principal: `Any`, generation: `tuple`) -> `Any` \\
+        Caches a snapshot of the principal, unless it was invalidated since `generation`, and returns it.
+    * invalidate(username: `str`) -> `None` \\
+        Removes a principal.
+    * on_write(action: `str`, entities: `list`) -> `None` \\
+        Repository write listener that invalidates the written entities.
+    * stats() -> `dict` \\
+        Returns the cache statistics.
+    """
+    def __init__(self, max_entries:int = None, ttl:float = None, shared:SharedMemoryCache = None) -> None:
+        self.max_entries : int = max_entries
+        self.ttl : float = ttl
+        self._shared : SharedMemoryCache = shared
+        self._shared_loaded : bool = shared is not None
+        # username -> (version of the shared slot or None, snapshot)
+        self._cache : TTLCache[tuple[int, Any]] = None
+        # Bumped by every invalidation in this process, under `_lock` along with the cache writes
+        self._generation : int = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self) -> TTLCache[tuple[int, Any]]:
+        # Created on first use, so that the settings aren't loaded at import time
+        if self._cache is None:
+            settings = get_settings()
+            self._cache = TTLCache(
+                max_entries=settings.principal_cache_max_entries if self.max_entries is None else self.max_entries,
+                ttl=settings.principal_cache_ttl if self.ttl is None else self.ttl
+            )
+        return self._cache
+
+    @property
+    def shared(self) -> SharedMemoryCache:
+        # Opened on first use, i.e. in each worker after the server has forked them
+        if not self._shared_loaded:
+            settings = get_settings()
+            if settings.shared_cache_path:
+                self._shared = SharedMemoryCache(settings.shared_cache_path, settings.shared_cache_slots,
+                                                 settings.shared_cache_slot_size)
+            self._shared_loaded = True
+        return self._shared
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache.max_entries > 0
+
+    def get(self, username:str) -> Any:
+        if not self.enabled:
+            return None
+        username = tenant_key(username)
+        entry = self.cache.get(username)
+        shared = self.shared
+        if shared is None:
+            return entry[1] if entry is not None else None
+
+        if entry is not None:
+            if entry[0] == shared.version(username):
+                return entry[1]
+            self.cache.invalidate(username)
+
+        data, version = shared.get(username)
+        snapshot = _decode(data) if data is not None else None
+        if snapshot is not None:
+            self.cache.set(username, (version, snapshot))
+        return snapshot
+
+    def generation(self, username:str) -> tuple[int, int]:
+        shared = self.shared
+        return self._generation, shared.version(tenant_key(username)) if shared is not None else None
+
+    def put(self, username:str, principal:Any, generation:tuple[int, int] = None) -> Any:
+        if not self.enabled:
+            return principal
+        username = tenant_key(username)
+        snapshot = _snapshot(principal)
+        with self._lock:
+            if generation is not None and generation[0] != self._generation:
+                return snapshot
+            version = None
+            if self.shared is not None:
+                data = _encode(snapshot)
+                if data is None:
+                    # Not shareable, but other workers may still hold an older copy
+                    self.shared.invalidate(username)
+                    version = self.shared.version(username)
+                else:
+                    expected = generation[1] if generation is not None else None
+                    version = self.shared.set(username, data, self.cache.ttl, tag=_tag(_identity(snapshot)),
+                                              expected_version=expected)
+                    if version is None:
+                        # Invalidated by another worker while it was loaded
+                        return snapshot
+            self.cache.set(username, (version, snapshot))
+        return snapshot
+
+    def invalidate(self, username:str) -> None:
+        username = tenant_key(username)
+        with self._lock:
+            self._generation += 1
+            self.cache.invalidate(username)
+        if self.shared is not None:
+            self.shared.invalidate(username)
+
+    def on_write(self, action:str, entities:list) -> None:
+        identities = set()
+        for entity in entities:
+            username = getattr(entity, "username", None)
+            if username is None:
+                continue
+            self.invalidate(username)
+            identities.add(_identity(entity))
+
+        # An update may have renamed a user, so also drop entries cached under a previous username.
+        # New rows can't be cached yet, which keeps bulk inserts away from the scan.
+        if action != "save" and identities:
+            self.cache.invalidate_where(lambda cached: _identity(cached[1]) in identities)
+            if self.shared is not None:
+                for identity in identities:
+                    self.shared.invalidate_tag(_tag(identity))
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+
+principal_cache = PrincipalCache()
+add_write_listener(principal_cache.on_write)
@@ -0,0 +1,212 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any
+
+# File header: magic, number of slots, size of a slot
+_HEADER = struct.Struct("<8sII")
+_MAGIC = b"FSSHMC01"
+
+# Slot header: version, key hash, tag, expires at (unix time), payload length. The payload holds the
+# key followed by the value, and the version is odd while the slot is being written.
+_SLOT = struct.Struct("<IQQdHH")
+_VERSION = struct.Struct("<I")
+
+
+def _digest(value:str) -> int:
+    # Stable across processes, unlike the salted built-in `hash()`
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little")
+
+
+class SharedMemoryCache:
+    """
+    A cache of byte strings shared by the processes of one host through a memory-mapped file,
+    e.g. the workers of a gunicorn server.
+
+    The file is split into `slots` fixed-size slots, and a key always lives in the slot its hash
+    points to: a key evicts whatever other key held its slot. Every slot carries a version stamp
+    that is bumped on each write, so readers detect concurrent writes without locking, and a
+    process that keeps a decoded copy of an entry can tell whether it is still current by
+    comparing versions. Writers lock the slot for the other processes with `fcntl`, which makes
+    the cache POSIX only.
+
+    Entries whose key and value don't fit in a slot are not stored.
+
+    Attributes
+    ----------
+    * path : `str` \\
+        Path of the backing file, preferably on a tmpfs such as `/dev/shm`. It is created if missing.
+    * slots : `int`, `optional` \\
+        Number of slots.
+    * slot_size : `int`, `optional` \\
+        Size of a slot in bytes, header included.
+
+    Methods
+    -------
+    * get(key: `str`) -> `tuple[bytes, int]` \\
+        Returns the cached value, or `None`, and the version of the key's slot.
+    * set(key: `str`, value: `bytes`, ttl: `float`, tag: `str`, expected_version: `int`) -> `int` \\
+        Caches a value and returns the new version of the slot.
+    * version(key: `str`) -> `int` \\
+        Returns the version of the key's slot.
+    * invalidate(key: `str`) -> `None` \\
+        Removes an entry, in every process.
+    * invalidate_tag(tag: `str`) -> `int` \\
+        Removes every entry stored with `tag`.
+    * clear() -> `None` \\
+        Removes all entries.
+    * stats() -> `dict` \\
+        Returns the hit and miss counters of this process, and the geometry of the cache.
+    """
+    def __init__(self, path:str, slots:int = 4096, slot_size:int = 512) -> None:
+        if slot_size <= _SLOT.size:
+            raise ValueError(f"The slot size must be larger than {_SLOT.size} bytes")
+        import fcntl
+
+        self._fcntl = fcntl
+        self.path : str = path
+        self.slots : int = slots
+        self.slot_size : int = slot_size
+        self.hits : int = 0
+        self.misses : int = 0
+        # fcntl locks are held per process, so threads of one process also take this lock
+        self._lock = threading.Lock()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = _HEADER.size + slots * slot_size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER.size, 0)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if len(header) < _HEADER.size or header[:8] == b"\0" * 8:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _HEADER.pack(_MAGIC, slots, slot_size), 0)
+            elif _HEADER.unpack(header) != (_MAGIC, slots, slot_size):
+                raise ValueError(f"{path} holds a shared cache of another layout; remove it or configure the same layout")
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER.size, 0)
+        self._map = mmap.mmap(self._fd, size)
+
+    def _offset(self, key_hash:int) -> int:
+        return _HEADER.size + (key_hash % self.slots) * self.slot_size
+
+    def version(self, key:str) -> int:
+        return _VERSION.unpack_from(self._map, self._offset(_digest(key)))[0]
+
+    def get(self, key:str) -> tuple[bytes, int]:
+        """
+        Returns the cached value for `key`.
+
+        Returns
+        -------
+        * `tuple[bytes, int]` \\
+            The value, or None if the key is missing, expired or being written, and the version of
+            its slot. A decoded copy of the value is current for as long as the version is unchanged.
+        """
+        key_hash = _digest(key)
+        offset = self._offset(key_hash)
+        version, stored_hash, _, expires_at, key_length, value_length = _SLOT.unpack_from(self._map, offset)
+        if version & 1 or stored_hash != key_hash or expires_at <= time.time():
+            self.misses += 1
+            return None, version
+
+        start = offset + _SLOT.size
+        payload = self._map[start:start + key_length + value_length]
+        # The slot changed while it was read
+        if _VERSION.unpack_from(self._map, offset)[0] != version or payload[:key_length] != key.encode():
+            self.misses += 1
+            return None, version
+        self.hits += 1
+        return payload[key_length:], version
+
+    def _write(self, offset:int, fields:tuple, payload:bytes = b"", expected_version:int = None) -> int:
+        # Writes a slot under the process and file locks, bumping its version around the write.
+        # With `expected_version`, nothing is written (and `None` returned) if the slot has changed since
+        with self._lock:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, self.slot_size, offset)
+            try:
+                version = _VERSION.unpack_from(self._map, offset)[0]
+                if expected_version is not None and version != expected_version:
+                    return None
+                _SLOT.pack_into(self._map, offset, (version + 1) & 0xFFFFFFFF, *fields)
+                self._map[offset + _SLOT.size:offset + _SLOT.size + len(payload)] = payload
+                version = (version + 2) & 0xFFFFFFFF
+                _VERSION.pack_into(self._map, offset, version)
+                return version
+            finally:
+                self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, self.slot_size, offset)
+
+    def set(self, key:str, value:bytes, ttl:float, tag:str = None, expected_version:int = None) -> int:
+        """
+        Caches `value` under `key` for `ttl` seconds, replacing the entry in the key's slot.
+
+        Parameters
+        ----------
+        * key : `str` \\
+            The cache key.
+        * value : `bytes` \\
+            The encoded value.
+        * ttl : `float` \\
+            Lifetime of the entry in seconds.
+        * tag : `str`, `optional` \\
+            A label for `invalidate_tag`, e.g. the identity of the cached row.
+        * expected_version : `int`, `optional` \\
+            Only write if the slot still has this version, e.g. the one read before loading the value,
+            so that a value loaded before an invalidation isn't cached after it.
+
+        Returns
+        -------
+        * `int` \\
+            The new version of the slot, or `None` if it no longer had `expected_version`. If the
+            entry doesn't fit, the slot is only invalidated.
+        """
+        key_hash = _digest(key)
+        offset = self._offset(key_hash)
+        encoded_key = key.encode()
+        if _SLOT.size + len(encoded_key) + len(value) > self.slot_size or ttl <= 0:
+            return self._write(offset, (0, 0, 0.0, 0, 0), expected_version=expected_version)
+        fields = (key_hash, _digest(tag) if tag is not None else 0, time.time() + ttl, len(encoded_key), len(value))
+        return self._write(offset, fields, encoded_key + value, expected_version)
+
+    def invalidate(self, key:str) -> None:
+        """
+        Removes the entry for `key`. The version of its slot is bumped even if the slot is empty
+        or holds another key, so that copies of the entry kept by any process are dropped.
+        """
+        self._write(self._offset(_digest(key)), (0, 0, 0.0, 0, 0))
+
+    def invalidate_tag(self, tag:str) -> int:
+        """
+        Removes every entry stored with `tag`. This scans all slots, so keep it off hot paths.
+
+        Returns
+        -------
+        * `int` \\
+            The number of removed entries.
+        """
+        tag_hash = _digest(tag)
+        removed = 0
+        for index in range(self.slots):
+            offset = _HEADER.size + index * self.slot_size
+            if _SLOT.unpack_from(self._map, offset)[2] == tag_hash:
+                self._write(offset, (0, 0, 0.0, 0, 0))
+                removed += 1
+        return removed
+
+    def clear(self) -> None:
+        for index in range(self.slots):
+            self._write(_HEADER.size + index * self.slot_size, (0, 0, 0.0, 0, 0))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "slots": self.slots,
+            "slot_size": self.slot_size,
+        }
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
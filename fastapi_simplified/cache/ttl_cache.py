@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    A thread-safe, bounded in-process cache with least-recently-used eviction and per-entry expiry.
+
+    Attributes
+    ----------
+    * max_entries : `int` \\
+        Maximum number of entries kept. The least recently used entry is evicted when it is exceeded.
+        A value of `0` disables the cache.
+    * ttl : `float` \\
+        Default lifetime of an entry in seconds.
+
+    Methods
+    -------
+    * get(key: `Hashable`) -> `V` \\
+        Returns the cached value, or `None` if it is missing or expired.
+    * set(key: `Hashable`, value: `V`, ttl: `float`) -> `None` \\
+        Caches a value for `ttl` seconds, or for the default ttl.
+    * invalidate(key: `Hashable`) -> `None` \\
+        Removes a single entry.
+    * invalidate_where(predicate: `Callable[[V], bool]`) -> `int` \\
+        Removes every entry whose value matches the predicate.
+    * clear() -> `None` \\
+        Removes all entries.
+    * stats() -> `dict` \\
+        Returns the hit, miss and eviction counters along with the current size.
+    """
+    def __init__(self, max_entries:int, ttl:float) -> None:
+        self.max_entries : int = max_entries
+        self.ttl : float = ttl
+
+        # key -> (expires_at, value), ordered from least to most recently used
+        self._entries : OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits : int = 0
+        self.misses : int = 0
+        self.evictions : int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key:Hashable) -> V:
+        """
+        Returns the cached value for `key`.
+
+        Parameters
+        ----------
+        * key : `Hashable` \\
+            The cache key.
+
+        Returns
+        -------
+        * `V` or `None` \\
+            The cached value, or None if the key is missing or has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key:Hashable, value:V, ttl:float = None) -> None:
+        """
+        Caches `value` under `key`.
+
+        Parameters
+        ----------
+        * key : `Hashable` \\
+            The cache key.
+        * value : `V` \\
+            The value to cache.
+        * ttl : `float`, `optional` \\
+            Lifetime of the entry in seconds. It is capped at the default ttl of the cache,
+            and entries with a lifetime of zero or less are not stored.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key:Hashable) -> None:
+        """
+        Removes the entry for `key`, if any.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate:Callable[[V], bool]) -> int:
+        """
+        Removes every entry whose value matches `predicate`. This scans the whole cache,
+        so keep it off hot paths.
+
+        Returns
+        -------
+        * `int` \\
+            The number of removed entries.
+        """
+        with self._lock:
+            keys = [key for key, (_, value) in self._entries.items() if predicate(value)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        """
+        Removes all entries. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Returns the cache statistics.
+
+        Returns
+        -------
+        * `dict` \\
+            `hits`, `misses`, `evictions`, `size` and `max_entries`.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+        }
@@ -1,21 +1,446 @@
 # import statements
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import Engine, Select, create_engine, event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from fastapi_simplified.config.settings import Settings, get_settings
+from fastapi_simplified.config.startup import startup_phase
+from fastapi_simplified.config.tenancy import current_tenant, tenant_registry
 
-# Get the properties from environment variables
-load_dotenv(r"resources/.env")
 
-# Create a database engine & connect to database
-DbEngine = create_engine(os.getenv("DATABASE_URL"))
+def get_pool_options(settings:Settings = None) -> dict:
+    """
+    Returns the connection pool settings. Only the settings that are set are returned, so drivers
+    keep their defaults for the rest.
+
+    * `DB_POOL_SIZE` : connections kept open in the pool
+    * `DB_MAX_OVERFLOW` : connections allowed on top of `DB_POOL_SIZE` under load
+    * `DB_POOL_TIMEOUT` : seconds to wait for a free connection before giving up
+    * `DB_POOL_RECYCLE` : seconds after which a connection is replaced
+    * `DB_POOL_PRE_PING` : test connections for liveness on checkout
+
+    Returns
+    -------
+    * `dict` \\
+        Keyword arguments for `create_engine`.
+    """
+    settings = settings or get_settings()
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    return {option: value for option, value in options.items() if value is not None}
+
+
+def pool_options_for(url:str, **overrides) -> dict:
+    """
+    Returns the pool settings that apply to the default pool of the driver in `url`, with `overrides`
+    taking precedence over the settings. Sizing settings are dropped for drivers that don't use a
+    queue pool (e.g. `NullPool` for aiosqlite).
+    """
+    options = get_pool_options()
+    options.update(overrides)
+    parsed = make_url(url)
+    if not issubclass(parsed.get_dialect().get_pool_class(parsed), QueuePool):
+        for option in ("pool_size", "max_overflow", "pool_timeout"):
+            options.pop(option, None)
+    return options
+
+
+# The engine is created on first use rather than at import time
+_engine: Engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """
+    Returns the database engine, creating it from `DATABASE_URL` on first use.
+
+    Returns
+    -------
+    * `Engine` \\
+        The database engine.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                with startup_phase("create_engine"):
+                    url = get_settings().database_url
+                    engine = create_engine(url, **pool_options_for(url))
+                    _track_pool_events(engine)
+                    _engine = engine
+    return _engine
+
+
+# Read replicas, created on first use. Empty when `DATABASE_REPLICA_URLS` isn't set
+_replica_engines: list[Engine] = None
+_replica_counter = itertools.count()
+
+
+def get_replica_engines() -> list[Engine]:
+    """
+    Returns the engines of the read replicas listed in `DATABASE_REPLICA_URLS`, creating them on first use.
+
+    Returns
+    -------
+    * `list[Engine]` \\
+        The replica engines, empty when no replica is configured.
+    """
+    global _replica_engines
+    if _replica_engines is None:
+        with _engine_lock:
+            if _replica_engines is None:
+                with startup_phase("create_replica_engines"):
+                    _replica_engines = [create_engine(url, **pool_options_for(url)) for url in get_settings().replica_urls]
+    return _replica_engines
+
+
+def choose_replica() -> Engine:
+    """
+    Picks the replica for the next read, round-robin or, with `DB_REPLICA_SELECTION = "least_busy"`,
+    the one with the fewest connections checked out.
+
+    Returns
+    -------
+    * `Engine` \\
+        A replica engine, or `None` when no replica is configured.
+    """
+    replicas = get_replica_engines()
+    if len(replicas) < 2:
+        return replicas[0] if replicas else None
+
+    start = next(_replica_counter)
+    if get_settings().db_replica_selection == "least_busy":
+        # Rotate the starting point so ties are spread over the replicas
+        candidates = [replicas[(start + offset) % len(replicas)] for offset in range(len(replicas))]
+        return min(candidates, key=_checked_out)
+    return replicas[start % len(replicas)]
+
+
+def _checked_out(engine:Engine) -> int:
+    checkedout = getattr(engine.pool, "checkedout", None)
+    return checkedout() if callable(checkedout) else 0
+
+
+# Set by `use_primary()` to send the reads of the current context to the primary
+_force_primary: ContextVar[bool] = ContextVar("force_primary", default=False)
+
+
+@contextmanager
+def use_primary():
+    """
+    Sends the reads inside the block to the primary, e.g. for a lookup that must not lag behind.
+
+    ```python
+    with use_primary():
+        user = repo.find_by_username(username)
+    ```
+    """
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+class RoutingSession(Session):
+    """
+    A session that binds to `get_engine()` on first use, and spreads reads over the read replicas
+    when `DATABASE_REPLICA_URLS` is set.
+
+    Plain `SELECT` statements go to a replica. Anything else (flushes, `INSERT`/`UPDATE`/`DELETE`,
+    `SELECT ... FOR UPDATE`, raw SQL) goes to the primary, and after a write the session stays on the
+    primary until it is closed, so a request reads its own writes. Sessions created with an explicit
+    `bind` are never routed. Inside a tenant (see `resolve_tenant`) everything goes to the database of
+    the tenant instead, which has no replicas; the engine of the tenant is leased from `tenant_registry`
+    until the session is closed, so it can't be disposed of while the session uses it.
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.bind is not None:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+        tenant = current_tenant()
+        if tenant is not None:
+            leased = self.info.setdefault("tenant_engines", {})
+            engine = leased.get(tenant)
+            if engine is None:
+                engine = leased[tenant] = tenant_registry.acquire(tenant)
+            return engine
+
+        if self._flushing or not isinstance(clause, Select) or clause._for_update_arg is not None:
+            # Raw SQL and connection requests go to the primary without pinning the session
+            if self._flushing or getattr(clause, "is_dml", False) or isinstance(clause, Select):
+                self.info["pinned_to_primary"] = True
+            return get_engine()
+
+        if not self.info.get("pinned_to_primary") and not _force_primary.get():
+            replica = choose_replica()
+            if replica is not None:
+                return replica
+        return get_engine()
+
+    def close(self) -> None:
+        super().close()
+        self.info.pop("pinned_to_primary", None)
+        for engine in self.info.pop("tenant_engines", {}).values():
+            tenant_registry.release(engine)
+
 
 # Create a database session
 SessionLocal = sessionmaker(
+    class_=RoutingSession,
     autocommit=False,
-    autoflush=False,
-    bind=DbEngine
+    autoflush=False
 )
 
-Base = declarative_base()
\ No newline at end of file
+# Thread-local sessions used by repositories outside of a `session_scope`
+ScopedSession = scoped_session(SessionLocal)
+
+Base = declarative_base()
+
+
+def __getattr__(name:str):
+    # Keeps `database_config.DbEngine` working now that the engine is created lazily
+    if name == "DbEngine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Tables that have been created, and whether models with possibly missing tables were registered since
+_created_tables : set = set()
+_schema_pending : bool = False
+_schema_lock = threading.Lock()
+
+
+def register_model(model) -> None:
+    """
+    Note that `model` is in use, so that its table is created by the next schema bootstrap.
+    This doesn't touch the database.
+    """
+    global _schema_pending
+    table = getattr(model, "__table__", None)
+    if table is not None and table not in _created_tables:
+        _schema_pending = True
+
+
+def bootstrap_schema(force:bool = False) -> None:
+    """
+    Creates the missing tables of every model declared on `Base`, once. It runs automatically before
+    the first repository operation, and can be called explicitly on startup instead. It is skipped when
+    `CREATE_SCHEMA` is false, e.g. in production where migrations own the schema.
+
+    Parameters
+    ----------
+    * force : `bool`, `optional` \\
+        Create the tables even when `CREATE_SCHEMA` is false.
+    """
+    global _schema_pending
+    with _schema_lock:
+        if get_settings().create_schema or force:
+            tables = [table for table in Base.metadata.sorted_tables if table not in _created_tables]
+            if tables:
+                with startup_phase("bootstrap_schema"):
+                    Base.metadata.create_all(bind=get_engine(), tables=tables)
+                _created_tables.update(tables)
+        _schema_pending = False
+
+
+def ensure_schema() -> None:
+    """
+    Runs `bootstrap_schema` if models were registered since it last ran. Cheap enough for hot paths.
+    Inside a tenant it waits for the next operation on the default database; the schema of tenant
+    databases is bootstrapped by `tenant_registry`.
+    """
+    if _schema_pending and current_tenant() is None:
+        bootstrap_schema()
+
+
+# The session of the unit of work (usually the request) that is currently running
+_current_session: ContextVar[Session] = ContextVar("current_session", default=None)
+
+
+def current_session() -> Session:
+    """
+    Returns the session of the current unit of work, or `None` when no `session_scope` is active.
+    """
+    return _current_session.get()
+
+
+@contextmanager
+def session_scope():
+    """
+    Opens a session for one unit of work and makes it the current session, so every repository used
+    inside the block shares it. The session is rolled back on error and always closed on exit, which
+    returns its connection to the pool.
+
+    ```python
+    with session_scope() as db:
+        repo.save(item)
+    ```
+
+    Yields
+    ------
+    * `Session` \\
+        The session of this unit of work.
+    """
+    session: Session = SessionLocal()
+    token = _current_session.set(session)
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+        _current_session.reset(token)
+
+
+async def get_db():
+    """
+    FastAPI dependency that opens a request-scoped session. Add it to your app or router so that
+    repositories pick the session up automatically:
+
+    ```python
+    app = FastAPI(dependencies=[Depends(get_db)])
+    ```
+
+    It must stay an async generator; FastAPI runs sync generator dependencies in a worker thread,
+    where the current session would not be visible to the endpoint.
+
+    Yields
+    ------
+    * `Session` \\
+        The session of the current request.
+    """
+    with session_scope() as session:
+        yield session
+
+
+# Pool usage counters, updated from the pool events below
+_pool_counters = {"connects": 0, "checkouts": 0, "checkins": 0, "invalidated": 0}
+
+
+def _track_pool_events(engine:Engine) -> None:
+    def on_connect(dbapi_connection, connection_record):
+        _pool_counters["connects"] += 1
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _pool_counters["checkouts"] += 1
+
+    def on_checkin(dbapi_connection, connection_record):
+        _pool_counters["checkins"] += 1
+
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        _pool_counters["invalidated"] += 1
+
+    event.listen(engine, "connect", on_connect)
+    event.listen(engine, "checkout", on_checkout)
+    event.listen(engine, "checkin", on_checkin)
+    event.listen(engine, "invalidate", on_invalidate)
+
+
+def pool_status() -> dict:
+    """
+    Returns statistics of the connection pool, for sizing it under load.
+
+    Returns
+    -------
+    * `dict` \\
+        The pool class, its configured size and overflow, the connections currently checked in and out,
+        and the running totals of new connections, checkouts, checkins and invalidations.
+    """
+    pool = get_engine().pool
+    status = {"pool": type(pool).__name__}
+    for key, attribute in (("size", "size"), ("checked_in", "checkedin"),
+                           ("checked_out", "checkedout"), ("overflow", "overflow")):
+        method = getattr(pool, attribute, None)
+        status[key] = method() if callable(method) else None
+    status["max_overflow"] = getattr(pool, "_max_overflow", None)
+    status["timeout"] = getattr(pool, "_timeout", None)
+    status.update(_pool_counters)
+    return status
+
+
+def warm_up_pool(connections:int = None) -> None:
+    """
+    Opens connections up front so the first requests after startup don't pay for connecting.
+    Register it as a startup handler, e.g. `app.add_event_handler("startup", warm_up_pool)`.
+
+    Parameters
+    ----------
+    * connections : `int`, `optional` \\
+        Number of connections to open. Defaults to `DB_POOL_WARM_UP`, then to the pool size.
+    """
+    if connections is None:
+        connections = get_settings().db_pool_warm_up or get_pool_options().get("pool_size", 5)
+
+    with startup_phase("warm_up_pool"):
+        engine = get_engine()
+        opened = []
+        try:
+            for _ in range(connections):
+                opened.append(engine.connect())
+        finally:
+            # Hand the connections back so they stay idle in the pool
+            for connection in opened:
+                connection.close()
+
+
+# Async engine & session factory. These are only created on first use so that
+# applications which never touch the async stack don't need an async driver installed.
+AsyncDbEngine: AsyncEngine = None
+AsyncSessionLocal: async_sessionmaker = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    Returns the async database engine, creating it on first use.
+
+    The url is read from `ASYNC_DATABASE_URL` (e.g. `mysql+aiomysql://...` or `sqlite+aiosqlite:///...`)
+    and the pool uses the same settings as the sync engine.
+
+    Returns
+    -------
+    * `AsyncEngine` \\
+        The async database engine.
+
+    Raises
+    ------
+    * `RuntimeError` \\
+        Inside a tenant. Tenant databases are only reachable through the sync engines, and the
+        default database must not answer for a tenant.
+    """
+    global AsyncDbEngine, AsyncSessionLocal
+    if current_tenant() is not None:
+        raise RuntimeError(f"The async repositories don't support tenants (current tenant '{current_tenant()}')")
+    if AsyncDbEngine is None:
+        url = get_settings().async_database_url
+        AsyncDbEngine = create_async_engine(url, **pool_options_for(url))
+        AsyncSessionLocal = async_sessionmaker(
+            bind=AsyncDbEngine,
+            autoflush=False,
+            expire_on_commit=False
+        )
+    return AsyncDbEngine
+
+
+def get_async_session_factory() -> async_sessionmaker:
+    """
+    Returns the async session factory bound to the async engine.
+
+    Returns
+    -------
+    * `async_sessionmaker` \\
+        The factory used to open `AsyncSession` objects.
+    """
+    get_async_engine()
+    return AsyncSessionLocal
@@ -0,0 +1,78 @@
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+# Seconds spent in each startup phase, in the order they ran
+_startup_timings : dict[str, float] = {}
+
+
+@contextmanager
+def startup_phase(name:str):
+    """
+    Time a startup phase (loading settings, creating the engine, bootstrapping the schema, ...).
+    Phases that run more than once accumulate.
+
+    ```python
+    with startup_phase("load_models"):
+        ...
+    ```
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _startup_timings[name] = _startup_timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def startup_timings() -> dict[str, float]:
+    """
+    Returns the seconds spent in each startup phase so far, plus their `total`.
+    """
+    timings = dict(_startup_timings)
+    timings["total"] = sum(_startup_timings.values())
+    return timings
+
+
+def measure_import_time(module:str = "fastapi_simplified.security.controller.authentication_controller", top:int = 10) -> dict:
+    """
+    Measure the cold import time of `module` in a fresh interpreter, using `python -X importtime`.
+
+    Parameters
+    ----------
+    * module : `str`, `optional` \\
+        The module to import. Defaults to the authentication controller, which pulls in the whole library.
+    * top : `int`, `optional` \\
+        Number of slowest modules to report.
+
+    Returns
+    -------
+    * `dict` \\
+        `total_seconds` of the import, and the `slowest` modules by their own import time in seconds.
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               capture_output=True, text=True, check=True)
+
+    # Lines look like "import time:       412 |       1024 |   fastapi_simplified.config"
+    pattern = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+    modules = []
+    total = 0
+    for line in completed.stderr.splitlines():
+        match = pattern.match(line)
+        if match is None:
+            continue
+        own, cumulative, _, name = match.groups()
+        modules.append((name, int(own) / 1e6))
+        if name == module:
+            total = int(cumulative) / 1e6
+
+    slowest = sorted(modules, key=lambda item: item[1], reverse=True)[:top]
+    return {"module": module, "total_seconds": total, "slowest": dict(slowest)}
+
+
+if __name__ == "__main__":
+    report = measure_import_time(*sys.argv[1:2])
+    print(f"import {report['module']}: {report['total_seconds'] * 1000:.1f} ms")
+    for name, seconds in report["slowest"].items():
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
@@ -0,0 +1,322 @@
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+from sqlalchemy import Engine, create_engine
+from fastapi import Request
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.config.startup import startup_phase
+from fastapi_simplified.exceptions.resource_exceptions import UnknownTenantException
+
+# Tenant ids end up in database urls and file names, so only plain identifiers are accepted
+_TENANT_ID = re.compile(r"[A-Za-z0-9_-]{1,63}")
+
+# The tenant of the request that is currently running
+_current_tenant : ContextVar[str] = ContextVar("current_tenant", default=None)
+
+
+def current_tenant() -> str:
+    """
+    Returns the tenant of the current request, set by `resolve_tenant`, or `None` when the request
+    runs against the default database.
+    """
+    return _current_tenant.get()
+
+
+def set_current_tenant(tenant:str) -> None:
+    """
+    Makes `tenant` the tenant of the rest of the current context, i.e. the request.
+    """
+    _current_tenant.set(tenant)
+
+
+@contextmanager
+def tenant_scope(tenant:str):
+    """
+    Runs the block against the database of `tenant`, e.g. in a background job or a test.
+
+    ```python
+    with tenant_scope("acme"), session_scope():
+        repo.save(item)
+    ```
+    """
+    token = _current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current_tenant.reset(token)
+
+
+def tenant_key(key:str) -> str:
+    """
+    Qualifies a cache key with the current tenant, so that tenants sharing a process never see each
+    other's entries. Keys are returned unchanged outside of a tenant.
+    """
+    return qualified_key(_current_tenant.get(), key)
+
+
+def qualified_key(tenant:str, key:str) -> str:
+    """
+    Qualifies a key with `tenant`, like `tenant_key` does with the current tenant, e.g. with the tenant
+    claim of a token. Keys of the default database (`None`) are returned unchanged.
+    """
+    return key if tenant is None else f"{tenant}/{key}"
+
+
+def is_valid_tenant(tenant:str) -> bool:
+    return isinstance(tenant, str) and _TENANT_ID.fullmatch(tenant) is not None
+
+
+class TenantEngineRegistry:
+    """
+    Lazily created engines of the tenant databases, one per tenant.
+
+    The url of a tenant's database comes from `url_for`, by default `TENANT_DATABASE_URL` with `{tenant}`
+    replaced by the tenant id for the tenants listed in `TENANT_IDS`. A tenant `url_for` has no url for
+    doesn't exist, and never gets an engine. Each engine gets a small pool of `TENANT_POOL_SIZE` connections (plus
+    `TENANT_MAX_OVERFLOW` under load), and at most `TENANT_MAX_ENGINES` engines are kept open: when a new
+    tenant comes in, the least recently used engine that is neither leased nor has a checked out
+    connection is disposed of. Open connections are thus bounded by
+    `TENANT_MAX_ENGINES * (TENANT_POOL_SIZE + TENANT_MAX_OVERFLOW)`, however many tenants there are. An
+    evicted tenant simply gets a new engine on its next request.
+
+    Code that keeps an engine beyond a single call, like a session, leases it with `acquire` and hands it
+    back with `release`, or with `lease`. A leased engine is never disposed of: evicting it only removes
+    it from the registry, and it is disposed of when its last lease is released.
+
+    Attributes
+    ----------
+    * url_for : `Callable[[str], str]`, `optional` \\
+        Returns the database url of a tenant, or `None` if the tenant doesn't exist.
+    * max_engines : `int`, `optional` \\
+        Engines kept open at most. Defaults to `TENANT_MAX_ENGINES`.
+
+    Methods
+    -------
+    * exists(tenant: `str`) -> `bool` \\
+        Whether the tenant has a database, without opening it.
+    * get_engine(tenant: `str`) -> `Engine` \\
+        Returns the engine of a tenant, creating it on first use, without leasing it.
+    * acquire(tenant: `str`) -> `Engine` \\
+        Returns the engine of a tenant and leases it until `release`.
+    * release(engine: `Engine`) -> `None` \\
+        Hands back a lease taken with `acquire`.
+    * lease(tenant: `str`) -> `ContextManager[Engine]` \\
+        Leases the engine of a tenant for the duration of the block.
+    * evict(tenant: `str`) -> `bool` \\
+        Disposes of the engine of a tenant, once it is no longer leased.
+    * dispose_all() -> `None` \\
+        Disposes of every engine, e.g. on shutdown.
+    * stats() -> `dict` \\
+        Returns the number of open and leased engines, engines created and evicted, and connections checked out.
+    """
+    def __init__(self, url_for:Callable[[str], str] = None, max_engines:int = None) -> None:
+        self.url_for : Callable[[str], str] = url_for or self.default_url_for
+        self._max_engines : int = max_engines
+        # tenant -> (engine, number of tables created in its database), least recently used first
+        self._engines : OrderedDict[str, tuple[Engine, int]] = OrderedDict()
+        # Number of leases of every leased engine, and the leased engines evicted meanwhile
+        self._leases : dict[Engine, int] = {}
+        self._retired : set[Engine] = set()
+        self._lock = threading.Lock()
+        self.created : int = 0
+        self.evicted : int = 0
+
+    @property
+    def max_engines(self) -> int:
+        return get_settings().tenant_max_engines if self._max_engines is None else self._max_engines
+
+    @staticmethod
+    def default_url_for(tenant:str) -> str:
+        settings = get_settings()
+        if settings.tenant_database_url is None or tenant not in settings.tenants:
+            return None
+        return settings.tenant_database_url.replace("{tenant}", tenant)
+
+    def exists(self, tenant:str) -> bool:
+        return is_valid_tenant(tenant) and self.url_for(tenant) is not None
+
+    def get_engine(self, tenant:str) -> Engine:
+        entry = self._engines.get(tenant)
+        if entry is None or entry[1] != _table_count():
+            with self._lock:
+                return self._open(tenant)
+        # Moving an existing key is atomic enough without the lock, and keeps hits cheap
+        try:
+            self._engines.move_to_end(tenant)
+        except KeyError:
+            pass
+        return entry[0]
+
+    def acquire(self, tenant:str) -> Engine:
+        with self._lock:
+            engine = self._open(tenant)
+            self._leases[engine] = self._leases.get(engine, 0) + 1
+        return engine
+
+    def release(self, engine:Engine) -> None:
+        with self._lock:
+            leases = self._leases.get(engine, 0) - 1
+            if leases > 0:
+                self._leases[engine] = leases
+                return
+            self._leases.pop(engine, None)
+            if engine not in self._retired:
+                return
+            self._retired.discard(engine)
+        engine.dispose()
+
+    @contextmanager
+    def lease(self, tenant:str):
+        engine = self.acquire(tenant)
+        try:
+            yield engine
+        finally:
+            self.release(engine)
+
+    def _open(self, tenant:str) -> Engine:
+        # Called with the lock held
+        entry = self._engines.get(tenant)
+        if entry is None:
+            entry = (self._create_engine(tenant), 0)
+        if entry[1] != _table_count():
+            entry = (entry[0], _bootstrap_tenant_schema(entry[0]))
+        self._engines[tenant] = entry
+        self._engines.move_to_end(tenant)
+        self._evict_idle(keep=tenant)
+        return entry[0]
+
+    def _create_engine(self, tenant:str) -> Engine:
+        from fastapi_simplified.config.database_config import _track_pool_events, pool_options_for
+        url = self.url_for(tenant) if is_valid_tenant(tenant) else None
+        if url is None:
+            raise UnknownTenantException()
+        settings = get_settings()
+        with startup_phase("create_tenant_engine"):
+            engine = create_engine(url, **pool_options_for(url, pool_size=settings.tenant_pool_size,
+                                                           max_overflow=settings.tenant_max_overflow))
+        _track_pool_events(engine)
+        self.created += 1
+        return engine
+
+    def _evict_idle(self, keep:str = None) -> None:
+        # Least recently used first. Engines that are leased or have connections in use are skipped, so
+        # the limit can be exceeded for as long as more tenants than that are busy at once
+        from fastapi_simplified.config.database_config import _checked_out
+        excess = len(self._engines) - self.max_engines
+        for tenant in list(self._engines):
+            if excess <= 0:
+                break
+            engine = self._engines[tenant][0]
+            if tenant != keep and engine not in self._leases and _checked_out(engine) == 0:
+                del self._engines[tenant]
+                engine.dispose()
+                self.evicted += 1
+                excess -= 1
+
+    def evict(self, tenant:str) -> bool:
+        with self._lock:
+            entry = self._engines.pop(tenant, None)
+            if entry is None:
+                return False
+            self.evicted += 1
+            if entry[0] in self._leases:
+                # Disposed of by the release of its last lease
+                self._retired.add(entry[0])
+                return True
+        entry[0].dispose()
+        return True
+
+    def dispose_all(self) -> None:
+        with self._lock:
+            engines, self._engines = [engine for engine, _ in self._engines.values()], OrderedDict()
+            self._retired.update(engine for engine in engines if engine in self._leases)
+            engines = [engine for engine in engines if engine not in self._leases]
+        for engine in engines:
+            engine.dispose()
+
+    def stats(self) -> dict:
+        from fastapi_simplified.config.database_config import _checked_out
+        engines = list(self._engines.values())
+        return {
+            "engines": len(engines),
+            "leased": len(self._leases),
+            "created": self.created,
+            "evicted": self.evicted,
+            "checked_out": sum(_checked_out(engine) for engine, _ in engines),
+        }
+
+
+def _table_count() -> int:
+    from fastapi_simplified.config.database_config import Base
+    return len(Base.metadata.tables)
+
+
+def _bootstrap_tenant_schema(engine:Engine) -> int:
+    # Same rules as `bootstrap_schema`, per tenant database. Returns the number of tables now known
+    from fastapi_simplified.config.database_config import Base
+    tables = len(Base.metadata.tables)
+    if get_settings().create_schema:
+        with startup_phase("bootstrap_tenant_schema"):
+            Base.metadata.create_all(bind=engine)
+    return tables
+
+
+tenant_registry = TenantEngineRegistry()
+
+
+async def resolve_tenant(request:Request) -> str:
+    """
+    FastAPI dependency that selects the tenant of the request, so that the repositories and caches
+    used by the request work on the database of that tenant. Add it to your app before `get_db`:
+
+    ```python
+    app = FastAPI(dependencies=[Depends(resolve_tenant), Depends(get_db)])
+    ```
+
+    The tenant is read from the `TENANT_CLAIM` claim of the bearer token, or else from the
+    `TENANT_HEADER` header (e.g. to log in). Tokens are bound to their tenant: along with a bearer
+    token, the header is only accepted if the token names the same tenant, so a token issued for the
+    default database or another tenant can't be replayed against this one. Without either, the request
+    runs against the default database.
+
+    Returns
+    -------
+    * `str` \\
+        The tenant, or `None`.
+
+    Raises
+    ------
+    * `UnknownTenantException` \\
+        If the tenant id is malformed or isn't a known tenant.
+    * `BadCredentialsException` \\
+        If the header names a tenant the token isn't bound to.
+    """
+    from fastapi_simplified.exceptions.authentication_exceptions import BadCredentialsException
+    from fastapi_simplified.security.utils.jwt_utils import JWTError, get_claims
+
+    settings = get_settings()
+    tenant = request.headers.get(settings.tenant_header)
+    authorization = request.headers.get("authorization")
+    if authorization and authorization[:7].lower() == "bearer ":
+        try:
+            claims = get_claims(authorization[7:])
+        except JWTError:
+            # Rejected by the authentication dependencies
+            claims = None
+        if claims is not None:
+            claimed = claims.get(settings.tenant_claim)
+            if tenant is not None and tenant != claimed:
+                raise BadCredentialsException()
+            tenant = claimed
+
+    if tenant is None:
+        return None
+    # Only checked here: the engine of the tenant is created by the first session that needs it, so an
+    # unauthenticated request can't open databases or evict the engines of other tenants
+    if not tenant_registry.exists(tenant):
+        raise UnknownTenantException()
+    set_current_tenant(tenant)
+    return tenant
@@ -8,3 +8,8 @@ class BadCredentialsException(HTTPException):
 class InactiveUserException(HTTPException):
     def __init__(self):
         super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive User")
+
+
+class TooManyAttemptsException(HTTPException):
+    def __init__(self, retry_after:int = 60):
+        super().__init__(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many login attempts. Please try again later.", headers={"Retry-After": str(retry_after)})
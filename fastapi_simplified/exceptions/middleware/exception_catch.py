@@ -1,11 +1,20 @@
-from fastapi import Request
+import json
+import logging
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
+from fastapi_simplified.exceptions.authentication_exceptions import *
 from fastapi_simplified.exceptions.resource_exceptions import *
 from sqlalchemy.exc import IntegrityError
-#from main import app
+
+logger = logging.getLogger(__name__)
+
 
 #@app.middleware("http")
 async def exceptions_middleware(request : Request, call_next):
+    """
+    The original `@app.middleware("http")` exception handler. It runs every request through Starlette's
+    `BaseHTTPMiddleware`; prefer `ExceptionMiddleware`, which maps the same errors without that overhead.
+    """
     try:
         response = await call_next(request)
         return response
@@ -13,3 +22,95 @@ async def exceptions_middleware(request : Request, call_next):
         return JSONResponse(status_code=400, content={"message": "Database Integrity Error: " + str(e)})
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": str(e)})
+
+
+def _encode(content:dict) -> bytes:
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+# Bodies of the library's own exceptions, encoded once, by status code and detail
+_STATIC_BODIES : dict[tuple[int, str], bytes] = {
+    (error.status_code, error.detail): _encode({"detail": error.detail})
+    for error in (BadCredentialsException(), InactiveUserException(), TooManyAttemptsException(), ResourceNotFoundException(),
+                  UsernameOrEmailAlreadyExistsException(), IllegalArgumentException(), ServerBusyException(), InvalidCursorException(),
+                  InvalidPageRequestException(), UnknownTenantException())
+}
+_UNEXPECTED_ERROR = IllegalArgumentException()
+
+
+class ExceptionMiddleware:
+    """
+    ASGI middleware that turns errors escaping the application into JSON responses:
+
+    * `IntegrityError` : `400` with `{"message": "Database Integrity Error: ..."}`
+    * `HTTPException` : its status code, headers and `{"detail": ...}`, like FastAPI
+    * any other exception : `500` with the detail of `IllegalArgumentException`. The exception is logged
+      instead of being sent to the client.
+
+    The bodies of the library's exceptions are encoded once. Responses pass through untouched, so
+    streaming bodies aren't buffered. If an error occurs after the response has started, e.g. while a
+    body is streamed, it can't be replaced by an error response; the error is then re-raised so the
+    server aborts the response instead of the client receiving a truncated body as if it were complete.
+
+    ```python
+    app.add_middleware(ExceptionMiddleware)
+    ```
+
+    Attributes
+    ----------
+    * app : `ASGIApp` \\
+        The wrapped application.
+    """
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_tracking_start(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracking_start)
+        except Exception as error:
+            if started:
+                raise
+            await self._send_error(error, send)
+
+    async def _send_error(self, error:Exception, send) -> None:
+        headers = {}
+        if isinstance(error, IntegrityError):
+            status_code, body = 400, _encode({"message": "Database Integrity Error: " + str(error)})
+        elif isinstance(error, HTTPException):
+            status_code, headers = error.status_code, error.headers or {}
+            body = _STATIC_BODIES.get((error.status_code, error.detail)) if isinstance(error.detail, str) else None
+            body = body or _encode({"detail": error.detail})
+        else:
+            logger.exception("Unhandled error", exc_info=error)
+            status_code = _UNEXPECTED_ERROR.status_code
+            body = _STATIC_BODIES[(_UNEXPECTED_ERROR.status_code, _UNEXPECTED_ERROR.detail)]
+
+        raw_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        raw_headers += [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+        await send({"type": "http.response.start", "status": status_code, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def install_exception_handling(app:FastAPI) -> None:
+    """
+    Add `ExceptionMiddleware` to `app`. Call it before `install_timing`, which puts the timing
+    middleware around it, so that error responses also carry the `Server-Timing` header.
+
+    Parameters
+    ----------
+    * app : `FastAPI` \\
+        The application.
+    """
+    app.add_middleware(ExceptionMiddleware)
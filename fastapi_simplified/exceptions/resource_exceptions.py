@@ -12,4 +12,24 @@ class UsernameOrEmailAlreadyExistsException(HTTPException):
 
 class IllegalArgumentException(HTTPException):
     def __init__(self):
-        super().__init__(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Something unexpected happened that isn't your fault. Report this to your admin.")
\ No newline at end of file
+        super().__init__(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Something unexpected happened that isn't your fault. Report this to your admin.")
+
+
+class ServerBusyException(HTTPException):
+    def __init__(self, retry_after:int = 1):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="The server is busy. Please try again shortly.", headers={"Retry-After": str(retry_after)})
+
+
+class InvalidCursorException(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+
+
+class InvalidPageRequestException(HTTPException):
+    def __init__(self, detail:str = "Invalid page request."):
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+class UnknownTenantException(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown tenant.")
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from fastapi_simplified.metrics.timing import prometheus_text
+
+# Opt-in router that exposes the phase histograms to Prometheus
+metrics_router = APIRouter()
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,63 @@
+import time
+from fastapi import FastAPI
+from fastapi_simplified.metrics.timing import *
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that collects the phase timings of each request, adds them to the response as a
+    `Server-Timing` header (e.g. `db;dur=1.9, password_verify;dur=231.4, total;dur=236.0`) and records
+    the `total` phase. Nested phases are included in the phases around them.
+
+    The header is written when the response starts, so phases that run while a streaming body is
+    being sent only show up in the histograms.
+
+    Attributes
+    ----------
+    * app : `ASGIApp` \\
+        The wrapped application.
+    * header : `bool`, `optional` \\
+        Add the `Server-Timing` header. Turn it off to only feed the histograms.
+    """
+    def __init__(self, app, header:bool = True) -> None:
+        self.app = app
+        self.header : bool = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not timing_enabled():
+            await self.app(scope, receive, send)
+            return
+
+        token = start_request_timings()
+        started = time.perf_counter()
+
+        async def send_with_timings(message):
+            if message["type"] == "http.response.start" and self.header:
+                elapsed = time.perf_counter() - started
+                metrics = [f"{name};dur={seconds * 1000:.1f}" for name, (seconds, _) in request_timings().items()]
+                metrics.append(f"total;dur={elapsed * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(metrics).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            stop_request_timings(token)
+            record("total", time.perf_counter() - started)
+
+
+def install_timing(app:FastAPI, header:bool = True) -> None:
+    """
+    Turn timing on and add `ServerTimingMiddleware` to `app`.
+
+    Parameters
+    ----------
+    * app : `FastAPI` \\
+        The application.
+    * header : `bool`, `optional` \\
+        Add the `Server-Timing` header to responses.
+    """
+    enable_timing()
+    app.add_middleware(ServerTimingMiddleware, header=header)
@@ -0,0 +1,230 @@
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable
+
+# Upper bounds (seconds) of the histogram buckets, from sub-millisecond lookups to slow bcrypt rounds
+BUCKETS : tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Timing is off until `enable_timing()` is called; instrumented functions then cost a single flag check
+_enabled : bool = False
+
+# Durations of the current request by phase as `[seconds, count]`, set by `ServerTimingMiddleware`
+_request_timings : ContextVar[dict] = ContextVar("request_timings", default=None)
+
+# Phases currently running in this context, so nested calls of the same phase are only counted once
+_active_phases : ContextVar[tuple] = ContextVar("active_phases", default=())
+
+_listeners : list[Callable[[str, float], None]] = []
+
+
+class Histogram:
+    """
+    A cumulative latency histogram with fixed buckets, safe to update from worker threads.
+
+    Attributes
+    ----------
+    * buckets : `tuple[float, ...]` \\
+        Upper bounds of the buckets in seconds.
+    * counts : `list[int]` \\
+        Number of observations per bucket, plus one for observations above the last bound.
+    * sum : `float` \\
+        Total of all observations in seconds.
+    * count : `int` \\
+        Number of observations.
+    """
+    def __init__(self, buckets:tuple[float, ...] = BUCKETS) -> None:
+        self.buckets : tuple[float, ...] = buckets
+        self.counts : list[int] = [0] * (len(buckets) + 1)
+        self.sum : float = 0.0
+        self.count : int = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds:float) -> None:
+        index = 0
+        for bound in self.buckets:
+            if seconds <= bound:
+                break
+            index += 1
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self) -> tuple[list[int], float, int]:
+        """
+        Returns the bucket counts, sum and count, read consistently.
+        """
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+_histograms : dict[str, Histogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def enable_timing(enabled:bool = True) -> None:
+    """
+    Turn the timing of instrumented phases on or off. `install_timing` turns it on.
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def timing_enabled() -> bool:
+    return _enabled
+
+
+def add_timing_listener(listener:Callable[[str, float], None]) -> None:
+    """
+    Register `listener(phase, seconds)`, called for every timed phase while timing is enabled.
+    """
+    _listeners.append(listener)
+
+
+def remove_timing_listener(listener:Callable[[str, float], None]) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def record(phase:str, seconds:float) -> None:
+    """
+    Record one duration of `phase`, in the histograms and in the timings of the current request.
+    """
+    histogram = _histograms.get(phase)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(phase, Histogram())
+    histogram.observe(seconds)
+
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.get(phase)
+        if entry is None:
+            timings[phase] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    for listener in _listeners:
+        listener(phase, seconds)
+
+
+@contextmanager
+def phase(name:str):
+    """
+    Time a block as phase `name`.
+
+    ```python
+    with phase("render"):
+        ...
+    ```
+    """
+    if not _enabled or name in _active_phases.get():
+        yield
+        return
+    token = _active_phases.set(_active_phases.get() + (name,))
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _active_phases.reset(token)
+        record(name, time.perf_counter() - started)
+
+
+def timed(name:str):
+    """
+    Decorator that times every call of a function or coroutine function as phase `name`. Calls
+    nested in a running phase of the same name (e.g. a repository method calling another) are
+    only counted once.
+
+    Parameters
+    ----------
+    * name : `str` \\
+        The phase, e.g. `"db"`. Used as the `Server-Timing` metric name and the histogram label.
+    """
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def timed_coroutine(*args, **kwargs):
+                if not _enabled or name in _active_phases.get():
+                    return await function(*args, **kwargs)
+                token = _active_phases.set(_active_phases.get() + (name,))
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    _active_phases.reset(token)
+                    record(name, time.perf_counter() - started)
+            return timed_coroutine
+
+        @wraps(function)
+        def timed_function(*args, **kwargs):
+            if not _enabled or name in _active_phases.get():
+                return function(*args, **kwargs)
+            token = _active_phases.set(_active_phases.get() + (name,))
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _active_phases.reset(token)
+                record(name, time.perf_counter() - started)
+        return timed_function
+    return decorator
+
+
+def start_request_timings() -> object:
+    """
+    Start collecting the phase timings of a request. Returns the token for `stop_request_timings`.
+    """
+    return _request_timings.set({})
+
+
+def request_timings() -> dict[str, tuple[float, int]]:
+    """
+    Returns the total seconds and number of calls of each phase of the current request so far.
+    """
+    timings = _request_timings.get() or {}
+    return {name: (seconds, count) for name, (seconds, count) in timings.items()}
+
+
+def stop_request_timings(token:object) -> None:
+    _request_timings.reset(token)
+
+
+def histograms() -> dict[str, Histogram]:
+    """
+    Returns the histogram of every phase recorded so far.
+    """
+    return dict(_histograms)
+
+
+def reset_histograms() -> None:
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def prometheus_text(namespace:str = "fastapi_simplified") -> str:
+    """
+    Render the phase histograms in the Prometheus text exposition format.
+
+    Returns
+    -------
+    * `str` \\
+        One `<namespace>_phase_seconds` histogram, labelled by `phase`.
+    """
+    metric = f"{namespace}_phase_seconds"
+    lines = [f"# HELP {metric} Time spent per request phase in seconds.", f"# TYPE {metric} histogram"]
+    for name, histogram in sorted(histograms().items()):
+        counts, total, count = histogram.snapshot()
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{metric}_bucket{{phase="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{phase="{name}",le="+Inf"}} {count}')
+        lines.append(f'{metric}_sum{{phase="{name}"}} {total}')
+        lines.append(f'{metric}_count{{phase="{name}"}} {count}')
+    return "\n".join(lines) + "\n"
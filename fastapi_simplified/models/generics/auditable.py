@@ -1,8 +1,11 @@
 # import statements
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from sqlalchemy.schema import Column
 from sqlalchemy.types import *
 from sqlalchemy.sql import func
 from fastapi_simplified.config.database_config import Base
+from fastapi_simplified.security.utils.principal import current_username
 
 
 class Auditable(Base):
@@ -10,6 +13,10 @@ class Auditable(Base):
     Abstract base class to add auditing fields to entities. All entities in the
     system should extend this class.
 
+    `created_by` and `last_modified_by` are filled with the username of the user
+    authenticated by the current request (see `current_principal`) when the entity
+    is flushed. Writes made outside of an authenticated request leave them untouched.
+
     Attributes
     ----------
     * created_by : `String`\\
@@ -27,3 +34,32 @@ class Auditable(Base):
     created_date = Column(DateTime, default=func.now())
     last_modified_by = Column(String(255))
     last_modified_date = Column(DateTime, onupdate=func.now())
+
+    def stamp_modified(self, username:str = None) -> None:
+        """
+        Set `last_modified_by`, for writes that bypass the session flush (e.g. bulk `UPDATE`s).
+
+        Parameters
+        ----------
+        * username : `str`, `optional`\\
+            Who modified the entity. Defaults to the current user; nothing is set without one
+        """
+        username = username or current_username()
+        if username is not None:
+            self.last_modified_by = username
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_auditable(session:Session, flush_context, instances) -> None:
+    # Also applies to async sessions, which flush through a sync `Session`
+    username = current_username()
+    if username is None:
+        return
+    for entity in session.new:
+        if isinstance(entity, Auditable):
+            if entity.created_by is None:
+                entity.created_by = username
+            entity.last_modified_by = username
+    for entity in session.dirty:
+        if isinstance(entity, Auditable) and session.is_modified(entity, include_collections=False):
+            entity.last_modified_by = username
@@ -0,0 +1,83 @@
+from sqlalchemy import select
+from fastapi_simplified.repositories.generics.async_generic_repository import AsyncGenericRepository
+from fastapi_simplified.repositories.generics.i_user_repository import AsyncUserDetailsRepository
+from fastapi_simplified.models.custom_user import CustomUser
+from fastapi_simplified.security.utils.principal import Principal, principal_columns
+from fastapi_simplified.metrics.timing import timed
+
+
+class AsyncUserRepository(AsyncUserDetailsRepository, AsyncGenericRepository):
+    """
+    Async User Repository class that implements `AsyncUserDetailsRepository` formal interface and inherits from
+    `AsyncGenericRepository`. Includes coroutines for crud and additional methods.
+
+    Attributes
+    ----------
+    Same as super
+
+    Methods
+    --------
+    Same as super with additional methods
+    * find_by_username(username:`str`) -> `CustomUser`
+    * find_principal_by_username(username:`str`) -> `Principal`
+    * find_principals_by_usernames(usernames:`list[str]`) -> `list[Principal]`
+    """
+    def __init__(self, model: CustomUser) -> None:
+        super().__init__(model)
+
+    @timed("db")
+    async def find_by_username(self, username:str) -> CustomUser:
+        """
+        Finds a user entity via username
+
+        Parameters
+        ------------
+        * username : `str`\\
+            The username of the user
+
+        Returns
+        --------
+        * `User` **(Change return to the active user type)** : The found user
+        """
+        async with self.get_db() as db:
+            result = await db.scalars(select(self.model).where(self.model.username == username).limit(1))
+            return result.first()
+
+    @timed("db")
+    async def find_principal_by_username(self, username:str) -> Principal:
+        """
+        Finds the principal of a user via username, selecting only the columns it needs. Nothing is
+        added to the session, and the password hash isn't loaded.
+
+        Parameters
+        ------------
+        * username : `str`\\
+            The username of the user
+
+        Returns
+        --------
+        * `Principal` : The immutable principal of the user, or None if not found
+        """
+        async with self.get_db() as db:
+            result = await db.execute(select(*principal_columns(self.model)).where(self.model.username == username).limit(1))
+            row = result.first()
+            return Principal.from_row(row) if row is not None else None
+
+    @timed("db")
+    async def find_principals_by_usernames(self, usernames:list[str]) -> list[Principal]:
+        """
+        Finds the principals of several users via username with a single `IN` query, selecting only
+        the columns they need.
+
+        Parameters
+        ------------
+        * usernames : `list[str]`\\
+            The usernames of the users
+
+        Returns
+        --------
+        * `list[Principal]` : The principals of the users found, in no particular order
+        """
+        async with self.get_db() as db:
+            result = await db.execute(select(*principal_columns(self.model)).where(self.model.username.in_(usernames)))
+            return [Principal.from_row(row) for row in result]
@@ -0,0 +1,300 @@
+from typing import AsyncIterator, Generic, TypeVar
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from fastapi_simplified.config.database_config import *
+from sqlalchemy.exc import IntegrityError
+from fastapi_simplified.exceptions.resource_exceptions import *
+from fastapi_simplified.repositories.generics.write_events import notify_write
+from fastapi_simplified.repositories.generics.pagination import keyset_page, keyset_statement
+from fastapi_simplified.repositories.generics.count_cache import count_cache, count_statement, estimate_statement
+from fastapi_simplified.repositories.generics.audit_trail import audit_trail # registers the audit log write listener
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.metrics.timing import timed
+
+T = TypeVar("T")
+
+class AsyncGenericRepository(Generic[T]):
+    """
+    The asyncio counterpart of `GenericRepository`. It consumes a generic model and uses it as its basis for CRUD
+    operations, awaiting the database instead of blocking the event loop.
+
+    Every operation opens its own short-lived `AsyncSession`, since an `AsyncSession` must not be shared between
+    concurrently running tasks. Entities are returned detached (`expire_on_commit=False`) so their loaded attributes
+    stay readable after the session closes.
+
+    Attributes
+    ----------
+    * model : `T` \\
+        The model object. This is expected to be an object of type `Auditable`.
+    * engine : `AsyncEngine` \\
+        The async engine, created on first use rather than when the repository is.
+
+    Methods
+    -------
+    * __init__(model: `T`) \\
+        Initializes a new AsyncGenericRepository instance with the provided model object.
+    * create_tables() -> `None` \\
+        Creates tables in the database for the model associated with this repository.
+    * get_db() -> `AsyncSession` \\
+        Returns a new session for database operations.
+    * find_all(limit: `int`, offset: `int`) -> `list[T]` \\
+        Finds all instances of the entity in the database.
+    * find_all_with_total(limit: `int`, offset: `int`) -> `tuple[list[T], int]` \\
+        Finds a page of entities along with the number of entities in the table.
+    * find_page(limit: `int`, cursor: `str`, order_by: `str`, descending: `bool`) -> `tuple[list[T], str]` \\
+        Finds a page of entities after a cursor, using keyset pagination.
+    * count(mode: `str`) -> `int` \\
+        Returns the number of entities in the table, from the count cache when possible.
+    * stream_all(batch_size: `int`) -> `AsyncIterator[T]` \\
+        Iterates over every instance of the entity with a server-side cursor.
+    * find_by_id(id: `int`) -> `T` \\
+        Finds a specific instance of the entity in the database by ID.
+    * save(item: `T`) -> `T` \\
+        Saves an instance of the entity object to the database.
+    * update(updateItem: `T`) -> `None` \\
+        Updates the properties of an entity and persists it to the database.
+    * delete_by_id(id: `int`) -> `None` \\
+        Deletes a specific instance of the entity from the database by ID.
+    """
+    def __init__(self, model:T) -> None:
+        self.model : T = model
+        self.base : any = Base
+
+    # The engine is only resolved on first use, so that repositories can be declared at import time,
+    # before the async database settings are in place
+    @property
+    def engine(self) -> AsyncEngine:
+        return get_async_engine()
+
+    @property
+    def session_factory(self) -> async_sessionmaker:
+        return get_async_session_factory()
+
+    async def create_tables(self) -> None:
+        """
+        Creates tables in the database for the model associated with this repository.
+
+        Unlike `GenericRepository` this cannot run from the constructor, so await it once on startup.
+        """
+        async with self.engine.begin() as conn:
+            await conn.run_sync(self.base.metadata.create_all)
+
+    def get_db(self) -> AsyncSession:
+        """
+        Returns a new session for database operations. Use it as an async context manager.
+
+        Returns
+        -------
+        * `AsyncSession` \\
+            A database session.
+        """
+        return self.session_factory()
+
+    @timed("db")
+    async def find_all(self, limit:int, offset:int) -> list[T]:
+        """
+        Finds all instances of entity in database
+
+        Parameters
+        -----------
+        * limit : `int`\\
+            Maximum number of items to return
+        * offset : `int`\\
+            Value to skip collection by
+
+        Returns
+        --------
+        * list[T] : `list`\\
+            A list of the entities
+        """
+        async with self.get_db() as db:
+            result = await db.scalars(select(self.model).offset(offset).limit(limit))
+            return list(result.all())
+
+    async def find_all_with_total(self, limit:int, offset:int) -> tuple[list[T], int]:
+        """
+        Finds a page of entities like `find_all`, along with the number of entities in the table given by `count`
+
+        Parameters
+        -----------
+        * limit : `int`\\
+            Maximum number of items to return
+        * offset : `int`\\
+            Value to skip collection by
+
+        Returns
+        --------
+        * tuple[list[T], int] : `tuple`\\
+            The entities of the page and the total
+        """
+        return await self.find_all(limit, offset), await self.count()
+
+    @timed("db")
+    async def count(self, mode:str = None) -> int:
+        """
+        Returns the number of entities in the table, from the count cache when possible. See `GenericRepository.count`.
+
+        Parameters
+        -----------
+        * mode : `str`, `optional`\\
+            `"exact"` or `"estimate"`. Defaults to `COUNT_MODE`
+
+        Returns
+        --------
+        * int : `int`\\
+            The number of entities
+        """
+        exact = (mode or get_settings().count_mode) == "exact"
+        total = count_cache.get(self.model, exact)
+        if total is not None:
+            return total
+
+        async with self.get_db() as db:
+            estimated = None
+            if not exact:
+                statement = estimate_statement(self.model, self.engine.dialect.name)
+                estimated = (await db.execute(statement)).scalar() if statement is not None else None
+            if estimated is not None and estimated >= 0:
+                total = int(estimated)
+            else:
+                total, exact = (await db.execute(count_statement(self.model))).scalar_one(), True
+        count_cache.store(self.model, total, exact)
+        return total
+
+    @timed("db")
+    async def find_page(self, limit:int, cursor:str = None, order_by:str = None, descending:bool = False) -> tuple[list[T], str]:
+        """
+        Finds a page of entities after `cursor`, using keyset pagination. See `GenericRepository.find_page`.
+
+        Parameters
+        -----------
+        * limit : `int`\\
+            Maximum number of items to return
+        * cursor : `str`, `optional`\\
+            The `next_cursor` of the previous page. Omit it for the first page
+        * order_by : `str`, `optional`\\
+            Name of the primary key or an indexed column to sort by. Defaults to the primary key
+        * descending : `bool`, `optional`\\
+            Sort in descending order
+
+        Returns
+        --------
+        * tuple[list[T], str] : `tuple`\\
+            The entities of the page and the cursor of the next page, or `None` on the last page
+        """
+        statement = keyset_statement(self.model, limit, cursor, order_by, descending)
+        async with self.get_db() as db:
+            rows = list((await db.scalars(statement)).all())
+        return keyset_page(self.model, rows, limit, order_by, descending)
+
+    async def stream_all(self, batch_size:int = 1000) -> AsyncIterator[T]:
+        """
+        Iterates over every instance of entity in database, fetching `batch_size` rows at a time through
+        a server-side cursor. See `GenericRepository.stream_all`.
+
+        Parameters
+        -----------
+        * batch_size : `int`, `optional`\\
+            Number of rows fetched per round trip
+
+        Yields
+        --------
+        * T : `Auditable`\\
+            The entities, in primary key order
+        """
+        primary_key = getattr(self.model, inspect(self.model).primary_key[0].key)
+        statement = select(self.model).order_by(primary_key).execution_options(yield_per=batch_size)
+        async with self.get_db() as db:
+            async for item in await db.stream_scalars(statement):
+                yield item
+
+    @timed("db")
+    async def find_by_id(self, id:int) -> T:
+        """
+        Finds specific instance of entity in database by `id`
+
+        Parameters
+        -----------
+        * id : `int`\\
+            Identifying number of row in table
+
+        Returns
+        --------
+        * T : `Auditable`\\
+            The found entity
+        """
+        async with self.get_db() as db:
+            return await db.get(self.model, id)
+
+    @timed("db")
+    async def save(self, item:T) -> T:
+        """
+        Saves instance of entity object to database
+
+        Parameters
+        -----------
+        * item : `T`\\
+            The entity to be saved to db
+
+        Returns
+        --------
+        * T : `Auditable`\\
+            The saved entity
+        """
+        async with self.get_db() as db:
+            try:
+                db.add(item)
+                await db.commit()
+                await db.refresh(item)
+            except IntegrityError:
+                await db.rollback()
+                raise UsernameOrEmailAlreadyExistsException()
+        notify_write("save", item)
+        return item
+
+    @timed("db")
+    async def update(self, updateItem:T) -> None:
+        """
+        Updates the properties of an entity and persists it to the database
+
+        Parameters
+        -----------
+        * updateItem : `T`\\
+            The updated information pertaining to an entity
+
+        Returns
+        --------
+        `None`
+        """
+        if updateItem is not None:
+            async with self.get_db() as db:
+                try:
+                    merged = await db.merge(updateItem)
+                    await db.commit()
+                    await db.refresh(merged)
+                except IntegrityError:
+                    await db.rollback()
+                    raise UsernameOrEmailAlreadyExistsException()
+            notify_write("update", merged)
+
+    @timed("db")
+    async def delete_by_id(self, id:int) -> None:
+        """
+        Deletes specific instance of entity from database by `id`
+
+        Parameters
+        -----------
+        * id : `int`\\
+            Identifying number of row in table
+
+        Returns
+        --------
+        * `None`
+        """
+        async with self.get_db() as db:
+            item:T = await db.get(self.model, id)
+
+            if item is not None:
+                await db.delete(item)
+                await db.commit()
+                notify_write("delete", item)
@@ -0,0 +1,205 @@
+import atexit
+import logging
+import os
+import threading
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Any
+from sqlalchemy import Column, DateTime, Engine, Index, Integer, MetaData, String, Table, inspect, insert
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.config.tenancy import current_tenant, tenant_registry
+from fastapi_simplified.repositories.generics.write_events import add_write_listener
+from fastapi_simplified.security.utils.principal import current_username
+
+logger = logging.getLogger(__name__)
+
+# Kept off `Base.metadata`, so the table is only created when the audit log is enabled
+audit_log_table = Table(
+    "audit_log", MetaData(),
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("action", String(16), nullable=False),
+    Column("entity", String(255), nullable=False),
+    Column("entity_id", String(255)),
+    Column("actor", String(255)),
+    Column("occurred_at", DateTime(timezone=True), nullable=False),
+    Index("ix_audit_log_entity", "entity", "entity_id"),
+)
+
+
+def _entity_id(entity:Any) -> str:
+    # Read the primary key without loading anything, deleted entities are detached by now
+    state = inspect(entity)
+    identity = state.identity
+    if identity is None:
+        identity = tuple(state.dict.get(state.mapper.get_property_by_column(column).key) for column in state.mapper.primary_key)
+    return ",".join(str(value) for value in identity)
+
+
+class AuditTrail:
+    """
+    Append-only log of the writes made through the repositories, stored in the `audit_log` table.
+
+    Every saved, updated and deleted entity is recorded with the action, its table and primary key, the
+    username of the current user and the time. Records are only buffered by the write listener; a
+    background thread inserts them in multi-row `INSERT`s of up to `batch_size` records, every
+    `flush_interval` seconds or as soon as a batch is full, so auditing adds no write to the requests
+    themselves. At most `max_pending` records wait in memory: when the database can't keep up, further
+    records are dropped and counted instead of slowing the application down. Pending records are written
+    by `close()`, which runs on interpreter exit, and should be called on application shutdown. The
+    writes of a tenant are recorded in the database of the tenant.
+
+    ```python
+    app.add_event_handler("shutdown", audit_trail.close)
+    ```
+
+    Attributes
+    ----------
+    * engine : `Engine`, `optional` \\
+        Engine the records made outside of a tenant are written with. Defaults to `get_engine()`.
+    * max_pending, batch_size, flush_interval : `optional` \\
+        Default to `AUDIT_LOG_MAX_PENDING`, `AUDIT_LOG_BATCH_SIZE` and `AUDIT_LOG_FLUSH_INTERVAL`.
+
+    Methods
+    -------
+    * on_write(action: `str`, entities: `list`) -> `None` \\
+        Repository write listener that buffers a record per entity, when `AUDIT_LOG_ENABLED` is set.
+    * flush() -> `int` \\
+        Writes the pending records now and returns how many were written.
+    * close(timeout: `float`) -> `None` \\
+        Stops the background writer and writes the pending records.
+    * stats() -> `dict` \\
+        Returns the number of pending, written, dropped and failed records.
+    """
+    def __init__(self, engine:Engine = None, max_pending:int = None, batch_size:int = None,
+                 flush_interval:float = None) -> None:
+        self._engine : Engine = engine
+        self._max_pending : int = max_pending
+        self._batch_size : int = batch_size
+        self._flush_interval : float = flush_interval
+        # (tenant, record) pairs, in the order of the writes
+        self._pending : list[tuple[str, dict]] = []
+        self._condition = threading.Condition()
+        # Held while writing, so that `flush()` and the background writer don't write concurrently
+        self._flush_lock = threading.Lock()
+        self._thread : threading.Thread = None
+        self._pid : int = None
+        self._closed : bool = False
+        # Tenants (`None` for the default database) whose audit_log table is known to exist
+        self._tables_ready : set[str] = set()
+        self.written : int = 0
+        self.dropped : int = 0
+        self.failed : int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return get_settings().audit_log_enabled
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            from fastapi_simplified.config.database_config import get_engine
+            return get_engine()
+        return self._engine
+
+    @property
+    def max_pending(self) -> int:
+        return get_settings().audit_log_max_pending if self._max_pending is None else self._max_pending
+
+    @property
+    def batch_size(self) -> int:
+        return get_settings().audit_log_batch_size if self._batch_size is None else self._batch_size
+
+    @property
+    def flush_interval(self) -> float:
+        return get_settings().audit_log_flush_interval if self._flush_interval is None else self._flush_interval
+
+    def on_write(self, action:str, entities:list) -> None:
+        if not self.enabled:
+            return
+        actor = current_username()
+        tenant = current_tenant()
+        occurred_at = datetime.now(timezone.utc)
+        records = [
+            (tenant, {"action": action, "entity": str(inspect(entity).mapper.local_table.name), "entity_id": _entity_id(entity),
+             "actor": actor, "occurred_at": occurred_at})
+            for entity in entities
+        ]
+        with self._condition:
+            room = self.max_pending - len(self._pending)
+            if room < len(records):
+                if self.dropped == 0:
+                    logger.warning("Audit log queue is full, records are being dropped")
+                self.dropped += len(records) - max(room, 0)
+                records = records[:max(room, 0)]
+            self._pending.extend(records)
+            self._ensure_writer()
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def _ensure_writer(self) -> None:
+        # Started on first use, and again in forked workers, which don't inherit the thread
+        if self._closed or (self._thread is not None and self._pid == os.getpid()):
+            return
+        if self._pid is None:
+            atexit.register(self.close)
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="audit-trail-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if len(self._pending) < self.batch_size and not self._closed:
+                    self._condition.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _take_batch(self) -> list[tuple[str, dict]]:
+        with self._condition:
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            return batch
+
+    def flush(self) -> int:
+        written = 0
+        with self._flush_lock:
+            while batch := self._take_batch():
+                by_tenant : dict[str, list[dict]] = {}
+                for tenant, record in batch:
+                    by_tenant.setdefault(tenant, []).append(record)
+                for tenant, records in by_tenant.items():
+                    if self._write(tenant, records):
+                        written += len(records)
+        return written
+
+    def _write(self, tenant:str, records:list[dict]) -> bool:
+        try:
+            lease = nullcontext(self.engine) if tenant is None else tenant_registry.lease(tenant)
+            with lease as engine, engine.begin() as connection:
+                if tenant not in self._tables_ready:
+                    if get_settings().create_schema:
+                        audit_log_table.create(connection, checkfirst=True)
+                    self._tables_ready.add(tenant)
+                connection.execute(insert(audit_log_table).values(records))
+        except Exception:
+            # Records are never retried, so that a broken database can't make them pile up
+            logger.exception("Failed to write %d audit log records", len(records))
+            self.failed += len(records)
+            return False
+        self.written += len(records)
+        return True
+
+    def close(self, timeout:float = 5) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "written": self.written, "dropped": self.dropped, "failed": self.failed}
+
+
+audit_trail = AuditTrail()
+add_write_listener(audit_trail.on_write)
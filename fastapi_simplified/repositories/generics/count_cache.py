@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import Counter
+from typing import Any
+from sqlalchemy import func, select, text
+from sqlalchemy.sql import Executable
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.config.tenancy import current_tenant
+from fastapi_simplified.repositories.generics.write_events import add_write_listener
+
+# Row count estimates kept by the database statistics, by dialect. They cost a catalog lookup instead of a scan
+_ESTIMATE_QUERIES : dict[str, str] = {
+    "postgresql": "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)",
+    "mysql": "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = :table",
+    "mariadb": "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = :table",
+}
+
+
+def count_statement(model:Any) -> Executable:
+    """
+    Returns the `SELECT COUNT(*)` statement of the table of `model`.
+    """
+    return select(func.count()).select_from(model)
+
+
+def estimate_statement(model:Any, dialect:str) -> Executable:
+    """
+    Returns the statement reading the row count estimate of the table of `model` from the database
+    statistics, or `None` if the dialect keeps none. The estimate may be `NULL` or negative for tables
+    that were never analyzed.
+    """
+    query = _ESTIMATE_QUERIES.get(dialect)
+    if query is None:
+        return None
+    return text(query).bindparams(table=model.__table__.name)
+
+
+class CountCache:
+    """
+    Per-model cache of table row counts, so that paginated listings can report a total without
+    counting the table on every page.
+
+    A count is read from the database once, then kept current by the saves and deletes made through
+    the repositories, and read again after `COUNT_CACHE_TTL` seconds to pick up writes made elsewhere
+    (other processes, raw SQL). Counts are either exact (`SELECT COUNT(*)`) or estimates taken from
+    the database statistics; exact lookups never return an estimate. Every tenant has counts of its own.
+
+    Attributes
+    ----------
+    * ttl : `float`, `optional` \\
+        Seconds after which a count is read again. Defaults to `COUNT_CACHE_TTL`.
+
+    Methods
+    -------
+    * get(model: `type`, exact: `bool`) -> `int` \\
+        Returns the cached count of a model, or `None` if it is missing or expired.
+    * store(model: `type`, count: `int`, exact: `bool`) -> `None` \\
+        Caches the count read from the database.
+    * invalidate(model: `type`) -> `None` \\
+        Forgets the count of a model.
+    * on_write(action: `str`, entities: `list`) -> `None` \\
+        Repository write listener that adjusts the counts of the written models.
+    """
+    def __init__(self, ttl:float = None) -> None:
+        self._ttl : float = ttl
+        # (tenant, model) -> (count, whether it is exact, refreshed at)
+        self._counts : dict[tuple[str, type], tuple[int, bool, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> float:
+        return get_settings().count_cache_ttl if self._ttl is None else self._ttl
+
+    def get(self, model:type, exact:bool = True) -> int:
+        entry = self._counts.get((current_tenant(), model))
+        if entry is None or (exact and not entry[1]) or time.monotonic() - entry[2] >= self.ttl:
+            return None
+        return entry[0]
+
+    def store(self, model:type, count:int, exact:bool = True) -> None:
+        with self._lock:
+            self._counts[(current_tenant(), model)] = (max(count, 0), exact, time.monotonic())
+
+    def invalidate(self, model:type) -> None:
+        with self._lock:
+            self._counts.pop((current_tenant(), model), None)
+
+    def on_write(self, action:str, entities:list) -> None:
+        if action == "update" or not self._counts:
+            return
+        sign = 1 if action == "save" else -1
+        tenant = current_tenant()
+        with self._lock:
+            for model, written in Counter(type(entity) for entity in entities).items():
+                entry = self._counts.get((tenant, model))
+                if entry is not None:
+                    self._counts[(tenant, model)] = (max(entry[0] + sign * written, 0), entry[1], entry[2])
+
+
+count_cache = CountCache()
+add_write_listener(count_cache.on_write)
@@ -1,31 +1,69 @@
-from typing import Generic, TypeVar
+from itertools import islice
+from typing import Generic, Iterable, Iterator, TypeVar
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy import Engine
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import Engine, delete, inspect, select, update
 from fastapi_simplified.config.database_config import *
 from sqlalchemy.exc import IntegrityError
 from fastapi_simplified.exceptions.resource_exceptions import *
+from fastapi_simplified.repositories.generics.write_events import notify_write, notify_writes
+from fastapi_simplified.repositories.generics.pagination import keyset_page, keyset_statement
+from fastapi_simplified.repositories.generics.count_cache import count_cache, count_statement, estimate_statement
+from fastapi_simplified.repositories.generics.audit_trail import audit_trail # registers the audit log write listener
+from fastapi_simplified.models.generics.auditable import Auditable
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.schemas.responses.bulk_write_response import BulkWriteError, BulkWriteResult
+from fastapi_simplified.metrics.timing import timed
 
 T = TypeVar("T")
 
+
+def _chunked(items:Iterable, chunk_size:int) -> Iterator[tuple[int, list]]:
+    """
+    Split `items` into lists of at most `chunk_size` elements, without materializing the whole iterable.
+    Yields each chunk along with the position of its first element.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"The chunk size must be at least 1, got {chunk_size}")
+    iterator = iter(items)
+    offset = 0
+    while chunk := list(islice(iterator, chunk_size)):
+        yield offset, chunk
+        offset += len(chunk)
+
 class GenericRepository(Generic[T]):
     """
     A repository class that is built on generics. It consumes a generic model and uses it as its basis for CRUD operations.
 
+    The repository doesn't hold a session of its own. Each operation runs on the session of the current unit of
+    work (see `session_scope` and the `get_db` dependency), so one repository instance can safely serve concurrent
+    requests. Outside of a unit of work a thread-local session is used.
+
     Attributes
     ----------
     * model : `T` \\
         The model object. This is expected to be an object of type `Auditable`.
+    * db : `Session` \\
+        The session of the current unit of work.
 
     Methods
     -------
     * __init__(model: `T`) \\
         Initializes a new GenericRepository instance with the provided model object.
     * create_tables() -> `None` \\
-        Creates tables in the database for the model associated with this repository.
+        Creates the missing tables in the database, once.
     * get_db() -> `Session` \\
-        Returns a session for database operations.
+        Returns the session of the current unit of work.
     * find_all(limit: `int`, offset: `int`) -> `list[T]` \\
         Finds all instances of the entity in the database.
+    * find_all_with_total(limit: `int`, offset: `int`) -> `tuple[list[T], int]` \\
+        Finds a page of entities along with the number of entities in the table.
+    * find_page(limit: `int`, cursor: `str`, order_by: `str`, descending: `bool`) -> `tuple[list[T], str]` \\
+        Finds a page of entities after a cursor, using keyset pagination.
+    * count(mode: `str`) -> `int` \\
+        Returns the number of entities in the table, from the count cache when possible.
+    * stream_all(batch_size: `int`) -> `Iterator[T]` \\
+        Iterates over every instance of the entity with a server-side cursor.
     * find_by_id(id: `int`) -> `T` \\
         Finds a specific instance of the entity in the database by ID.
     * save(item: `T`) -> `T` \\
@@ -34,39 +72,53 @@ class GenericRepository(Generic[T]):
         Updates the properties of an entity and persists it to the database.
     * delete_by_id(id: `int`) -> `None` \\
         Deletes a specific instance of the entity from the database by ID.
+    * save_all(items: `Iterable[T]`, chunk_size: `int`) -> `BulkWriteResult` \\
+        Saves many entities in one transaction.
+    * update_many(items: `Iterable[T]`, chunk_size: `int`) -> `BulkWriteResult` \\
+        Persists the properties of many entities in one transaction.
+    * delete_by_ids(ids: `Iterable[int]`, chunk_size: `int`) -> `BulkWriteResult` \\
+        Deletes many entities by ID in one transaction.
     """
     def __init__(self, model:T) -> None:
         self.model : T = model
 
-        # Get the engine, session and base attributes for db connection
-        self.engine: Engine = DbEngine
-        self.db: Session = SessionLocal()
+        # Get the base attributes for db connection. The engine is only created on first use
         self.base : any = Base
 
-        # Create tables and get database when object is created
-        self.create_tables()
-        self.get_db()
+        # Have the table created before the first operation, without touching the database now
+        register_model(self.model)
+
+    @property
+    def engine(self) -> Engine:
+        return get_engine()
+
+    @property
+    def db(self) -> Session:
+        return self.get_db()
 
     def create_tables(self) -> None:
         """
-        Creates tables in the database for the model associated with this repository.
+        Creates the missing tables in the database, once. This also happens automatically before the
+        first operation of the repository, unless `CREATE_SCHEMA` is false.
         """
-        self.base.metadata.create_all(bind = self.engine)
+        bootstrap_schema(force=True)
 
-    def get_db(self):
+    def get_db(self) -> Session:
         """
-        Returns a session for database operations.
+        Returns the session of the current unit of work, or the thread-local session when none is active.
 
         Returns
         -------
         * `Session` \\
             A database session.
         """
-        try:
-            yield self.db
-        finally:
-            self.db.close()
+        ensure_schema()
+        session = current_session()
+        if session is not None:
+            return session
+        return ScopedSession()
 
+    @timed("db")
     def find_all(self, limit:int, offset:int) -> list[T]:
         """
         Finds all instances of entity in database
@@ -86,6 +138,117 @@ class GenericRepository(Generic[T]):
         # Handle exceptions
         return self.db.query(self.model).offset(offset).limit(limit).all()
 
+    def find_all_with_total(self, limit:int, offset:int) -> tuple[list[T], int]:
+        """
+        Finds a page of entities like `find_all`, along with the number of entities in the table given by `count`
+
+        Parameters
+        -----------
+        * limit : `int`\\
+            Maximum number of items to return
+        * offset : `int`\\
+            Value to skip collection by
+
+        Returns
+        --------
+        * tuple[list[T], int] : `tuple`\\
+            The entities of the page and the total
+        """
+        return self.find_all(limit, offset), self.count()
+
+    @timed("db")
+    def count(self, mode:str = None) -> int:
+        """
+        Returns the number of entities in the table. Counts are cached per model, kept current by the
+        saves and deletes made through the repositories and read again after `COUNT_CACHE_TTL` seconds.
+
+        Parameters
+        -----------
+        * mode : `str`, `optional`\\
+            `"exact"` to count the rows with `SELECT COUNT(*)`, or `"estimate"` to read the row count kept by
+            the database statistics (PostgreSQL and MySQL), which never scans the table. Databases without
+            statistics are counted exactly. Defaults to `COUNT_MODE`
+
+        Returns
+        --------
+        * int : `int`\\
+            The number of entities
+        """
+        exact = (mode or get_settings().count_mode) == "exact"
+        total = count_cache.get(self.model, exact)
+        if total is not None:
+            return total
+
+        estimated = None
+        if not exact:
+            statement = estimate_statement(self.model, self.engine.dialect.name)
+            estimated = self.db.execute(statement).scalar() if statement is not None else None
+        if estimated is not None and estimated >= 0:
+            total = int(estimated)
+        else:
+            total, exact = self.db.execute(count_statement(self.model)).scalar_one(), True
+        count_cache.store(self.model, total, exact)
+        return total
+
+    @timed("db")
+    def find_page(self, limit:int, cursor:str = None, order_by:str = None, descending:bool = False) -> tuple[list[T], str]:
+        """
+        Finds a page of entities after `cursor`, using keyset pagination. Unlike `find_all` the database
+        seeks straight to the cursor instead of skipping rows, so every page costs the same however deep it is.
+
+        Parameters
+        -----------
+        * limit : `int`\\
+            Maximum number of items to return
+        * cursor : `str`, `optional`\\
+            The `next_cursor` of the previous page. Omit it for the first page
+        * order_by : `str`, `optional`\\
+            Name of the primary key or an indexed column to sort by. Defaults to the primary key
+        * descending : `bool`, `optional`\\
+            Sort in descending order
+
+        Returns
+        --------
+        * tuple[list[T], str] : `tuple`\\
+            The entities of the page and the cursor of the next page, or `None` on the last page
+
+        Raises
+        -------
+        * `InvalidCursorException` \\
+            If the cursor is malformed or was issued for a different ordering
+        * `InvalidPageRequestException` \\
+            If `limit` is below 1, or `order_by` is unknown or not indexed
+        """
+        statement = keyset_statement(self.model, limit, cursor, order_by, descending)
+        rows = list(self.db.scalars(statement).all())
+        return keyset_page(self.model, rows, limit, order_by, descending)
+
+    def stream_all(self, batch_size:int = 1000) -> Iterator[T]:
+        """
+        Iterates over every instance of entity in database. Rows are fetched `batch_size` at a time through
+        a server-side cursor, so memory stays flat however large the table is.
+
+        The iteration runs on a dedicated session that is closed once the generator is exhausted or closed,
+        which lets it outlive the request, e.g. inside a `StreamingResponse`.
+
+        Parameters
+        -----------
+        * batch_size : `int`, `optional`\\
+            Number of rows fetched per round trip
+
+        Yields
+        --------
+        * T : `Auditable`\\
+            The entities, in primary key order
+        """
+        primary_key = getattr(self.model, inspect(self.model).primary_key[0].key)
+        statement = select(self.model).order_by(primary_key).execution_options(yield_per=batch_size)
+        ensure_schema()
+        with SessionLocal() as session:
+            for item in session.scalars(statement):
+                yield item
+
+    @timed("db")
     def find_by_id(self, id:int) -> T:
         """
         Finds specific instance of entity in database by `id`
@@ -103,6 +266,7 @@ class GenericRepository(Generic[T]):
         # Handle exceptions
         return self.db.query(self.model).get(id)
 
+    @timed("db")
     def save(self, item:T) -> T:
         """
         Saves instance of entity object to database
@@ -121,12 +285,14 @@ class GenericRepository(Generic[T]):
             self.db.add(item)
             self.db.commit()
             self.db.refresh(item)
-            return item
         except IntegrityError:
             self.db.rollback()
             raise UsernameOrEmailAlreadyExistsException()
+        notify_write("save", item)
+        return item
 
 
+    @timed("db")
     def update(self, updateItem:T) -> None:
         """
         Updates the properties of an entity and persists it to the database
@@ -143,8 +309,10 @@ class GenericRepository(Generic[T]):
         if updateItem is not None:
             self.db.commit()
             self.db.refresh(updateItem)
+            notify_write("update", updateItem)
         # Handle exceptions later
 
+    @timed("db")
     def delete_by_id(self, id:int) -> None:
         """
         Deletes specific instance of entity from database by `id`
@@ -163,5 +331,156 @@ class GenericRepository(Generic[T]):
         if item is not None:
             self.db.delete(item)
             self.db.commit()
+            notify_write("delete", item)
         # Handle exceptions later
 
+    def _write_in_savepoints(self, rows:list, offset:int, write, result:BulkWriteResult) -> list:
+        """
+        Runs `write` on a chunk of rows inside a savepoint. If the chunk violates a constraint it is retried
+        row by row, so that only the offending rows are rejected. Returns the rows that were written.
+        """
+        try:
+            with self.db.begin_nested():
+                write(rows)
+            result.succeeded += len(rows)
+            return rows
+        except IntegrityError:
+            pass
+
+        written = []
+        for position, row in enumerate(rows):
+            try:
+                with self.db.begin_nested():
+                    write([row])
+                written.append(row)
+            except IntegrityError as error:
+                result.failed.append(BulkWriteError(index=offset + position, detail=str(error.orig)))
+        result.succeeded += len(written)
+        return written
+
+    @timed("db")
+    def save_all(self, items:Iterable[T], chunk_size:int = 1000) -> BulkWriteResult:
+        """
+        Saves many entities in a single transaction. Each chunk is flushed at once, which lets the driver
+        batch the inserts (multi-row `INSERT` / `executemany`) instead of paying a round trip per entity.
+
+        Parameters
+        -----------
+        * items : `Iterable[T]`\\
+            The entities to be saved. Generators are consumed one chunk at a time
+        * chunk_size : `int`, `optional`\\
+            Number of entities flushed together
+
+        Returns
+        --------
+        * `BulkWriteResult` \\
+            The number of saved entities and the entities rejected by a constraint, by position in `items`
+        """
+        result = BulkWriteResult()
+        saved = []
+
+        def write(rows:list) -> None:
+            self.db.add_all(rows)
+            self.db.flush()
+
+        try:
+            for offset, chunk in _chunked(items, chunk_size):
+                saved.extend(self._write_in_savepoints(chunk, offset, write, result))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        notify_writes("save", saved)
+        return result
+
+    @timed("db")
+    def update_many(self, items:Iterable[T], chunk_size:int = 1000) -> BulkWriteResult:
+        """
+        Persists the properties of many entities in a single transaction, using one `executemany` UPDATE
+        by primary key per chunk. Entities don't need to be attached to the current session; only the
+        attributes that are set on them are written.
+
+        Parameters
+        -----------
+        * items : `Iterable[T]`\\
+            The updated entities
+        * chunk_size : `int`, `optional`\\
+            Number of entities updated together
+
+        Returns
+        --------
+        * `BulkWriteResult` \\
+            The number of updated entities and the entities rejected by a constraint, by position in `items`
+        """
+        result = BulkWriteResult()
+        updated = []
+        columns = {attribute.key for attribute in inspect(self.model).column_attrs}
+
+        def write(rows:list) -> None:
+            self.db.execute(update(self.model), [values for _, values in rows])
+
+        try:
+            for offset, chunk in _chunked(items, chunk_size):
+                rows = []
+                for item in chunk:
+                    if isinstance(item, Auditable):
+                        item.stamp_modified()
+                    values = {key: value for key, value in inspect(item).dict.items() if key in columns}
+                    # Mark the values as persisted so the session doesn't flush them a second time
+                    for key, value in values.items():
+                        set_committed_value(item, key, value)
+                    rows.append((item, values))
+
+                written = self._write_in_savepoints(rows, offset, write, result)
+                written_items = {id(item) for item, _ in written}
+                for item, _ in rows:
+                    if id(item) in written_items:
+                        updated.append(item)
+                    elif inspect(item).persistent:
+                        # Reload the rejected entities from the database
+                        self.db.expire(item)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        notify_writes("update", updated)
+        return result
+
+    @timed("db")
+    def delete_by_ids(self, ids:Iterable[int], chunk_size:int = 1000) -> BulkWriteResult:
+        """
+        Deletes many entities by `id` in a single transaction, using one `DELETE ... WHERE id IN (...)`
+        per chunk. IDs that don't exist are ignored.
+
+        Parameters
+        -----------
+        * ids : `Iterable[int]`\\
+            Identifying numbers of the rows in the table
+        * chunk_size : `int`, `optional`\\
+            Number of rows deleted together
+
+        Returns
+        --------
+        * `BulkWriteResult` \\
+            The number of processed IDs and the IDs rejected by a constraint, by position in `ids`
+        """
+        result = BulkWriteResult()
+        deleted = []
+        primary_key = getattr(self.model, inspect(self.model).primary_key[0].key)
+
+        def write(rows:list) -> None:
+            self.db.execute(delete(self.model).where(primary_key.in_(rows)))
+
+        try:
+            for offset, chunk in _chunked(ids, chunk_size):
+                # Load the entities first so that write listeners know what was deleted
+                entities = {getattr(entity, primary_key.key): entity
+                            for entity in self.db.scalars(select(self.model).where(primary_key.in_(chunk)))}
+                written = self._write_in_savepoints(chunk, offset, write, result)
+                deleted.extend(entities[id] for id in written if id in entities)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        notify_writes("delete", deleted)
+        return result
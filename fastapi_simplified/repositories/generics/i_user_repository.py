@@ -1,4 +1,5 @@
 import abc
+import inspect
 
 class UserDetailsRepository(metaclass=abc.ABCMeta):
     """
@@ -50,4 +51,53 @@ class UserDetailsRepository(metaclass=abc.ABCMeta):
         * `NotImplementedError` \\
             If the method is not implemented by the subclass.
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+class AsyncUserDetailsRepository(metaclass=abc.ABCMeta):
+    """
+    Abstract base class for asyncio user-entity-related repositories.
+
+    The async counterpart of `UserDetailsRepository`. Repositories built on `AsyncGenericRepository`
+    must extend this class and define the `find_by_username` coroutine.
+    """
+    @classmethod
+    def __subclasshook__(cls, subclass):
+        """
+        Check if a class is a subclass of AsyncUserDetailsRepository.
+
+        Parameters
+        ----------
+        * subclass : `type` \\
+            The class to check for subclassing AsyncUserDetailsRepository.
+
+        Returns
+        -------
+        * `bool` or `NotImplemented` \\
+            True if subclass has a coroutine `find_by_username` method, False otherwise.
+            NotImplemented if subclass is not checked for subclassing.
+        """
+        return (hasattr(subclass, 'find_by_username') and
+                inspect.iscoroutinefunction(subclass.find_by_username) or
+                NotImplemented)
+
+    @abc.abstractmethod
+    async def find_by_username(self, username:str):
+        """
+        Abstract coroutine to find a user by username.
+
+        Parameters
+        ----------
+        * username : `str` \\
+            The username of the user to find.
+
+        Returns
+        -------
+        * `User` or `None` \\
+            The user entity corresponding to the provided username, or None if not found.
+
+        Raises
+        ------
+        * `NotImplementedError` \\
+            If the method is not implemented by the subclass.
+        """
+        raise NotImplementedError
@@ -0,0 +1,180 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+from sqlalchemy import Select, and_, inspect, or_, select
+from fastapi_simplified.exceptions.resource_exceptions import InvalidCursorException, InvalidPageRequestException
+
+
+def _encode_value(value:Any) -> Any:
+    # Tag the types JSON can't round-trip on its own
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _decode_value(value:Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+
+def encode_cursor(order_by:str, descending:bool, sort_value:Any, primary_key:Any) -> str:
+    """
+    Encode the position after the last row of a page into an opaque cursor.
+
+    Parameters
+    ----------
+    * order_by : `str` \\
+        The name of the column the page is sorted by.
+    * descending : `bool` \\
+        Whether the page is sorted in descending order.
+    * sort_value : `Any` \\
+        The sort key of the last row.
+    * primary_key : `Any` \\
+        The primary key of the last row, used to break ties between equal sort keys.
+
+    Returns
+    -------
+    * `str` \\
+        A url-safe cursor.
+    """
+    payload = {"o": order_by, "d": descending, "k": [_encode_value(sort_value), _encode_value(primary_key)]}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor:str, order_by:str, descending:bool) -> tuple[Any, Any]:
+    """
+    Decode a cursor created by `encode_cursor`.
+
+    Parameters
+    ----------
+    * cursor : `str` \\
+        The cursor sent by the client.
+    * order_by : `str` \\
+        The column the requested page is sorted by.
+    * descending : `bool` \\
+        Whether the requested page is sorted in descending order.
+
+    Returns
+    -------
+    * `tuple[Any, Any]` \\
+        The sort key and primary key of the last row of the previous page.
+
+    Raises
+    ------
+    * `InvalidCursorException` \\
+        If the cursor is malformed or was issued for a different ordering.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        sort_value, primary_key = payload["k"]
+        if payload["o"] != order_by or payload["d"] != descending:
+            raise InvalidCursorException()
+        return _decode_value(sort_value), _decode_value(primary_key)
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursorException()
+
+
+def keyset_columns(model:Any, order_by:str = None) -> tuple[Any, Any]:
+    """
+    Resolve the sort and primary key columns of a keyset page.
+
+    Parameters
+    ----------
+    * model : `Any` \\
+        The mapped model.
+    * order_by : `str`, `optional` \\
+        Name of the sort column. Defaults to the primary key.
+
+    Returns
+    -------
+    * `tuple` \\
+        The sort column attribute and the primary key attribute.
+
+    Raises
+    ------
+    * `InvalidPageRequestException` \\
+        If the sort column doesn't exist or is neither the primary key nor indexed, as pages would then
+        need a full scan. `order_by` usually comes from the client, hence a `400`.
+    """
+    mapper = inspect(model)
+    primary_key = getattr(model, mapper.primary_key[0].key)
+    if order_by is None:
+        return primary_key, primary_key
+
+    if order_by not in mapper.columns:
+        raise InvalidPageRequestException(f"Unknown sort column '{order_by}'.")
+    column = mapper.columns[order_by]
+    if not (column.primary_key or column.index or column.unique):
+        raise InvalidPageRequestException(f"Pages can't be sorted by '{order_by}', which is not indexed.")
+    return getattr(model, order_by), primary_key
+
+
+def keyset_statement(model:Any, limit:int, cursor:str = None, order_by:str = None, descending:bool = False) -> Select:
+    """
+    Build the select statement of a keyset page. One row more than `limit` is selected,
+    which tells whether there is a next page.
+
+    Returns
+    -------
+    * `Select` \\
+        The statement selecting the page.
+
+    Raises
+    ------
+    * `InvalidPageRequestException` \\
+        If `limit` is below 1, or the page can't be sorted by `order_by`.
+    * `InvalidCursorException` \\
+        If the cursor is malformed or was issued for a different ordering.
+    """
+    if limit < 1:
+        raise InvalidPageRequestException("The page size must be at least 1.")
+    sort_column, primary_key = keyset_columns(model, order_by)
+    statement = select(model)
+
+    if cursor is not None:
+        sort_value, last_key = decode_cursor(cursor, sort_column.key, descending)
+        if sort_column is primary_key:
+            statement = statement.where(primary_key < last_key if descending else primary_key > last_key)
+        elif descending:
+            statement = statement.where(or_(sort_column < sort_value, and_(sort_column == sort_value, primary_key < last_key)))
+        else:
+            statement = statement.where(or_(sort_column > sort_value, and_(sort_column == sort_value, primary_key > last_key)))
+
+    order = [sort_column] if sort_column is primary_key else [sort_column, primary_key]
+    statement = statement.order_by(*[column.desc() if descending else column for column in order])
+    return statement.limit(limit + 1)
+
+
+def keyset_page(model:Any, rows:list, limit:int, order_by:str = None, descending:bool = False) -> tuple[list, str]:
+    """
+    Trim the rows selected by `keyset_statement` to the page and build the cursor of the next page.
+
+    Returns
+    -------
+    * `tuple[list, str]` \\
+        The rows of the page and the cursor of the next page, or `None` on the last page.
+    """
+    if limit < 1:
+        raise InvalidPageRequestException("The page size must be at least 1.")
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    sort_column, primary_key = keyset_columns(model, order_by)
+    last = rows[-1]
+    return rows, encode_cursor(sort_column.key, descending, getattr(last, sort_column.key), getattr(last, primary_key.key))
@@ -0,0 +1,50 @@
+from typing import Any, Callable
+
+# Callbacks notified after entities have been written through a repository
+_write_listeners : list[Callable[[str, list], None]] = []
+
+
+def add_write_listener(listener:Callable[[str, list], None]) -> None:
+    """
+    Register a callback that is notified after every successful repository write.
+
+    Parameters
+    ----------
+    * listener : `Callable[[str, list], None]` \\
+        Called with the action (`"save"`, `"update"` or `"delete"`) and the list of written entities,
+        after the transaction has been committed. Bulk writes notify once per batch.
+    """
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+
+def remove_write_listener(listener:Callable[[str, list], None]) -> None:
+    """
+    Unregister a callback registered with `add_write_listener`.
+    """
+    if listener in _write_listeners:
+        _write_listeners.remove(listener)
+
+
+def notify_writes(action:str, entities:list) -> None:
+    """
+    Notify the registered listeners that `entities` have been written.
+
+    Parameters
+    ----------
+    * action : `str` \\
+        One of `"save"`, `"update"` or `"delete"`.
+    * entities : `list` \\
+        The written entities.
+    """
+    if not entities:
+        return
+    for listener in _write_listeners:
+        listener(action, entities)
+
+
+def notify_write(action:str, entity:Any) -> None:
+    """
+    Notify the registered listeners that a single `entity` has been written.
+    """
+    notify_writes(action, [entity])
@@ -1,6 +1,9 @@
+from sqlalchemy import select
 from fastapi_simplified.repositories.generics.generic_repository import GenericRepository
 from fastapi_simplified.repositories.generics.i_user_repository import UserDetailsRepository
 from fastapi_simplified.models.custom_user import CustomUser
+from fastapi_simplified.security.utils.principal import Principal, principal_columns
+from fastapi_simplified.metrics.timing import timed
 
 
 class UserRepository(UserDetailsRepository, GenericRepository):
@@ -16,10 +19,13 @@ class UserRepository(UserDetailsRepository, GenericRepository):
     --------
     Same as super with additional methods
     * find_by_username(username:`str`) -> `CustomUser`
+    * find_principal_by_username(username:`str`) -> `Principal`
+    * find_principals_by_usernames(usernames:`list[str]`) -> `list[Principal]`
     """
     def __init__(self, model: CustomUser) -> None:
         super().__init__(model)
 
+    @timed("db")
     def find_by_username(self, username:str) -> CustomUser:
         """
         Finds a user entity via username
@@ -33,5 +39,42 @@ class UserRepository(UserDetailsRepository, GenericRepository):
         --------
         * `User` **(Change return to the active user type)** : The found user
         """
-        return self.db.query(self.model).filter(CustomUser.username == username).first()
+        return self.db.query(self.model).filter(self.model.username == username).first()
 
+
+    @timed("db")
+    def find_principal_by_username(self, username:str) -> Principal:
+        """
+        Finds the principal of a user via username, selecting only the columns it needs. Nothing is
+        added to the session, and the password hash isn't loaded.
+
+        Parameters
+        ------------
+        * username : `str`\\
+            The username of the user
+
+        Returns
+        --------
+        * `Principal` : The immutable principal of the user, or None if not found
+        """
+        row = self.db.execute(select(*principal_columns(self.model)).where(self.model.username == username).limit(1)).first()
+        return Principal.from_row(row) if row is not None else None
+
+
+    @timed("db")
+    def find_principals_by_usernames(self, usernames:list[str]) -> list[Principal]:
+        """
+        Finds the principals of several users via username with a single `IN` query, selecting only
+        the columns they need.
+
+        Parameters
+        ------------
+        * usernames : `list[str]`\\
+            The usernames of the users
+
+        Returns
+        --------
+        * `list[Principal]` : The principals of the users found, in no particular order
+        """
+        rows = self.db.execute(select(*principal_columns(self.model)).where(self.model.username.in_(usernames)))
+        return [Principal.from_row(row) for row in rows]
@@ -0,0 +1,31 @@
+from pydantic import BaseModel
+
+
+class BulkWriteError(BaseModel):
+    """
+    A row that a bulk write couldn't persist.
+
+    Attributes
+    ----------
+    * index : `int` \\
+        Position of the row in the submitted batch, starting at 0.
+    * detail : `str` \\
+        Why the row was rejected.
+    """
+    index: int
+    detail: str
+
+
+class BulkWriteResult(BaseModel):
+    """
+    The outcome of a bulk write. Rows that fail are reported in `failed` without aborting the rest of the batch.
+
+    Attributes
+    ----------
+    * succeeded : `int` \\
+        Number of rows written.
+    * failed : `list[BulkWriteError]` \\
+        The rejected rows.
+    """
+    succeeded: int = 0
+    failed: list[BulkWriteError] = []
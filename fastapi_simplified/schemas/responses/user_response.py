@@ -16,8 +16,12 @@ class User(SecurityDetails):
         from_attributes = True
 
 
-# Schema for response body for list of users
+# Schema for response body for list of users. Keyset pages carry `cursor`/`next_cursor` instead of `offset`,
+# `total` is the number of users, e.g. from `repo.count()`
 class PaginatedUsersInfo(BaseModel):
     limit: int = 10
     offset: int = 0
+    total: int | None = None
+    cursor: str | None = None
+    next_cursor: str | None = None
     data: list[User]
\ No newline at end of file
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi_simplified.schemas.requests.create_user_request import CreateUserRequest
 from fastapi_simplified.schemas.responses.user_response import *
 from fastapi_simplified.schemas.responses.token_response import *
@@ -6,22 +6,33 @@ from fastapi_simplified.security.service.authentication import *
 from fastapi_simplified.services.user_service import UserService
 from fastapi_simplified.schemas.requests.create_user_request import BasicUserInfo
 from fastapi_simplified.exceptions.resource_exceptions import IllegalArgumentException
+from fastapi_simplified.config.database_config import get_db
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.utils.serialization import FastJSONResponse, row_serializer
 
-auth_router = APIRouter()
+# Every route runs on its own request-scoped session
+auth_router = APIRouter(dependencies=[Depends(get_db)])
 
 # Pass the concrete implementation of UserDetailService
 auth: UserService = make_user_detail_Service(UserService())
 
 @auth_router.post("/signUp", response_model=User)
-def signUp(new_user: CreateUserRequest):
+async def signUp(new_user: CreateUserRequest):
     if not isinstance(new_user, BasicUserInfo):
         raise IllegalArgumentException()
-    return auth.create_user(user_info=new_user)
+    return await auth.create_user(user_info=new_user)
 
 @auth_router.post("/token", response_model=Token)
-async def signIn(user_form: OAuth2PasswordRequestForm = Depends()):
-    return await login_for_access_token(user_form)
+async def signIn(request: Request, user_form: OAuth2PasswordRequestForm = Depends()):
+    return await login_for_access_token(user_form, request)
 
 @auth_router.get("/me", response_model=User)
 async def read_user_me(current_user: User = Depends(get_current_active_user_info)):
+    # The principal comes from the repository or a verified token, so it needn't be validated again
+    if get_settings().fast_serialization:
+        return FastJSONResponse(row_serializer(User)(current_user))
     return current_user
+
+@auth_router.post("/logout", status_code=204)
+async def signOut(revoked: None = Depends(revoke_current_token)):
+    return None
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi_simplified.config.database_config import get_db
+from fastapi_simplified.schemas.responses.bulk_write_response import BulkWriteResult
+from fastapi_simplified.security.service.authentication import get_current_active_user_info
+from fastapi_simplified.security.controller.authentication_controller import auth
+
+# Not part of auth_router: include it explicitly, behind whatever admin checks your app needs
+user_import_router = APIRouter(dependencies=[Depends(get_db), Depends(get_current_active_user_info)])
+
+@user_import_router.post("/users/import", response_model=BulkWriteResult)
+async def import_users(request: Request, chunk_size: int = Query(1000, ge=1)):
+    return await auth.import_users(request.stream(), chunk_size=chunk_size)
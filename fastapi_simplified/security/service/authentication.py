@@ -1,27 +1,41 @@
-from fastapi import Depends
+import inspect
+from fastapi import Depends, Request
+from starlette.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi_simplified.schemas.responses.token_response import *
-from fastapi_simplified.services.generics.user_details_service import UserDetailService
+from fastapi_simplified.services.generics.user_details_service import UserDetailService, AsyncUserDetailService
 from fastapi_simplified.security.utils.jwt_utils import *
 from fastapi_simplified.exceptions.authentication_exceptions import *
 from fastapi_simplified.models.utils.security_details import SecurityDetails
 from fastapi_simplified.services.user_service import UserService
+from fastapi_simplified.cache.principal_cache import principal_cache
+from fastapi_simplified.exceptions.resource_exceptions import ResourceNotFoundException
+from fastapi_simplified.security.utils.login_throttle import login_throttle
+from fastapi_simplified.security.utils.token_revocation import revocation_list
+from fastapi_simplified.security.utils.principal import Principal, set_current_principal
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.config.tenancy import current_tenant, tenant_scope
+from fastapi_simplified.config.database_config import session_scope
+from fastapi_simplified.utils.batch_loader import BatchLoader
 
 
-user_service: UserDetailService = None 
+user_service: UserDetailService | AsyncUserDetailService = None 
 
-def make_user_detail_Service(service: UserDetailService):
+def make_user_detail_Service(service: UserDetailService | AsyncUserDetailService):
     """
     Set the user detail service for authentication.
 
+    Both `UserDetailService` and `AsyncUserDetailService` implementations are accepted; the
+    coroutines of an async service are awaited by the authentication dependencies.
+
     Parameters
     ----------
-    * service : `UserDetailService` \\
+    * service : `UserDetailService` | `AsyncUserDetailService` \\
         The user detail service providing user-related operations.
 
     Returns
     -------
-    * `UserDetailService` \\
+    * `UserDetailService` | `AsyncUserDetailService` \\
         The set user detail service.
     """
     global user_service
@@ -29,14 +43,104 @@ def make_user_detail_Service(service: UserDetailService):
     return user_service
 
 
-async def login_for_access_token(form: OAuth2PasswordRequestForm = Depends()) -> Token:
+async def _resolve(result):
+    """
+    Await the result of a user service call if the registered service is asynchronous.
+    """
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+async def _call(method, *args):
+    """
+    Call a user service method, on the thread pool if it is synchronous, since it then blocks on the
+    database. The thread runs in a copy of the current context, session and tenant included.
+    """
+    if inspect.iscoroutinefunction(method):
+        return await method(*args)
+    return await _resolve(await run_in_threadpool(method, *args))
+
+
+async def _load_users(keys:list[tuple[str, str]]) -> dict:
+    """
+    Look up the `(tenant, username)` keys of a batch of the user loader, per tenant: with one query if
+    the registered service has `get_by_usernames`, else one `get_by_username` call per username.
+    Every user comes with the `principal_cache` generation taken before the query, for `put`.
+
+    The loader runs this in an empty context, so each tenant is looked up in its own `tenant_scope` and
+    `session_scope` rather than in the session of one of the requests waiting for it.
+    """
+    by_tenant : dict[str, list[str]] = {}
+    for tenant, username in keys:
+        by_tenant.setdefault(tenant, []).append(username)
+
+    get_by_usernames = getattr(user_service, "get_by_usernames", None)
+    users = {}
+    for tenant, usernames in by_tenant.items():
+        with tenant_scope(tenant), session_scope():
+            # Taken before the query, so that requests joining it don't cache what a write has since changed
+            generations = {username: principal_cache.generation(username) for username in usernames}
+            if get_by_usernames is not None:
+                found = await _call(get_by_usernames, usernames)
+            else:
+                found = {username: await _call(user_service.get_by_username, username) for username in usernames}
+        users.update(((tenant, username), (found.get(username), generation)) for username, generation in generations.items())
+    return users
+
+
+# Concurrent lookups of the same user share one query, and those of different users are batched
+user_loader = BatchLoader(_load_users)
+
+
+def _embeds_principal(claims: dict) -> bool:
+    """
+    Whether the principal embedded in a `claims` mode token can be trusted. Its staleness is bounded by
+    the lifetime of the token, so only tokens with an enforced `exp` no further than `JWT_EXPIRES_IN`
+    after their `iat` qualify; revocation cutoffs (e.g. of disabled users) are kept that long.
+    """
+    if "uid" not in claims or claims.get("exp") is None or claims.get("iat") is None:
+        return False
+    try:
+        return float(claims["exp"]) - float(claims["iat"]) <= get_settings().jwt_expires_in * 60 + 1
+    except (TypeError, ValueError):
+        return False
+
+
+def _token_claims(user: SecurityDetails) -> dict:
+    """
+    Build the claims of an access token for `user`. In `claims` mode the principal is embedded
+    so that later requests don't need to look it up.
+    """
+    settings = get_settings()
+    # Tokens are bound to the tenant they were issued in, see `resolve_tenant`
+    tenant = {settings.tenant_claim: current_tenant()} if current_tenant() is not None else {}
+    if settings.auth_mode != "claims":
+        return {"sub": user.username, **tenant}
+
+    principal = Principal(
+        id=user.id,
+        username=user.username,
+        disabled=user.disabled,
+        scopes=getattr(user, "scopes", None),
+        **{field: getattr(user, field, None) for field in settings.principal_fields}
+    )
+    return {**principal.to_claims(), **tenant}
+
+
+async def login_for_access_token(form: OAuth2PasswordRequestForm = Depends(), request: Request = None) -> Token:
     """
     Generate an access token for the provided user credentials.
 
+    Attempts are throttled per client IP and per username, and usernames that were recently found
+    not to exist are rejected, both before the user service is called.
+
     Parameters
     ----------
     * form : `OAuth2PasswordRequestForm`, `optional` \\
         The user credentials submitted through the login form.
+    * request : `Request`, `optional` \\
+        The login request, used to throttle by client IP.
 
     Returns
     -------
@@ -49,15 +153,27 @@ async def login_for_access_token(form: OAuth2PasswordRequestForm = Depends()) ->
         If the provided credentials are invalid.
     * `InactiveUserException` \\
         If the user account is inactive.
+    * `TooManyAttemptsException` \\
+        If the client IP or the username has run out of login attempts.
     """
-    user: SecurityDetails = user_service.get_by_username_password(username=form.username, password=form.password)
+    client_ip = request.client.host if request is not None and request.client is not None else None
+    login_throttle.check(form.username, client_ip)
+    if login_throttle.is_unknown(form.username):
+        raise ResourceNotFoundException()
+
+    try:
+        user: SecurityDetails = await _resolve(user_service.get_by_username_password(username=form.username, password=form.password))
+    except ResourceNotFoundException:
+        login_throttle.remember_unknown(form.username)
+        raise
     if not user:
         raise BadCredentialsException()
+    login_throttle.succeeded(form.username)
     if user.disabled:
         raise InactiveUserException()
     # Add other specific user security details checks here
 
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(data=_token_claims(user))
     return Token(access_token=access_token, token_type="bearer")
 
 
@@ -65,6 +181,11 @@ async def get_current_user_information(token: str = Depends(OAuth2PasswordBearer
     """
     Retrieve current user information from the provided JWT token.
 
+    Principals are served from the principal cache when possible; the returned user is then a
+    read-only snapshot that isn't attached to a session. In `claims` mode the principal is built
+    from the token alone, without touching the user service. Revoked tokens are rejected in
+    both modes.
+
     Parameters
     ----------
     * token : `str`, `optional` \\
@@ -78,18 +199,32 @@ async def get_current_user_information(token: str = Depends(OAuth2PasswordBearer
     Raises
     ------
     * `BadCredentialsException` \\
-        If the token is invalid.
+        If the token is invalid or revoked, or was issued for another tenant than the current one.
     """
     try:
-        username = get_claim(token=token, key="sub")
-        token_data = TokenData(username=username)
+        claims = get_claims(token)
+        token_data = TokenData(username=claims.get("sub"))
     except JWTError:
         raise BadCredentialsException()
-
-    user = user_service.get_by_username(token_data.username)
-    if user is None:
+    # The token must belong to the tenant the request runs in, whatever selected it
+    if claims.get(get_settings().tenant_claim) != current_tenant():
         raise BadCredentialsException()
+    if revocation_list.is_revoked(claims):
+        raise BadCredentialsException()
+
+    # Tokens issued before switching to claims mode carry no principal and are still looked up
+    if get_settings().auth_mode == "claims" and _embeds_principal(claims):
+        user = Principal.from_claims(claims)
+    else:
+        user = principal_cache.get(token_data.username)
+        if user is None:
+            user, generation = await user_loader.load((current_tenant(), token_data.username))
+            if user is None:
+                raise BadCredentialsException()
+            user = principal_cache.put(token_data.username, user, generation)
 
+    # The writes of the request are attributed to this user, see `Auditable`
+    set_current_principal(user)
     return user
 
 
@@ -114,4 +249,30 @@ async def get_current_active_user_info(curr_user: SecurityDetails = Depends(get_
     """
     if curr_user.disabled:
         raise InactiveUserException()
-    return curr_user
\ No newline at end of file
+    return curr_user
+
+
+async def revoke_current_token(token: str = Depends(OAuth2PasswordBearer(tokenUrl="token"))) -> None:
+    """
+    Revoke the presented token, e.g. to log out. The token is rejected from then on, until it expires.
+
+    Parameters
+    ----------
+    * token : `str`, `optional` \\
+        The JWT token obtained from the request.
+
+    Raises
+    ------
+    * `BadCredentialsException` \\
+        If the token is invalid.
+    """
+    try:
+        claims = get_claims(token)
+    except JWTError:
+        raise BadCredentialsException()
+    if claims.get("jti") is not None:
+        revocation_list.revoke(claims)
+    elif claims.get("sub") is not None:
+        # Tokens issued before they carried a jti can only be revoked together, in the tenant of the token
+        with tenant_scope(claims.get(get_settings().tenant_claim)):
+            revocation_list.revoke_user(claims["sub"])
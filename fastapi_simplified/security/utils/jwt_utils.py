@@ -1,19 +1,64 @@
 from datetime import datetime, timedelta, timezone
-from jose import jwt, JWTError
-from dotenv import load_dotenv
-import os
+from jose import JWTError
+from jose.exceptions import ExpiredSignatureError
+from fastapi_simplified.cache.ttl_cache import TTLCache
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.metrics.timing import timed
+from fastapi_simplified.security.utils.token_codec import TokenCodec, build_token_codec
+import hashlib
+import time
+import uuid
 
-# Load environment variables
-load_dotenv(r"resources/.env")
+# Codec that signs and verifies tokens, built from the settings on first use
+_token_codec : TokenCodec = None
 
-# Fetch environment variables
-secret_key = os.getenv("JWT_SECRET_KEY")
-algorithm = os.getenv("JWT_ALGORITHM")
-expiry = float(os.getenv("JWT_EXPIRES_IN"))
+# Verified payloads, keyed by a digest of the token. Created on first use from the settings;
+# set JWT_CACHE_MAX_ENTRIES to 0 to disable it.
+_token_cache : TTLCache[dict] = None
 
+
+def get_token_cache() -> TTLCache[dict]:
+    """
+    Returns the cache of verified token payloads.
+    """
+    global _token_cache
+    if _token_cache is None:
+        settings = get_settings()
+        _token_cache = TTLCache(max_entries=settings.jwt_cache_max_entries, ttl=settings.jwt_cache_ttl)
+    return _token_cache
+
+
+def get_token_codec() -> TokenCodec:
+    """
+    Returns the codec that signs and verifies tokens.
+    """
+    global _token_codec
+    if _token_codec is None:
+        _token_codec = build_token_codec(get_settings())
+    return _token_codec
+
+
+def set_token_codec(codec:TokenCodec) -> None:
+    """
+    Replace the token codec, e.g. with a custom `TokenCodec` or after rotating keys. Cached
+    payloads are dropped so that every token is verified again with the new keys.
+
+    Parameters
+    ----------
+    * codec : `TokenCodec` \\
+        The new codec, or `None` to rebuild it from the settings on next use.
+    """
+    global _token_codec
+    _token_codec = codec
+    get_token_cache().clear()
+
+
+@timed("token_encode")
 def create_access_token(data : dict) -> str:
     """
-    Create an access token with the provided data.
+    Create an access token with the provided data. Every token gets a unique `jti` and its issue
+    time `iat`, so it can be revoked, and expires after `JWT_EXPIRES_IN` minutes: the numeric `exp`
+    claim is enforced by the codecs, the ISO `expires` claim is kept for existing readers.
 
     Parameters
     ----------
@@ -27,14 +72,73 @@ def create_access_token(data : dict) -> str:
     """
     # Prepare data for encoding
     to_encode = data.copy()
-    expire = timedelta(minutes=expiry) + datetime.now(timezone.utc)
-    to_encode.update({"expires": expire.isoformat()})
-    
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    to_encode.setdefault("iat", round(time.time(), 3))
+    expire = timedelta(minutes=get_settings().jwt_expires_in) + datetime.now(timezone.utc)
+    to_encode.update({"exp": int(expire.timestamp()), "expires": expire.isoformat()})
+
     # Encode JWT token
-    encoded_jwt = jwt.encode(to_encode, secret_key, algorithm=algorithm)
+    encoded_jwt = get_token_codec().encode(to_encode)
     return encoded_jwt
 
 
+def _seconds_until_expiry(payload:dict) -> float:
+    """
+    Returns the remaining lifetime of a token in seconds, from its `exp` or `expires` claim.
+    Returns `None` if the token carries no expiry.
+    """
+    now = datetime.now(timezone.utc)
+    if payload.get("exp") is not None:
+        return float(payload["exp"]) - now.timestamp()
+    if payload.get("expires") is not None:
+        try:
+            return (datetime.fromisoformat(payload["expires"]) - now).total_seconds()
+        except (TypeError, ValueError):
+            return 0
+    return None
+
+
+@timed("token_decode")
+def get_claims(token:str) -> dict:
+    """
+    Get all claims of the provided JWT token.
+
+    Verified payloads are cached, so a token that is presented again skips the signature check.
+    An entry never outlives the expiry of the token itself, and tokens that fail verification
+    are never cached. Tokens past their `exp` or `expires` claim are rejected, and so are tokens
+    without either: revocations are only kept until the tokens they cover expire.
+
+    Parameters
+    ----------
+    * token : `str` \\
+        The JWT token.
+
+    Returns
+    -------
+    * `dict` \\
+        The claims of the token.
+
+    Raises
+    ------
+    * `JWTError` \\
+        If the token can't be verified or has expired.
+    """
+    token_cache = get_token_cache()
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    payload = token_cache.get(key)
+    if payload is None:
+        # Decode JWT token and cache the verified payload
+        payload = get_token_codec().decode(token)
+        # Codecs only check `exp`, tokens may also carry the ISO `expires` claim
+        ttl = _seconds_until_expiry(payload)
+        if ttl is None:
+            raise JWTError("The token has no expiry")
+        if ttl <= 0:
+            raise ExpiredSignatureError("Signature has expired.")
+        token_cache.set(key, payload, ttl=ttl)
+    return dict(payload)
+
+
 def get_claim(token:str, key:str) -> str:
     """
     Get the claim value from the provided JWT token.
@@ -52,9 +156,16 @@ def get_claim(token:str, key:str) -> str:
         The value of the claim specified by the key.
     """
     # Decode JWT token and retrieve claim
-    payload = jwt.decode(token, secret_key, algorithms=[algorithm])
+    payload = get_claims(token)
     claim : str = payload.get(key)
-    
+
     # Return claim value
     if claim is not None:
-        return claim
\ No newline at end of file
+        return claim
+
+
+def token_cache_stats() -> dict:
+    """
+    Returns the hit/miss counters and size of the verified token cache.
+    """
+    return get_token_cache().stats()
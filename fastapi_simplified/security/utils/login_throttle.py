@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import OrderedDict
+from fastapi_simplified.cache.ttl_cache import TTLCache
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.config.tenancy import tenant_key
+from fastapi_simplified.exceptions.authentication_exceptions import TooManyAttemptsException
+from fastapi_simplified.repositories.generics.write_events import add_write_listener
+
+
+class ThrottleBackend:
+    """
+    Storage of the token buckets used by `LoginThrottle`. Implement it on top of a shared store
+    (e.g. Redis) to throttle across workers.
+
+    Methods
+    -------
+    * take(key: `str`, capacity: `float`, refill_per_second: `float`) -> `float` \\
+        Takes one token from the bucket of `key`, which holds at most `capacity` tokens and refills
+        at `refill_per_second`. Returns `0` if a token was taken, otherwise the seconds until one is available.
+    * reset(key: `str`) -> `None` \\
+        Refills the bucket of `key`.
+    """
+    def take(self, key:str, capacity:float, refill_per_second:float) -> float:
+        raise NotImplementedError
+
+    def reset(self, key:str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryThrottleBackend(ThrottleBackend):
+    """
+    Process-local token buckets, spread over shards with a lock each so concurrent logins rarely
+    wait on one another. Each shard keeps its most recently used `max_keys_per_shard` buckets; an
+    evicted bucket simply starts full again.
+
+    Attributes
+    ----------
+    * shards : `int`, `optional` \\
+        Number of shards.
+    * max_keys_per_shard : `int`, `optional` \\
+        Buckets kept per shard.
+    """
+    def __init__(self, shards:int = 64, max_keys_per_shard:int = 10000) -> None:
+        self.max_keys_per_shard : int = max_keys_per_shard
+        # key -> (tokens, last refill), ordered from least to most recently used
+        self._shards : list[tuple[threading.Lock, OrderedDict]] = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+
+    def take(self, key:str, capacity:float, refill_per_second:float) -> float:
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        with lock:
+            tokens, refilled_at = buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - refilled_at) * refill_per_second)
+            if tokens >= 1:
+                buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                buckets[key] = (tokens, now)
+                wait = (1 - tokens) / refill_per_second
+            if len(buckets) > self.max_keys_per_shard:
+                buckets.popitem(last=False)
+        return wait
+
+    def reset(self, key:str) -> None:
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            buckets.pop(key, None)
+
+
+class LoginThrottle:
+    """
+    Rate limits login attempts per client IP and per username with token buckets, and remembers
+    usernames that don't exist. Both checks run before the user is looked up or any password is
+    hashed, so a credential-stuffing burst is turned away cheaply.
+
+    Every attempt takes a token from the bucket of its IP and of its username. A bucket holds up to
+    `LOGIN_ATTEMPTS_PER_IP` / `LOGIN_ATTEMPTS_PER_USERNAME` tokens and refills completely over
+    `LOGIN_THROTTLE_WINDOW` seconds. A successful login refills the bucket of its username.
+
+    Attributes
+    ----------
+    * backend : `ThrottleBackend`, `optional` \\
+        Where the buckets are kept. Defaults to an `InMemoryThrottleBackend`.
+
+    Methods
+    -------
+    * check(username: `str`, client_ip: `str`) -> `None` \\
+        Takes a token for the attempt, or raises `TooManyAttemptsException`.
+    * succeeded(username: `str`) -> `None` \\
+        Refills the bucket of a username after a successful login.
+    * is_unknown(username: `str`) -> `bool` \\
+        Whether the username was recently found not to exist.
+    * remember_unknown(username: `str`) -> `None` \\
+        Remembers that a username doesn't exist.
+    * on_write(action: `str`, entities: `list`) -> `None` \\
+        Repository write listener that forgets usernames once they are created.
+    """
+    def __init__(self, backend:ThrottleBackend = None) -> None:
+        self.backend : ThrottleBackend = backend or InMemoryThrottleBackend()
+        self._unknown_users : TTLCache[bool] = None
+
+    @property
+    def unknown_users(self) -> TTLCache[bool]:
+        # Created on first use, so that the settings aren't loaded at import time
+        if self._unknown_users is None:
+            settings = get_settings()
+            self._unknown_users = TTLCache(max_entries=settings.login_unknown_user_cache_max_entries,
+                                           ttl=settings.login_unknown_user_cache_ttl)
+        return self._unknown_users
+
+    def check(self, username:str, client_ip:str = None) -> None:
+        """
+        Take a token for a login attempt.
+
+        Raises
+        ------
+        * `TooManyAttemptsException` \\
+            If the IP or the username has run out of attempts.
+        """
+        settings = get_settings()
+        if not settings.login_throttle_enabled:
+            return
+
+        window = settings.login_throttle_window
+        limits = [(f"user:{tenant_key(username)}", settings.login_attempts_per_username)]
+        if client_ip is not None:
+            limits.insert(0, (f"ip:{client_ip}", settings.login_attempts_per_ip))
+        for key, attempts in limits:
+            wait = self.backend.take(key, attempts, attempts / window)
+            if wait > 0:
+                raise TooManyAttemptsException(retry_after=int(wait) + 1)
+
+    def succeeded(self, username:str) -> None:
+        if get_settings().login_throttle_enabled:
+            self.backend.reset(f"user:{tenant_key(username)}")
+
+    def is_unknown(self, username:str) -> bool:
+        return self.unknown_users.get(tenant_key(username)) is not None
+
+    def remember_unknown(self, username:str) -> None:
+        self.unknown_users.set(tenant_key(username), True)
+
+    def on_write(self, action:str, entities:list) -> None:
+        if action == "delete" or self._unknown_users is None:
+            return
+        for entity in entities:
+            username = getattr(entity, "username", None)
+            if username is not None:
+                self._unknown_users.invalidate(tenant_key(username))
+
+
+login_throttle = LoginThrottle()
+add_write_listener(login_throttle.on_write)
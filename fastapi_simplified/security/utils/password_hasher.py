@@ -0,0 +1,224 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from passlib.context import CryptContext
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.exceptions.resource_exceptions import ServerBusyException
+from fastapi_simplified.metrics.timing import timed
+
+
+@lru_cache(maxsize=8)
+def _context_from_string(config:str) -> CryptContext:
+    """
+    Rebuild a `CryptContext` inside a worker process, once per configuration.
+    """
+    return CryptContext.from_string(config)
+
+
+def _run_in_process(config:str, method:str, *args):
+    """
+    Entry point for process pool workers. `CryptContext` objects can't be pickled, so the
+    serialized configuration is sent instead and the context is rebuilt in the worker.
+    """
+    return getattr(_context_from_string(config), method)(*args)
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a bounded executor so the CPU cost of bcrypt
+    never lands on the event loop thread.
+
+    At most `max_pending` operations may be queued or running at once. Any further request is
+    rejected straight away with a `ServerBusyException` (503) rather than waiting in an ever
+    growing queue.
+
+    Attributes
+    ----------
+    * context : `CryptContext` \\
+        The passlib context that does the actual hashing.
+    * executor_kind : `str` \\
+        Either `"thread"` or `"process"`. Defaults to `HASHING_EXECUTOR`.
+    * max_workers : `int` \\
+        Size of the executor pool. Defaults to `HASHING_MAX_WORKERS`, then to the number of cores.
+    * max_pending : `int` \\
+        Maximum number of queued plus running operations. Defaults to `HASHING_MAX_PENDING`,
+        then to eight per worker.
+
+    Methods
+    -------
+    * hash(secret: `str`) -> `str` \\
+        Coroutine that hashes a password.
+    * verify(secret: `str`, hashed: `str`) -> `bool` \\
+        Coroutine that verifies a password against a hash.
+    * verify_and_update(secret: `str`, hashed: `str`) -> `tuple[bool, str]` \\
+        Coroutine that verifies a password and rehashes it if the hash is out of date.
+    * hash_many(secrets: `list[str]`) -> `list[str]` \\
+        Coroutine that hashes a batch of passwords in parallel, waiting for capacity instead of failing.
+    * shutdown() -> `None` \\
+        Shuts the executor pool down.
+    """
+    def __init__(self, context:CryptContext, executor_kind:str = None,
+                 max_workers:int = None, max_pending:int = None) -> None:
+        settings = get_settings()
+        executor_kind = executor_kind or settings.hashing_executor
+        max_workers = max_workers or settings.hashing_max_workers
+        max_pending = max_pending or settings.hashing_max_pending or max_workers * 8
+        if executor_kind not in ("thread", "process"):
+            raise ValueError(f"Unknown hashing executor '{executor_kind}', expected 'thread' or 'process'")
+
+        self.context : CryptContext = context
+        self.executor_kind : str = executor_kind
+        self.max_workers : int = max_workers
+        self.max_pending : int = max_pending
+
+        # The pool is created on first use so that unused services don't spawn workers
+        self._executor : Executor = None
+        self._pending : int = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of operations currently queued or running.
+        """
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hasher")
+        return self._executor
+
+    def _try_reserve(self) -> bool:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return False
+            self._pending += 1
+            return True
+
+    async def _submit(self, method:str, *args, wait:bool = False):
+        # Reserve a slot, or shed the request straight away unless asked to wait for one
+        while not self._try_reserve():
+            if not wait:
+                raise ServerBusyException()
+            await asyncio.sleep(0.01)
+
+        try:
+            loop = asyncio.get_running_loop()
+            if self.executor_kind == "process":
+                return await loop.run_in_executor(self._get_executor(), _run_in_process, self.context.to_string(), method, *args)
+            return await loop.run_in_executor(self._get_executor(), getattr(self.context, method), *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    @timed("password_hash")
+    async def hash(self, secret:str) -> str:
+        """
+        Hash a password on the executor.
+
+        Parameters
+        ----------
+        * secret : `str` \\
+            The plain text password.
+
+        Returns
+        -------
+        * `str` \\
+            The password hash.
+
+        Raises
+        ------
+        * `ServerBusyException` \\
+            If the executor queue is full.
+        """
+        return await self._submit("hash", secret)
+
+    @timed("password_verify")
+    async def verify(self, secret:str, hashed:str) -> bool:
+        """
+        Verify a password against a hash on the executor.
+
+        Parameters
+        ----------
+        * secret : `str` \\
+            The plain text password.
+        * hashed : `str` \\
+            The stored password hash.
+
+        Returns
+        -------
+        * `bool` \\
+            True if the password matches the hash.
+
+        Raises
+        ------
+        * `ServerBusyException` \\
+            If the executor queue is full.
+        """
+        return await self._submit("verify", secret, hashed)
+
+    @timed("password_verify")
+    async def verify_and_update(self, secret:str, hashed:str) -> tuple[bool, str]:
+        """
+        Verify a password against a hash on the executor, and rehash it if the hash uses a deprecated
+        scheme or other cost parameters than the context.
+
+        Parameters
+        ----------
+        * secret : `str` \\
+            The plain text password.
+        * hashed : `str` \\
+            The stored password hash.
+
+        Returns
+        -------
+        * `tuple[bool, str]` \\
+            Whether the password matches, and the new hash to store, or `None` if the hash is up to date.
+
+        Raises
+        ------
+        * `ServerBusyException` \\
+            If the executor queue is full.
+        """
+        return await self._submit("verify_and_update", secret, hashed)
+
+    @timed("password_hash")
+    async def hash_many(self, secrets:list[str]) -> list[str]:
+        """
+        Hash a batch of passwords, spread over all the workers of the pool.
+
+        Meant for bulk work such as imports: at most `max_workers` passwords are in flight at a time, and
+        instead of failing when the queue is full it waits, leaving room for interactive logins.
+
+        Parameters
+        ----------
+        * secrets : `list[str]` \\
+            The plain text passwords.
+
+        Returns
+        -------
+        * `list[str]` \\
+            The password hashes, in the same order.
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def hash_one(secret:str) -> str:
+            async with semaphore:
+                return await self._submit("hash", secret, wait=True)
+
+        return list(await asyncio.gather(*(hash_one(secret) for secret in secrets)))
+
+    def shutdown(self, wait:bool = True) -> None:
+        """
+        Shuts the executor pool down. A new pool is created if the hasher is used again.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,155 @@
+import argparse
+import statistics
+import sys
+import time
+from passlib.context import CryptContext
+from fastapi_simplified.config.settings import Settings, get_settings
+
+# Every scheme a stored hash may use. The configured one is the default, the others are deprecated
+# so their hashes get replaced on the next successful login.
+SCHEMES : tuple[str, ...] = ("bcrypt", "argon2")
+
+# Argon2 parameters used when none are configured: 64 MiB and 4 lanes, as in RFC 9106
+DEFAULT_ARGON2_MEMORY_COST : int = 65536
+DEFAULT_ARGON2_PARALLELISM : int = 4
+
+
+def build_crypt_context(settings:Settings = None) -> CryptContext:
+    """
+    Build the password hashing context from the settings.
+
+    * `PASSWORD_SCHEME` : `"bcrypt"` or `"argon2"` (needs the `argon2-cffi` package)
+    * `BCRYPT_ROUNDS` : bcrypt cost factor
+    * `ARGON2_TIME_COST`, `ARGON2_MEMORY_COST` (KiB), `ARGON2_PARALLELISM` : argon2 parameters
+
+    Hashes of another scheme, or made with other parameters, are reported by `needs_update`, so they
+    can be replaced when the user next logs in. Unset parameters keep the passlib defaults.
+
+    Parameters
+    ----------
+    * settings : `Settings`, `optional` \\
+        The settings, defaults to `get_settings()`.
+
+    Returns
+    -------
+    * `CryptContext` \\
+        The passlib context.
+    """
+    settings = settings or get_settings()
+    scheme = settings.password_scheme
+    options = {}
+    if scheme == "bcrypt" and settings.bcrypt_rounds is not None:
+        rounds = settings.bcrypt_rounds
+        options.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+    if scheme == "argon2":
+        if settings.argon2_time_cost is not None:
+            rounds = settings.argon2_time_cost
+            options.update(argon2__default_rounds=rounds, argon2__min_rounds=rounds, argon2__max_rounds=rounds)
+        if settings.argon2_memory_cost is not None:
+            options["argon2__memory_cost"] = settings.argon2_memory_cost
+        if settings.argon2_parallelism is not None:
+            options["argon2__parallelism"] = settings.argon2_parallelism
+
+    schemes = [scheme] + [other for other in SCHEMES if other != scheme]
+    return CryptContext(schemes=schemes, default=scheme, deprecated="auto", **options)
+
+
+def _verify_ms(context:CryptContext, samples:int) -> float:
+    # Median time of verifying a password against a hash made by `context`
+    hashed = context.hash("calibration-password")
+    durations = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.verify("calibration-password", hashed)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations) * 1000
+
+
+def calibrate(target_ms:float = None, scheme:str = None, samples:int = 5, minimum_cost:int = None) -> dict:
+    """
+    Find the highest hashing cost whose verification stays within `target_ms` on this machine.
+
+    bcrypt calibrates its rounds, starting from 10. argon2 keeps its memory and parallelism settings
+    (64 MiB and 4 lanes by default) and calibrates its time cost, starting from 1. The minimum is
+    returned even if it is slower than the target.
+
+    Parameters
+    ----------
+    * target_ms : `float`, `optional` \\
+        Verification time budget in milliseconds. Defaults to `PASSWORD_HASH_TARGET_MS`.
+    * scheme : `str`, `optional` \\
+        `"bcrypt"` or `"argon2"`. Defaults to `PASSWORD_SCHEME`.
+    * samples : `int`, `optional` \\
+        Verifications timed per candidate cost; the median is used.
+    * minimum_cost : `int`, `optional` \\
+        Lowest cost considered.
+
+    Returns
+    -------
+    * `dict` \\
+        `settings`, the environment variables to store (e.g. `{"PASSWORD_SCHEME": "bcrypt", "BCRYPT_ROUNDS": 12}`),
+        and `verify_ms`, the measured verification time with them.
+    """
+    settings = get_settings()
+    target_ms = target_ms or settings.password_hash_target_ms
+    scheme = scheme or settings.password_scheme
+
+    if scheme == "bcrypt":
+        cost, maximum = minimum_cost or 10, 20
+        make = lambda rounds: CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+        key, extra = "BCRYPT_ROUNDS", {}
+    elif scheme == "argon2":
+        memory_cost = settings.argon2_memory_cost or DEFAULT_ARGON2_MEMORY_COST
+        parallelism = settings.argon2_parallelism or DEFAULT_ARGON2_PARALLELISM
+        cost, maximum = minimum_cost or 1, 50
+        make = lambda rounds: CryptContext(schemes=["argon2"], argon2__default_rounds=rounds,
+                                           argon2__memory_cost=memory_cost, argon2__parallelism=parallelism)
+        key, extra = "ARGON2_TIME_COST", {"ARGON2_MEMORY_COST": memory_cost, "ARGON2_PARALLELISM": parallelism}
+    else:
+        raise ValueError(f"Unknown password scheme '{scheme}', expected 'bcrypt' or 'argon2'")
+
+    # Raise the cost for as long as the next step still fits the budget
+    measured = _verify_ms(make(cost), samples)
+    while cost < maximum:
+        candidate = _verify_ms(make(cost + 1), samples)
+        if candidate > target_ms:
+            break
+        cost, measured = cost + 1, candidate
+
+    return {"settings": {"PASSWORD_SCHEME": scheme, key: cost, **extra}, "verify_ms": measured}
+
+
+def write_env(path:str, values:dict) -> None:
+    """
+    Set `values` in the `.env` file at `path`, replacing existing assignments and appending new ones.
+    """
+    try:
+        with open(path) as file:
+            lines = file.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+
+    pending = dict(values)
+    for index, line in enumerate(lines):
+        name = line.split("=", 1)[0].strip()
+        if "=" in line and not line.lstrip().startswith("#") and name in pending:
+            lines[index] = f"{name} = {pending.pop(name)}"
+    lines += [f"{name} = {value}" for name, value in pending.items()]
+
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate the password hashing cost to a verification time budget.")
+    parser.add_argument("--target-ms", type=float, help="verification time budget (default: PASSWORD_HASH_TARGET_MS)")
+    parser.add_argument("--scheme", choices=SCHEMES, help="hashing scheme (default: PASSWORD_SCHEME)")
+    parser.add_argument("--write", metavar="ENV_FILE", help="store the result in this .env file")
+    options = parser.parse_args()
+
+    result = calibrate(options.target_ms, options.scheme)
+    for name, value in result["settings"].items():
+        print(f"{name} = {value}")
+    print(f"# verify takes {result['verify_ms']:.1f} ms on this machine", file=sys.stderr)
+    if options.write:
+        write_env(options.write, result["settings"])
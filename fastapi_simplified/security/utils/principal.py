@@ -0,0 +1,178 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+from fastapi_simplified.config.settings import get_settings
+
+
+class Principal:
+    """
+    A lightweight, immutable authenticated user that isn't attached to any database session.
+
+    It exposes the fields the authentication dependencies need as attributes, plus any extra
+    profile fields (e.g. `email`) so it can be serialized into a response model with `from_attributes`.
+
+    Attributes
+    ----------
+    * id : `int` \\
+        The row id of the user
+    * username : `str` \\
+        The username of the user
+    * disabled : `bool` \\
+        The disability status of the user
+    * scopes : `tuple[str]` \\
+        The roles/scopes granted to the user
+    """
+    __slots__ = ("id", "username", "disabled", "scopes", "_profile")
+
+    def __init__(self, id:int, username:str, disabled:bool = False, scopes:tuple = (), **profile:Any) -> None:
+        object.__setattr__(self, "id", id)
+        object.__setattr__(self, "username", username)
+        if isinstance(scopes, str):
+            scopes = scopes.replace(",", " ").split()
+        object.__setattr__(self, "disabled", bool(disabled))
+        object.__setattr__(self, "scopes", tuple(scopes or ()))
+        object.__setattr__(self, "_profile", profile)
+
+    def __getattr__(self, name:str) -> Any:
+        # Only called for names that aren't slots, i.e. the profile fields
+        try:
+            return object.__getattribute__(self, "_profile")[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name:str, value:Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name:str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other:object) -> bool:
+        if not isinstance(other, Principal):
+            return NotImplemented
+        return (self.id, self.username, self.disabled, self.scopes, self._profile) == \
+            (other.id, other.username, other.disabled, other.scopes, other._profile)
+
+    def __hash__(self) -> int:
+        return hash((self.id, self.username))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(id={self.id!r}, username={self.username!r}, disabled={self.disabled!r}, scopes={self.scopes!r})"
+
+    @classmethod
+    def from_claims(cls, claims:dict) -> "Principal":
+        """
+        Build a principal from the verified claims of a token issued in `claims` mode.
+
+        Parameters
+        ----------
+        * claims : `dict` \\
+            The claims of the token.
+
+        Returns
+        -------
+        * `Principal` \\
+            The principal embedded in the token.
+        """
+        return cls(
+            id=claims.get("uid"),
+            username=claims.get("sub"),
+            disabled=claims.get("disabled", False),
+            scopes=claims.get("scopes", ()),
+            **(claims.get("profile") or {})
+        )
+
+    @classmethod
+    def from_row(cls, row:Any) -> "Principal":
+        """
+        Build a principal from a row selected with `principal_columns`.
+
+        Parameters
+        ----------
+        * row : `Row` \\
+            The result row.
+
+        Returns
+        -------
+        * `Principal` \\
+            The principal, detached from any session.
+        """
+        values = dict(row._mapping)
+        return cls(
+            id=values.pop("id"),
+            username=values.pop("username"),
+            disabled=values.pop("disabled", False),
+            scopes=values.pop("scopes", ()),
+            **values
+        )
+
+    def to_claims(self) -> dict:
+        """
+        Returns the claims that embed this principal in a token. The inverse of `from_claims`.
+        """
+        claims = {"sub": self.username, "uid": self.id, "disabled": self.disabled, "scopes": list(self.scopes)}
+        if self._profile:
+            claims["profile"] = dict(self._profile)
+        return claims
+
+
+def principal_columns(model:Any) -> list:
+    """
+    The columns of `model` a `Principal` is built from: `id`, `username`, `disabled`, `scopes` if the
+    model has it, and the `AUTH_PRINCIPAL_FIELDS` the model has. The password hash is never among them.
+
+    Parameters
+    ----------
+    * model : `type` \\
+        The mapped user class.
+
+    Returns
+    -------
+    * `list` \\
+        The column attributes, to be passed to `select()`.
+    """
+    names = ["id", "username", "disabled", "scopes"] + get_settings().principal_fields
+    return [getattr(model, name) for name in dict.fromkeys(names) if name != "password" and hasattr(model, name)]
+
+
+# The user authenticated by the request that is currently running
+_current_principal : ContextVar[Any] = ContextVar("current_principal", default=None)
+
+
+def current_principal() -> Any:
+    """
+    Returns the user authenticated by the current request, set by `get_current_user_information`, or
+    `None` outside of an authenticated request.
+    """
+    return _current_principal.get()
+
+
+def current_username() -> str:
+    """
+    Returns the username of `current_principal()`, or `None`. Used to fill the `Auditable` fields.
+    """
+    principal = _current_principal.get()
+    return getattr(principal, "username", None) if principal is not None else None
+
+
+def set_current_principal(principal:Any) -> None:
+    """
+    Makes `principal` the current user for the rest of the current context, i.e. the request.
+    """
+    _current_principal.set(principal)
+
+
+@contextmanager
+def principal_scope(principal:Any):
+    """
+    Makes `principal` the current user inside the block, e.g. in a background job writing on behalf of a user.
+
+    ```python
+    with principal_scope(Principal(id=0, username="scheduler")):
+        repo.save(item)
+    ```
+    """
+    token = _current_principal.set(principal)
+    try:
+        yield principal
+    finally:
+        _current_principal.reset(token)
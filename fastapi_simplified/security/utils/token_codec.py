@@ -0,0 +1,375 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import sys
+import time
+from calendar import timegm
+from datetime import datetime
+from jose import jwt, JWTError
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError
+from fastapi_simplified.config.settings import Settings
+
+
+def _b64encode(data:bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data:bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+class TokenCodec:
+    """
+    Signs claims into compact JWTs and verifies them back. `create_access_token` and `get_claims`
+    go through the codec returned by `get_token_codec()`, which can be swapped with `set_token_codec()`.
+
+    Attributes
+    ----------
+    * algorithm : `str` \\
+        The JWS algorithm of the issued tokens, e.g. `"HS256"`.
+
+    Methods
+    -------
+    * encode(claims: `dict`) -> `str` \\
+        Signs the claims into a token.
+    * decode(token: `str`) -> `dict` \\
+        Verifies a token and returns its claims. Raises `JWTError` if it can't be verified or has expired.
+    """
+    algorithm : str = None
+
+    def encode(self, claims:dict) -> str:
+        raise NotImplementedError
+
+    def decode(self, token:str) -> dict:
+        raise NotImplementedError
+
+
+class JoseCodec(TokenCodec):
+    """
+    Codec backed by `python-jose`, with a single key.
+
+    Attributes
+    ----------
+    * key : `str` \\
+        The signing key.
+    * algorithm : `str` \\
+        The JWS algorithm.
+    """
+    def __init__(self, key:str, algorithm:str = "HS256") -> None:
+        self.key : str = key
+        self.algorithm : str = algorithm
+
+    def encode(self, claims:dict) -> str:
+        return jwt.encode(claims, self.key, algorithm=self.algorithm)
+
+    def decode(self, token:str) -> dict:
+        return jwt.decode(token, self.key, algorithms=[self.algorithm])
+
+
+class _CompactCodec(TokenCodec):
+    """
+    Shared JWS compact serialization for the built-in codecs. Keys are held by `kid`; the signing
+    key's header segment is encoded once, and tokens carrying a known header segment are routed to
+    their key without parsing the header. Tokens without a `kid` are verified with the key stored
+    under `None`, if any, so tokens issued before key rotation was enabled stay valid.
+    """
+    def __init__(self, algorithm:str, verify_keys:dict, signing_kid:str = None) -> None:
+        if signing_kid is not None and signing_kid not in verify_keys:
+            raise ValueError(f"Unknown signing key id '{signing_kid}'")
+        self.algorithm : str = algorithm
+        self.signing_kid : str = signing_kid
+        self._verify_keys : dict = verify_keys
+
+        # Encoded header segment of each kid, and the reverse lookup used when decoding
+        self._headers : dict[str, bytes] = {kid: self._header_segment(kid) for kid in verify_keys}
+        self._kid_by_header : dict[bytes, str] = {segment: kid for kid, segment in self._headers.items()}
+
+    def _header_segment(self, kid:str) -> bytes:
+        header = {"alg": self.algorithm, "typ": "JWT"}
+        if kid is not None:
+            header["kid"] = kid
+        return _b64encode(json.dumps(header, separators=(",", ":")).encode())
+
+    def _sign(self, signing_input:bytes) -> bytes:
+        raise NotImplementedError
+
+    def _verify(self, kid:str, signing_input:bytes, signature:bytes) -> bool:
+        raise NotImplementedError
+
+    def _kid_of(self, header_segment:bytes) -> str:
+        kid = self._kid_by_header.get(header_segment, ...)
+        if kid is not ...:
+            return kid
+
+        # Unknown layout, e.g. a token issued by another library; parse the header
+        try:
+            header = json.loads(_b64decode(header_segment))
+        except (binascii.Error, ValueError):
+            raise JWTError("Invalid header")
+        if not isinstance(header, dict) or header.get("alg") != self.algorithm:
+            raise JWTError("The specified alg value is not allowed")
+        kid = header.get("kid")
+        if kid not in self._verify_keys:
+            raise JWTError("Unknown key id")
+        return kid
+
+    def encode(self, claims:dict) -> str:
+        if self.signing_kid not in self._headers:
+            raise JWTError("No key to sign tokens with")
+        payload = dict(claims)
+        for claim in ("exp", "iat", "nbf"):
+            if isinstance(payload.get(claim), datetime):
+                payload[claim] = timegm(payload[claim].utctimetuple())
+
+        signing_input = self._headers[self.signing_kid] + b"." + _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+        return (signing_input + b"." + _b64encode(self._sign(signing_input))).decode()
+
+    def decode(self, token:str) -> dict:
+        try:
+            signing_input, signature = token.encode().rsplit(b".", 1)
+            header_segment, payload_segment = signing_input.split(b".")
+            signature = _b64decode(signature)
+        except (binascii.Error, ValueError, UnicodeError):
+            raise JWTError("Not enough segments")
+
+        if not self._verify(self._kid_of(header_segment), signing_input, signature):
+            raise JWTError("Signature verification failed.")
+
+        try:
+            claims = json.loads(_b64decode(payload_segment))
+        except (binascii.Error, ValueError):
+            raise JWTError("Invalid payload string")
+        if not isinstance(claims, dict):
+            raise JWTError("Invalid payload string: must be a json object")
+
+        # Same time based checks as python-jose
+        now = time.time()
+        try:
+            if "exp" in claims and int(claims["exp"]) <= now:
+                raise ExpiredSignatureError("Signature has expired.")
+            if "nbf" in claims and int(claims["nbf"]) > now:
+                raise JWTClaimsError("The token is not yet valid (nbf)")
+        except (TypeError, ValueError):
+            raise JWTClaimsError("Invalid time claim")
+        return claims
+
+
+class HMACCodec(_CompactCodec):
+    """
+    HS256/HS384/HS512 codec. An HMAC object is keyed once per secret and copied for every token,
+    which skips the key setup that `python-jose` repeats on each call.
+
+    Attributes
+    ----------
+    * keys : `dict[str, str | bytes]` \\
+        Secrets by `kid`. Use `None` as the kid for tokens issued without one.
+    * algorithm : `str`, `optional` \\
+        `"HS256"` (default), `"HS384"` or `"HS512"`.
+    * signing_kid : `str`, `optional` \\
+        Kid of the secret new tokens are signed with.
+    """
+    digests = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+    def __init__(self, keys:dict, algorithm:str = "HS256", signing_kid:str = None) -> None:
+        if algorithm not in self.digests:
+            raise ValueError(f"Unsupported HMAC algorithm '{algorithm}'")
+        digest = self.digests[algorithm]
+        self._macs : dict[str, hmac.HMAC] = {
+            kid: hmac.new(secret.encode() if isinstance(secret, str) else secret, digestmod=digest)
+            for kid, secret in keys.items()
+        }
+        super().__init__(algorithm, self._macs, signing_kid)
+
+    def _sign(self, signing_input:bytes) -> bytes:
+        mac = self._macs[self.signing_kid].copy()
+        mac.update(signing_input)
+        return mac.digest()
+
+    def _verify(self, kid:str, signing_input:bytes, signature:bytes) -> bool:
+        mac = self._macs[kid].copy()
+        mac.update(signing_input)
+        return hmac.compare_digest(mac.digest(), signature)
+
+
+class AsymmetricCodec(_CompactCodec):
+    """
+    EdDSA (Ed25519) and ES256 codec. Tokens are signed with a private key and can be verified by
+    services that only hold the public keys. Needs the `cryptography` package.
+
+    Attributes
+    ----------
+    * keys : `dict[str, str | bytes]` \\
+        PEM encoded keys by `kid`. Private keys are used for verification through their public half.
+    * algorithm : `str`, `optional` \\
+        `"EdDSA"` (default) or `"ES256"`.
+    * signing_kid : `str`, `optional` \\
+        Kid of the private key new tokens are signed with. Without one, the codec can only verify tokens.
+    """
+    algorithms = ("EdDSA", "ES256")
+
+    def __init__(self, keys:dict, algorithm:str = "EdDSA", signing_kid:str = None) -> None:
+        if algorithm not in self.algorithms:
+            raise ValueError(f"Unsupported asymmetric algorithm '{algorithm}'")
+        try:
+            from cryptography.exceptions import InvalidSignature
+            from cryptography.hazmat.primitives import hashes, serialization
+            from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+            from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+        except ImportError:
+            raise ImportError("The EdDSA and ES256 token codecs need the 'cryptography' package")
+        self._invalid_signature = InvalidSignature
+        self._ecdsa = ec.ECDSA(hashes.SHA256())
+        self._decode_dss, self._encode_dss = decode_dss_signature, encode_dss_signature
+
+        self._signing_key = None
+        public_keys = {}
+        for kid, pem in keys.items():
+            pem = pem.encode() if isinstance(pem, str) else pem
+            if b"PRIVATE KEY" in pem:
+                private_key = serialization.load_pem_private_key(pem, password=None)
+                if kid == signing_kid:
+                    self._signing_key = private_key
+                public_keys[kid] = private_key.public_key()
+            else:
+                public_keys[kid] = serialization.load_pem_public_key(pem)
+            if algorithm == "ES256" and not (isinstance(public_keys[kid], ec.EllipticCurvePublicKey)
+                                             and public_keys[kid].curve.name == "secp256r1") \
+                    or algorithm == "EdDSA" and not isinstance(public_keys[kid], ed25519.Ed25519PublicKey):
+                raise ValueError(f"Key '{kid}' doesn't match the {algorithm} algorithm")
+        if signing_kid is not None and self._signing_key is None:
+            raise ValueError(f"The signing key '{signing_kid}' must be a private key")
+        super().__init__(algorithm, public_keys, signing_kid)
+
+    def _sign(self, signing_input:bytes) -> bytes:
+        if self.algorithm == "EdDSA":
+            return self._signing_key.sign(signing_input)
+        # JWS carries the raw 64 byte r || s form instead of DER
+        r, s = self._decode_dss(self._signing_key.sign(signing_input, self._ecdsa))
+        return r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+    def _verify(self, kid:str, signing_input:bytes, signature:bytes) -> bool:
+        try:
+            if self.algorithm == "EdDSA":
+                self._verify_keys[kid].verify(signature, signing_input)
+            else:
+                if len(signature) != 64:
+                    return False
+                der = self._encode_dss(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+                self._verify_keys[kid].verify(der, signing_input, self._ecdsa)
+        except self._invalid_signature:
+            return False
+        return True
+
+
+def _parse_keys(value:str) -> dict[str, str]:
+    """
+    Parse `JWT_KEYS`, a comma separated list of `kid=value` pairs, keeping their order.
+    """
+    keys = {}
+    for entry in value.split(","):
+        if entry.strip():
+            kid, separator, key = entry.partition("=")
+            if not separator or not kid.strip():
+                raise ValueError(f"Invalid JWT_KEYS entry '{entry.strip()}', expected 'kid=value'")
+            keys[kid.strip()] = key.strip()
+    return keys
+
+
+def build_token_codec(settings:Settings) -> TokenCodec:
+    """
+    Build the codec described by the settings.
+
+    * `JWT_CODEC` : `"fast"` for the built-in codecs, `"jose"` for `python-jose`
+    * `JWT_ALGORITHM` : `HS256`, `HS384`, `HS512`, `EdDSA` or `ES256`
+    * `JWT_KEYS` : `kid=secret` pairs for HMAC, `kid=path/to/key.pem` pairs for EdDSA/ES256
+    * `JWT_ACTIVE_KID` : kid new tokens are signed with, defaults to the first of `JWT_KEYS`
+
+    `JWT_SECRET_KEY` keeps verifying HMAC tokens issued without a `kid`, and signs new ones when
+    `JWT_KEYS` isn't set.
+
+    Parameters
+    ----------
+    * settings : `Settings` \\
+        The application settings.
+
+    Returns
+    -------
+    * `TokenCodec` \\
+        The token codec.
+    """
+    algorithm = settings.jwt_algorithm
+    if settings.jwt_codec == "jose":
+        return JoseCodec(settings.jwt_secret_key, algorithm)
+
+    keys = _parse_keys(settings.jwt_keys or "")
+    signing_kid = settings.jwt_active_kid or next(iter(keys), None)
+    if algorithm in AsymmetricCodec.algorithms:
+        if not keys:
+            raise ValueError(f"{algorithm} tokens need at least one key in JWT_KEYS")
+        pems = {}
+        for kid, path in keys.items():
+            with open(path, "rb") as file:
+                pems[kid] = file.read()
+        return AsymmetricCodec(pems, algorithm, signing_kid)
+
+    if settings.jwt_secret_key is not None:
+        keys[None] = settings.jwt_secret_key
+    if not keys:
+        raise ValueError(f"{algorithm} tokens need JWT_SECRET_KEY or JWT_KEYS")
+    return HMACCodec(keys, algorithm, signing_kid)
+
+
+def benchmark(iterations:int = 20000, secret:str = "0123456789abcdef0123456789abcdef") -> dict:
+    """
+    Compare the encode/decode throughput of the built-in codecs with `python-jose`.
+
+    Parameters
+    ----------
+    * iterations : `int`, `optional` \\
+        Number of tokens encoded and decoded per codec.
+    * secret : `str`, `optional` \\
+        Secret used by the HMAC codecs.
+
+    Returns
+    -------
+    * `dict` \\
+        Encode and decode operations per second by codec name.
+    """
+    claims = {"sub": "benchmark", "uid": 1, "scopes": ["read", "write"], "expires": "2100-01-01T00:00:00+00:00"}
+    codecs = {
+        "jose HS256": JoseCodec(secret, "HS256"),
+        "fast HS256": HMACCodec({"k1": secret, None: secret}, "HS256", "k1"),
+        "fast HS512": HMACCodec({"k1": secret}, "HS512", "k1"),
+    }
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+        for algorithm, private_key in (("EdDSA", ed25519.Ed25519PrivateKey.generate()),
+                                       ("ES256", ec.generate_private_key(ec.SECP256R1()))):
+            pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                            serialization.NoEncryption())
+            codecs[f"fast {algorithm}"] = AsymmetricCodec({"k1": pem}, algorithm, "k1")
+    except ImportError:
+        pass
+
+    results = {}
+    for name, codec in codecs.items():
+        started = time.perf_counter()
+        tokens = [codec.encode(claims) for _ in range(iterations)]
+        encoded = time.perf_counter()
+        for token in tokens:
+            codec.decode(token)
+        decoded = time.perf_counter()
+        results[name] = {"encode_per_second": iterations / (encoded - started),
+                         "decode_per_second": iterations / (decoded - encoded)}
+    return results
+
+
+if __name__ == "__main__":
+    report = benchmark(*(int(argument) for argument in sys.argv[1:2]))
+    print(f"{'codec':<12} {'encode/s':>12} {'decode/s':>12}")
+    for name, result in report.items():
+        print(f"{name:<12} {result['encode_per_second']:>12,.0f} {result['decode_per_second']:>12,.0f}")
@@ -0,0 +1,214 @@
+import threading
+import time
+from datetime import datetime
+from fastapi_simplified.config.settings import get_settings
+from fastapi_simplified.config.tenancy import qualified_key, tenant_key
+from fastapi_simplified.repositories.generics.write_events import add_write_listener
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter of strings. Membership tests may return false positives, never
+    false negatives.
+
+    Attributes
+    ----------
+    * bits : `int`, `optional` \\
+        Size of the bit array.
+    * hashes : `int`, `optional` \\
+        Number of bit positions per item.
+    """
+    def __init__(self, bits:int = 1 << 16, hashes:int = 5) -> None:
+        self.bits : int = bits
+        self.hashes : int = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    @staticmethod
+    def _hashes(item:str) -> tuple[int, int]:
+        # Double hashing of the built-in string hash, which is cached on the string. It is salted per
+        # process, which is fine for a filter that never leaves the process.
+        value = hash(item) & 0xFFFFFFFFFFFFFFFF
+        return value & 0xFFFFFFFF, (value >> 32) | 1
+
+    def add(self, item:str) -> None:
+        first, second = self._hashes(item)
+        for index in range(self.hashes):
+            position = (first + index * second) % self.bits
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item:str) -> bool:
+        first, second = self._hashes(item)
+        array, bits = self._array, self.bits
+        for index in range(self.hashes):
+            position = (first + index * second) % bits
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class _Bucket:
+    # Revoked token ids expiring within the same time slice
+    __slots__ = ("filter", "jtis")
+
+    def __init__(self, bits:int, hashes:int) -> None:
+        self.filter = BloomFilter(bits, hashes)
+        self.jtis : set[str] = set()
+
+
+def _expires_at(claims:dict) -> float:
+    """
+    Returns the expiry of a token as a timestamp, or `None` if it carries none.
+    """
+    if claims.get("exp") is not None:
+        return float(claims["exp"])
+    if claims.get("expires") is not None:
+        try:
+            return datetime.fromisoformat(claims["expires"]).timestamp()
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+class RevocationList:
+    """
+    In-memory denylist of revoked tokens, by `jti`, and of users whose earlier tokens are all revoked.
+
+    Revoked ids are grouped by the expiry of their token into buckets of `bucket_seconds`, each with a
+    Bloom filter in front of an exact set. A check only looks at the bucket of the token's own expiry:
+    most tokens find no bucket or fail the filter and never reach the set, and a filter false positive
+    is settled by the set. Whole buckets are dropped once their tokens have expired, so memory only
+    holds revocations that still matter.
+
+    Users are revoked per tenant: revoking a user of the current tenant only rejects the tokens whose
+    `TENANT_CLAIM` names that tenant, never those of a namesake in another tenant.
+
+    Revocations are kept per process. Tokens are only as revocable as every worker's list is current.
+
+    Attributes
+    ----------
+    * bucket_seconds : `float`, `optional` \\
+        Width of the expiry buckets.
+    * filter_bits : `int`, `optional` \\
+        Size of the Bloom filter of a bucket.
+    * filter_hashes : `int`, `optional` \\
+        Number of hash positions of the Bloom filters.
+
+    Methods
+    -------
+    * revoke(claims: `dict`) -> `None` \\
+        Revokes a token, given its verified claims.
+    * revoke_user(username: `str`) -> `None` \\
+        Revokes every token issued to a user of the current tenant until now.
+    * is_revoked(claims: `dict`) -> `bool` \\
+        Whether a token has been revoked.
+    * on_write(action: `str`, entities: `list`) -> `None` \\
+        Repository write listener that revokes the tokens of disabled and deleted users.
+    * stats() -> `dict` \\
+        Returns the number of buckets, revoked ids and revoked users.
+    """
+    def __init__(self, bucket_seconds:float = 60, filter_bits:int = 1 << 16, filter_hashes:int = 5) -> None:
+        self.bucket_seconds : float = bucket_seconds
+        self.filter_bits : int = filter_bits
+        self.filter_hashes : int = filter_hashes
+        self._buckets : dict[int, _Bucket] = {}
+        # tenant qualified username -> (tokens issued up to this timestamp are revoked, forget the entry
+        # after this timestamp)
+        self._users : dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _max_lifetime(self) -> float:
+        return get_settings().jwt_expires_in * 60
+
+    def _purge(self, now:float) -> None:
+        # Drops buckets and user cutoffs that only cover expired tokens, which `get_claims` rejects on
+        # its own. Called with the lock held
+        for key in [key for key in self._buckets if key * self.bucket_seconds < now]:
+            del self._buckets[key]
+        for username in [username for username, (_, until) in self._users.items() if until < now]:
+            del self._users[username]
+
+    def revoke(self, claims:dict) -> None:
+        """
+        Revoke a token until it expires.
+
+        Parameters
+        ----------
+        * claims : `dict` \\
+            The verified claims of the token. Tokens without a `jti` can't be revoked one by one;
+            use `revoke_user` for them.
+        """
+        jti = claims.get("jti")
+        if jti is None:
+            raise ValueError("The token has no jti claim")
+
+        now = time.time()
+        expires_at = _expires_at(claims) or now + self._max_lifetime()
+        if expires_at <= now:
+            return
+        key = int(expires_at // self.bucket_seconds) + 1
+        with self._lock:
+            self._purge(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(self.filter_bits, self.filter_hashes)
+            bucket.filter.add(jti)
+            bucket.jtis.add(jti)
+
+    def revoke_user(self, username:str) -> None:
+        """
+        Revoke every token issued to `username` of the current tenant so far, e.g. on logout from all
+        devices, a password change or when the user is disabled. Tokens issued afterwards are accepted.
+        """
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            self._users[tenant_key(username)] = (now, now + self._max_lifetime())
+
+    def is_revoked(self, claims:dict) -> bool:
+        """
+        Check whether a token was revoked, by its `jti` or through its user.
+
+        Parameters
+        ----------
+        * claims : `dict` \\
+            The verified claims of the token.
+
+        Returns
+        -------
+        * `bool` \\
+            True if the token must be rejected.
+        """
+        if self._users and claims.get("sub") is not None:
+            # Checked against the tenant the token was issued in
+            cutoff = self._users.get(qualified_key(claims.get(get_settings().tenant_claim), claims["sub"]))
+            # Tokens without `iat` predate revocation support, and count as issued before the cutoff
+            if cutoff is not None and float(claims.get("iat") or 0) <= cutoff[0]:
+                return True
+
+        if not self._buckets:
+            return False
+        jti = claims.get("jti")
+        expires_at = _expires_at(claims)
+        if jti is None or expires_at is None:
+            return False
+        bucket = self._buckets.get(int(expires_at // self.bucket_seconds) + 1)
+        return bucket is not None and jti in bucket.filter and jti in bucket.jtis
+
+    def on_write(self, action:str, entities:list) -> None:
+        # Runs in the context of the write, i.e. in the tenant of the users
+        for entity in entities:
+            username = getattr(entity, "username", None)
+            if username is not None and (action == "delete" or getattr(entity, "disabled", False)):
+                self.revoke_user(username)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "buckets": len(self._buckets),
+                "revoked_tokens": sum(len(bucket.jtis) for bucket in self._buckets.values()),
+                "revoked_users": len(self._users),
+            }
+
+
+revocation_list = RevocationList()
+add_write_listener(revocation_list.on_write)
@@ -0,0 +1,55 @@
+from fastapi_simplified.repositories.async_user_repository import AsyncUserRepository
+from fastapi_simplified.models.custom_user import CustomUser
+from fastapi_simplified.schemas.requests.create_user_request import CreateUserRequest
+from sqlalchemy.exc import SQLAlchemyError
+from fastapi_simplified.security.utils.password_hasher import PasswordHasher
+from fastapi_simplified.security.utils.password_policy import build_crypt_context
+from fastapi_simplified.exceptions.authentication_exceptions import *
+from fastapi_simplified.exceptions.resource_exceptions import *
+from fastapi_simplified.services.generics.user_details_service import AsyncUserDetailService
+from fastapi_simplified.security.utils.principal import Principal
+from fastapi_simplified.metrics.timing import timed
+
+
+class AsyncUserService(AsyncUserDetailService):
+
+    # `model` is the concrete, mapped user entity of the application. `CustomUser` itself is abstract
+    # and has no table, so the default only suits a service that is replaced before use
+    def __init__(self, model:type[CustomUser] = CustomUser) -> None:
+        self.repo = AsyncUserRepository(model)
+        self.pwd_context = build_crypt_context()
+        self.hasher = PasswordHasher(self.pwd_context)
+
+    @timed("credentials")
+    async def get_by_username_password(self, username:str, password:str) -> CustomUser:
+        user = await self.repo.find_by_username(username)
+        if user:
+            valid, new_hash = await self.hasher.verify_and_update(password, user.password)
+            if valid:
+                if new_hash is not None:
+                    await self._upgrade_hash(user, new_hash)
+                return user
+            raise BadCredentialsException()
+        raise ResourceNotFoundException()
+
+    async def _upgrade_hash(self, user:CustomUser, new_hash:str) -> None:
+        # Store the hash made with the current scheme and cost. Failing to store it doesn't fail the
+        # login, the hash is simply upgraded on a later one.
+        user.password = new_hash
+        try:
+            await self.repo.update(user)
+        except SQLAlchemyError:
+            pass
+
+    async def get_by_username(self, username:str) -> Principal:
+        # Authenticated requests only need the principal; the full entity, hash included, is only loaded to log in
+        return await self.repo.find_principal_by_username(username)
+
+    async def get_by_usernames(self, usernames:list[str]) -> dict[str, Principal]:
+        # Batched lookups of the user loader, one query for the users authenticating at the same time
+        return {principal.username: principal for principal in await self.repo.find_principals_by_usernames(usernames)}
+
+    async def create_user(self, user_info:CreateUserRequest) -> CustomUser:
+        new_user = self.repo.model(**user_info.model_dump())
+        new_user.password = await self.hasher.hash(new_user.password)
+        return await self.repo.save(new_user)
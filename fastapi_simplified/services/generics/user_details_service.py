@@ -1,10 +1,15 @@
 import abc
+import inspect
 
 class UserDetailService(metaclass=abc.ABCMeta):
     """
     Abstract base class for user detail services.
 
     This class defines the interface that user detail service implementations should adhere to.
+    `get_by_username_password` may also be written as a coroutine, e.g. to verify the password
+    on a `PasswordHasher` pool; the authentication dependencies await it in that case.
+    Implementations may also define `get_by_usernames(usernames)`, returning the users found by
+    username, so that concurrent authenticated requests are looked up with a single query.
 
     Methods
     -------
@@ -68,4 +73,74 @@ class UserDetailService(metaclass=abc.ABCMeta):
             If the method is not implemented by the subclass.
 
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+class AsyncUserDetailService(metaclass=abc.ABCMeta):
+    """
+    Abstract base class for asyncio user detail services.
+
+    The async counterpart of `UserDetailService`. When an implementation of this class is registered
+    through `make_user_detail_Service`, the authentication dependencies await it instead of blocking
+    the event loop. `get_by_usernames` may be defined as a coroutine too.
+
+    Methods
+    -------
+    * get_by_username_password(username: `str`, password: `str`) -> `SecurityDetails`
+        Coroutine that gets a user by username and verifies the password.
+    * get_by_username(username: `str`) -> `SecurityDetails`
+        Coroutine that gets a user by username.
+
+    """
+    @classmethod
+    def __subclasshook__(cls, subclass):
+        return (hasattr(subclass, 'get_by_username') and
+                inspect.iscoroutinefunction(subclass.get_by_username) or
+                NotImplemented)
+
+    @abc.abstractmethod
+    async def get_by_username_password(self, username:str, password:str):
+        """
+        Get a user by username and verify password.
+
+        Parameters
+        ----------
+        * username : `str`
+            The username of the user.
+        * password : `str`
+            The password to verify.
+
+        Returns
+        -------
+        * `SecurityDetails`
+            The user details if the username and password are valid.
+
+        Raises
+        ------
+        * `NotImplementedError`
+            If the method is not implemented by the subclass.
+
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_by_username(self, username:str):
+        """
+        Get a user by username.
+
+        Parameters
+        ----------
+        * username : `str`
+            The username of the user to retrieve.
+
+        Returns
+        -------
+        * `SecurityDetails`
+            The user details corresponding to the provided username.
+
+        Raises
+        ------
+        * `NotImplementedError`
+            If the method is not implemented by the subclass.
+
+        """
+        raise NotImplementedError
@@ -1,31 +1,112 @@
+from typing import AsyncIterable
+from starlette.concurrency import run_in_threadpool
 from fastapi_simplified.repositories.user_repository import UserRepository
 from fastapi_simplified.models.custom_user import CustomUser
 from fastapi_simplified.schemas.requests.create_user_request import CreateUserRequest
-from passlib.context import CryptContext
+from sqlalchemy.exc import SQLAlchemyError
+from fastapi_simplified.security.utils.password_hasher import PasswordHasher
+from fastapi_simplified.security.utils.password_policy import build_crypt_context
 from fastapi_simplified.exceptions.authentication_exceptions import *
 from fastapi_simplified.exceptions.resource_exceptions import *
 from fastapi_simplified.services.generics.user_details_service import UserDetailService
+from fastapi_simplified.schemas.responses.bulk_write_response import BulkWriteError, BulkWriteResult
+from fastapi_simplified.utils.ndjson import iter_ndjson
+from fastapi_simplified.security.utils.principal import Principal
+from fastapi_simplified.metrics.timing import timed
 
 
 class UserService(UserDetailService):
 
-    def __init__(self) -> None:
-        self.repo = UserRepository(CustomUser)
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    # `model` is the concrete, mapped user entity of the application. `CustomUser` itself is abstract
+    # and has no table, so the default only suits a service that is replaced before use
+    def __init__(self, model:type[CustomUser] = CustomUser) -> None:
+        self.repo = UserRepository(model)
+        self.pwd_context = build_crypt_context()
+        self.hasher = PasswordHasher(self.pwd_context)
     
-    def get_by_username_password(self, username:str, password:str) -> CustomUser:
-        user = self.repo.find_by_username(username)
+    @timed("credentials")
+    async def get_by_username_password(self, username:str, password:str) -> CustomUser:
+        # The repository is synchronous, keep it off the event loop
+        user = await run_in_threadpool(self.repo.find_by_username, username)
         if user:
-            if self.pwd_context.verify(password, user.password):
+            valid, new_hash = await self.hasher.verify_and_update(password, user.password)
+            if valid:
+                if new_hash is not None:
+                    await run_in_threadpool(self._upgrade_hash, user, new_hash)
                 return user
             raise BadCredentialsException()
         raise ResourceNotFoundException()
         
-    def get_by_username(self, username:str) -> CustomUser:
-        return self.repo.find_by_username(username)
-
-    def create_user(self, user_info:CreateUserRequest) -> CustomUser:
-        new_user = CustomUser(**user_info.model_dump())
-        new_user.password = self.pwd_context.hash(new_user.password)
-        return self.repo.save(new_user)
-        
\ No newline at end of file
+    def _upgrade_hash(self, user:CustomUser, new_hash:str) -> None:
+        # Store the hash made with the current scheme and cost. Failing to store it doesn't fail the
+        # login, the hash is simply upgraded on a later one.
+        user.password = new_hash
+        try:
+            self.repo.update(user)
+        except SQLAlchemyError:
+            self.repo.db.rollback()
+
+    def get_by_username(self, username:str) -> Principal:
+        # Authenticated requests only need the principal; the full entity, hash included, is only loaded to log in
+        return self.repo.find_principal_by_username(username)
+
+    def get_by_usernames(self, usernames:list[str]) -> dict[str, Principal]:
+        # Batched lookups of the user loader, one query for the users authenticating at the same time
+        return {principal.username: principal for principal in self.repo.find_principals_by_usernames(usernames)}
+
+    async def create_user(self, user_info:CreateUserRequest) -> CustomUser:
+        new_user = self.repo.model(**user_info.model_dump())
+        new_user.password = await self.hasher.hash(new_user.password)
+        return await run_in_threadpool(self.repo.save, new_user)
+
+    async def import_users(self, body:AsyncIterable[bytes], chunk_size:int = 1000) -> BulkWriteResult:
+        """
+        Imports users from a streamed NDJSON body, one `CreateUserRequest` object per line.
+
+        The body is consumed one chunk at a time: the passwords of a chunk are hashed in parallel on the
+        password hasher pool, then the chunk is saved with a single bulk insert and committed. Invalid or
+        overlong lines and rows rejected by the database are reported without aborting the import.
+
+        Parameters
+        ----------
+        * body : `AsyncIterable[bytes]`
+            The raw request body, e.g. `request.stream()`.
+        * chunk_size : `int`, `optional`
+            Number of users hashed and inserted together.
+
+        Returns
+        -------
+        * `BulkWriteResult`
+            The number of imported users and the rejected lines, by position in the body.
+        """
+        if chunk_size < 1:
+            raise ValueError(f"The chunk size must be at least 1, got {chunk_size}")
+        result = BulkWriteResult()
+        batch : list[tuple[int, CreateUserRequest]] = []
+
+        async for index, record in iter_ndjson(body):
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                batch.append((index, CreateUserRequest.model_validate(record)))
+            except ValueError as error:
+                result.failed.append(BulkWriteError(index=index, detail=str(error)))
+
+            if len(batch) >= chunk_size:
+                await self._import_batch(batch, result)
+                batch = []
+
+        if batch:
+            await self._import_batch(batch, result)
+        result.failed.sort(key=lambda error: error.index)
+        return result
+
+    async def _import_batch(self, batch:list[tuple[int, CreateUserRequest]], result:BulkWriteResult) -> None:
+        hashes = await self.hasher.hash_many([user_info.password for _, user_info in batch])
+        new_users = [self.repo.model(**{**user_info.model_dump(), "password": hashed})
+                     for (_, user_info), hashed in zip(batch, hashes)]
+
+        # The repository is synchronous, keep it off the event loop
+        batch_result = await run_in_threadpool(self.repo.save_all, new_users, len(new_users))
+        result.succeeded += batch_result.succeeded
+        result.failed.extend(BulkWriteError(index=batch[error.index][0], detail=error.detail) for error in batch_result.failed)
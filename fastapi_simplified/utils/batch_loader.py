@@ -0,0 +1,139 @@
+import asyncio
+import contextvars
+import inspect
+import weakref
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _LoopState:
+    # Lookups of one event loop: keys waiting for the next batch, and the result of every key requested
+    # but not answered yet
+    __slots__ = ("pending", "inflight", "timer")
+
+    def __init__(self) -> None:
+        self.pending : list = []
+        self.inflight : dict[Hashable, asyncio.Future] = {}
+        self.timer : asyncio.TimerHandle = None
+
+
+class BatchLoader(Generic[K, V]):
+    """
+    Coalesces concurrent lookups, in the manner of a DataLoader.
+
+    Concurrent `load` calls for the same key share one lookup. Distinct keys requested within `window`
+    seconds of each other are looked up together, with one call of `batch_function`, as soon as the
+    window closes or `max_batch` keys are waiting. Nothing is kept once a lookup has completed: a key
+    requested afterwards is looked up again, so results are never staler than the lookup itself.
+
+    A batch serves several callers, so `batch_function` runs in a fresh `contextvars.Context` rather than
+    in the context of the caller that opened it: the session, tenant or user of one request are never
+    visible to the lookup of another. Whatever context the lookup needs has to be set up by `batch_function`.
+
+    Attributes
+    ----------
+    * batch_function : `Callable[[list[K]], dict[K, V]]` \\
+        Looks up a list of distinct keys and returns their values by key, or an awaitable of them.
+        Keys missing from the result load as `None`. An exception fails every key of the batch.
+    * window : `float`, `optional` \\
+        Seconds the first key of a batch waits for others. Defaults to `USER_LOADER_WINDOW_MS`.
+    * max_batch : `int`, `optional` \\
+        Most keys looked up at once. Defaults to `USER_LOADER_MAX_BATCH`.
+
+    Methods
+    -------
+    * load(key: `K`) -> `V` \\
+        Coroutine returning the value of a key.
+    * stats() -> `dict` \\
+        Returns the number of loads, of loads that joined a lookup in flight and of batches.
+    """
+    def __init__(self, batch_function:Callable[[list[K]], dict[K, V] | Awaitable[dict[K, V]]], window:float = None,
+                 max_batch:int = None) -> None:
+        self.batch_function = batch_function
+        self._window : float = window
+        self._max_batch : int = max_batch
+        self._states : weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState] = weakref.WeakKeyDictionary()
+        self.loads : int = 0
+        self.coalesced : int = 0
+        self.batches : int = 0
+
+    @property
+    def window(self) -> float:
+        if self._window is None:
+            from fastapi_simplified.config.settings import get_settings
+            return get_settings().user_loader_window_ms / 1000
+        return self._window
+
+    @property
+    def max_batch(self) -> int:
+        if self._max_batch is None:
+            from fastapi_simplified.config.settings import get_settings
+            return get_settings().user_loader_max_batch
+        return self._max_batch
+
+    async def load(self, key:K) -> V:
+        """
+        Returns the value of `key`, looked up along with the other keys requested meanwhile.
+
+        Parameters
+        ----------
+        * key : `K` \\
+            The key to look up.
+
+        Returns
+        -------
+        * `V` \\
+            The value returned by `batch_function`, or `None`.
+        """
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState()
+
+        self.loads += 1
+        future = state.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = state.inflight[key] = loop.create_future()
+            state.pending.append(key)
+            if len(state.pending) >= self.max_batch:
+                self._dispatch(loop, state)
+            elif state.timer is None:
+                state.timer = loop.call_later(self.window, self._dispatch, loop, state)
+        # A cancelled caller mustn't cancel the lookup the others are waiting for
+        return await asyncio.shield(future)
+
+    def _dispatch(self, loop:asyncio.AbstractEventLoop, state:_LoopState) -> None:
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        keys, state.pending = state.pending, []
+        if keys:
+            self.batches += 1
+            # `create_task` copies the context it is called in (its `context` argument needs Python 3.11)
+            contextvars.Context().run(loop.create_task, self._run(state, keys))
+
+    async def _run(self, state:_LoopState, keys:list) -> None:
+        try:
+            results = self.batch_function(keys)
+            if inspect.isawaitable(results):
+                results = await results
+        except BaseException as error:
+            for key in keys:
+                future = state.inflight.pop(key)
+                if not future.done():
+                    future.set_exception(error)
+            if not isinstance(error, Exception):
+                raise
+            return
+
+        for key in keys:
+            future = state.inflight.pop(key)
+            if not future.done():
+                future.set_result(results.get(key))
+
+    def stats(self) -> dict[str, Any]:
+        return {"loads": self.loads, "coalesced": self.coalesced, "batches": self.batches}
@@ -0,0 +1,122 @@
+import json
+from itertools import islice
+from typing import Any, AsyncIterable, AsyncIterator, Iterable
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.exc import NoInspectionAvailable
+
+
+async def iter_ndjson(stream:AsyncIterable[bytes], max_line_length:int = 1024 * 1024) -> AsyncIterator[tuple[int, Any]]:
+    """
+    Parse a streamed NDJSON (newline-delimited JSON) body one line at a time, e.g. `request.stream()`,
+    so that arbitrarily large bodies never have to be held in memory.
+
+    Parameters
+    ----------
+    * stream : `AsyncIterable[bytes]` \\
+        The raw body chunks. Lines may be split across chunks.
+    * max_line_length : `int`, `optional` \\
+        Longest accepted line in bytes. Longer lines are skipped without being held in memory.
+
+    Yields
+    ------
+    * `tuple[int, Any]` \\
+        The position of the record (blank lines are skipped) and the decoded value, or the
+        `ValueError` raised while decoding it (or for a line that is too long) so that callers can
+        report the line and move on.
+    """
+    buffer = b""
+    index = 0
+    # Set while the rest of an overlong line is discarded
+    skipping = False
+    async for chunk in stream:
+        if skipping:
+            newline = chunk.find(b"\n")
+            if newline < 0:
+                continue
+            chunk, skipping = chunk[newline + 1:], False
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if len(line) > max_line_length:
+                yield index, _too_long(max_line_length)
+                index += 1
+            elif line.strip():
+                yield index, _decode(line)
+                index += 1
+        if len(buffer) > max_line_length:
+            yield index, _too_long(max_line_length)
+            index += 1
+            buffer, skipping = b"", True
+    if buffer.strip():
+        yield index, _decode(buffer)
+
+
+def _too_long(max_line_length:int) -> ValueError:
+    return ValueError(f"The line is longer than {max_line_length} bytes")
+
+
+def _decode(line:bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as error:
+        return error
+
+
+def _to_json_line(row:Any, schema:type[BaseModel] = None) -> bytes:
+    if schema is not None:
+        return schema.model_validate(row).model_dump_json().encode() + b"\n"
+    if isinstance(row, BaseModel):
+        return row.model_dump_json().encode() + b"\n"
+    try:
+        # ORM entities are written with their column values
+        row = {attribute.key: getattr(row, attribute.key) for attribute in inspect(row).mapper.column_attrs}
+    except NoInspectionAvailable:
+        pass
+    return json.dumps(row, default=str, separators=(",", ":")).encode() + b"\n"
+
+
+def ndjson_response(rows:Iterable | AsyncIterable, schema:type[BaseModel] = None, lines_per_chunk:int = 100) -> StreamingResponse:
+    """
+    Stream rows as an NDJSON (newline-delimited JSON) response, e.g. straight from `GenericRepository.stream_all`,
+    so that memory stays flat however many rows are sent.
+
+    ```python
+    @app.get("/users/export")
+    def export_users():
+        return ndjson_response(repo.stream_all(), schema=User)
+    ```
+
+    Parameters
+    ----------
+    * rows : `Iterable` | `AsyncIterable` \\
+        The rows to send: ORM entities, pydantic models or JSON-serializable values.
+    * schema : `type[BaseModel]`, `optional` \\
+        Pydantic model each row is validated into (`from_attributes`) before it is written. Without it ORM
+        entities are written with all their columns, password hashes included.
+    * lines_per_chunk : `int`, `optional` \\
+        Number of lines written to the socket at once.
+
+    Returns
+    -------
+    * `StreamingResponse` \\
+        The `application/x-ndjson` response.
+    """
+    if hasattr(rows, "__aiter__"):
+        async def body():
+            chunk = []
+            async for row in rows:
+                chunk.append(_to_json_line(row, schema))
+                if len(chunk) >= lines_per_chunk:
+                    yield b"".join(chunk)
+                    chunk = []
+            if chunk:
+                yield b"".join(chunk)
+    else:
+        def body():
+            iterator = iter(rows)
+            while chunk := list(islice(iterator, lines_per_chunk)):
+                yield b"".join(_to_json_line(row, schema) for row in chunk)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
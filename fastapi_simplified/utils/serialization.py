@@ -0,0 +1,118 @@
+import json
+import types
+import typing
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Any, Callable
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value:Any) -> Any:
+    # Values neither encoder handles natively, e.g. Decimal and UUID, are written as strings
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return str(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    A JSON response rendered with `orjson` when it is installed, and with the standard library otherwise.
+
+    Return it from a route along with content that is already made of plain values, e.g. built with
+    `row_serializer`: FastAPI sends a returned response as is, without validating it against the
+    `response_model` of the route, which then only documents the response.
+    """
+    def render(self, content:Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _nested_model(annotation:Any) -> tuple[type[BaseModel], bool]:
+    """
+    Returns the pydantic model a field holds, if any, and whether it holds a list of them.
+    Optional fields are unwrapped.
+    """
+    arguments = [argument for argument in typing.get_args(annotation) if argument is not type(None)]
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType) and len(arguments) == 1:
+        return _nested_model(arguments[0])
+    if typing.get_origin(annotation) in (list, tuple, set, frozenset) and arguments:
+        model, _ = _nested_model(arguments[0])
+        return model, model is not None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    return None, False
+
+
+def _nested_serializer(model:type[BaseModel], many:bool) -> Callable[[Any], Any]:
+    def serialize(value:Any) -> Any:
+        if value is None:
+            return None
+        # Looked up on use, so that models may refer to each other
+        serializer = row_serializer(model)
+        return [serializer(item) for item in value] if many else serializer(value)
+    return serialize
+
+
+@lru_cache(maxsize=None)
+def row_serializer(schema:type[BaseModel]) -> Callable[[Any], dict]:
+    """
+    Compile a function that turns a row into the plain dict `schema` would serialize it to, without
+    validating it: the attributes named by the fields of `schema` are read straight from the row.
+
+    Rows are anything with those attributes, e.g. ORM entities, `Principal`s, result rows of a
+    `select()` or models built with `model_construct`. Fields holding another model, or a list of
+    models, are serialized with the compiled function of that model. Serializers are compiled once
+    per schema.
+
+    Only use it on trusted data such as repository results: a row that wouldn't pass validation is
+    written as is.
+
+    Parameters
+    ----------
+    * schema : `type[BaseModel]` \\
+        The response model.
+
+    Returns
+    -------
+    * `Callable[[Any], dict]` \\
+        The serializer.
+    """
+    namespace = {}
+    attributes, loaded = [], []
+    for index, (name, field) in enumerate(schema.model_fields.items()):
+        key = field.serialization_alias or field.alias or name
+        attribute = f"row.{name}" if name.isidentifier() else f"getattr(row, {name!r})"
+        value = f"state[{name!r}]"
+        model, many = _nested_model(field.annotation)
+        if model is not None:
+            namespace[f"nested_{index}"] = _nested_serializer(model, many)
+            attribute, value = f"nested_{index}({attribute})", f"nested_{index}({value})"
+        attributes.append(f"{key!r}: {attribute}")
+        loaded.append(f"{key!r}: {value}")
+
+    # ORM entities keep their loaded column values in their __dict__, which is much faster to read than
+    # their instrumented attributes. Expired or unloaded values are missing from it and still go through
+    # the attributes, which load them.
+    source = (
+        f"def from_attributes(row):\n"
+        f"    return {{{', '.join(attributes)}}}\n"
+        f"def serialize(row):\n"
+        f"    state = getattr(row, '__dict__', None)\n"
+        f"    if state is not None and '_sa_instance_state' in state:\n"
+        f"        try:\n"
+        f"            return {{{', '.join(loaded)}}}\n"
+        f"        except KeyError:\n"
+        f"            pass\n"
+        f"    return from_attributes(row)\n"
+    )
+    exec(compile(source, f"<row_serializer {schema.__qualname__}>", "exec"), namespace)
+    return namespace["serialize"]
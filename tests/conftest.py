@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.orm import declarative_base
+from fastapi_simplified.config import database_config
+from fastapi_simplified.config.settings import get_settings
+
+# Kept off `Base.metadata`, so that the tests decide which database gets the table
+ModelBase = declarative_base()
+
+
+class Item(ModelBase):
+    __tablename__ = "items"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+
+
+@pytest.fixture
+def configure(monkeypatch, tmp_path):
+    """
+    Sets settings through their environment variables, on top of a primary SQLite database in
+    `tmp_path`, and resets the engines and tables created from the previous settings.
+    """
+    def configure(**settings) -> None:
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'primary.sqlite'}")
+        monkeypatch.setenv("JWT_SECRET_KEY", "k" * 32)
+        for name, value in settings.items():
+            monkeypatch.setenv(name.upper(), str(value))
+        get_settings.cache_clear()
+        monkeypatch.setattr(database_config, "_engine", None)
+        monkeypatch.setattr(database_config, "_replica_engines", None)
+        monkeypatch.setattr(database_config, "_created_tables", set())
+
+    yield configure
+    for engine in [database_config._engine, *(database_config._replica_engines or [])]:
+        if engine is not None:
+            engine.dispose()
+    get_settings.cache_clear()
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import Column, Integer, String, select
+from fastapi_simplified.config.database_config import Base, session_scope
+from fastapi_simplified.repositories.generics.generic_repository import GenericRepository
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), unique=True, nullable=False)
+
+
+@pytest.fixture
+def repo(configure):
+    configure()
+    return GenericRepository(Tag)
+
+
+def names(repo) -> list[str]:
+    return repo.db.scalars(select(Tag.name).order_by(Tag.id)).all()
+
+
+def test_save_all_in_chunks(repo):
+    with session_scope():
+        result = repo.save_all((Tag(name=f"tag{i}") for i in range(5)), chunk_size=2)
+        assert result.succeeded == 5 and result.failed == []
+        assert names(repo) == [f"tag{i}" for i in range(5)]
+
+
+def test_save_all_rejects_only_the_offending_rows(repo):
+    with session_scope():
+        repo.save(Tag(name="taken"))
+        result = repo.save_all([Tag(name="a"), Tag(name="taken"), Tag(name="b"), Tag(name="b"), Tag(name="c")], chunk_size=3)
+        assert result.succeeded == 3
+        assert [error.index for error in result.failed] == [1, 3]
+        assert names(repo) == ["taken", "a", "b", "c"]
+
+
+def test_update_many_rejects_only_the_offending_rows(repo):
+    with session_scope():
+        repo.save_all([Tag(name="a"), Tag(name="b"), Tag(name="c")])
+        a, b, c = repo.db.scalars(select(Tag).order_by(Tag.id)).all()
+        a.name, b.name, c.name = "x", "c", "z"
+        result = repo.update_many([a, b, c], chunk_size=3)
+        assert result.succeeded == 2
+        assert [error.index for error in result.failed] == [1]
+        assert names(repo) == ["x", "b", "z"]
+
+
+def test_delete_by_ids(repo):
+    with session_scope():
+        repo.save_all([Tag(name="a"), Tag(name="b"), Tag(name="c")])
+        ids = repo.db.scalars(select(Tag.id).order_by(Tag.id)).all()
+        result = repo.delete_by_ids([ids[0], ids[2], 999], chunk_size=2)
+        assert result.succeeded == 3
+        assert names(repo) == ["b"]
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1])
+def test_chunk_size_must_be_positive(repo, chunk_size):
+    with session_scope():
+        with pytest.raises(ValueError):
+            repo.save_all([Tag(name="a")], chunk_size=chunk_size)
+        with pytest.raises(ValueError):
+            repo.update_many([Tag(id=1, name="a")], chunk_size=chunk_size)
+        with pytest.raises(ValueError):
+            repo.delete_by_ids([1], chunk_size=chunk_size)
+        assert names(repo) == []
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import Column, Integer, String
+from fastapi_simplified.config.database_config import Base, session_scope
+from fastapi_simplified.exceptions.resource_exceptions import InvalidCursorException, InvalidPageRequestException
+from fastapi_simplified.repositories.generics.generic_repository import GenericRepository
+
+
+class Page(Base):
+    __tablename__ = "pages"
+
+    id = Column(Integer, primary_key=True)
+    rank = Column(Integer, index=True)
+    label = Column(String(50))
+
+
+@pytest.fixture
+def repo(configure):
+    configure()
+    repo = GenericRepository(Page)
+    with session_scope():
+        # Ranks repeat, so pages sorted by rank have to break ties by id
+        repo.save_all(Page(id=id, rank=id % 3, label=f"page{id}") for id in range(1, 11))
+    return repo
+
+
+def all_pages(repo, limit:int, **ordering) -> list[list[int]]:
+    pages, cursor = [], None
+    while True:
+        rows, cursor = repo.find_page(limit, cursor, **ordering)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_pages_by_primary_key(repo):
+    with session_scope():
+        assert all_pages(repo, 4) == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
+        assert all_pages(repo, 5, descending=True) == [[10, 9, 8, 7, 6], [5, 4, 3, 2, 1]]
+
+
+def test_pages_by_indexed_column(repo):
+    with session_scope():
+        by_rank = sorted(range(1, 11), key=lambda id: (id % 3, id))
+        assert sum(all_pages(repo, 3, order_by="rank"), []) == by_rank
+        assert sum(all_pages(repo, 3, order_by="rank", descending=True), []) == by_rank[::-1]
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_limit_must_be_positive(repo, limit):
+    with session_scope(), pytest.raises(InvalidPageRequestException) as error:
+        repo.find_page(limit)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("order_by", ["missing", "label"])
+def test_order_by_must_be_an_indexed_column(repo, order_by):
+    with session_scope(), pytest.raises(InvalidPageRequestException) as error:
+        repo.find_page(3, order_by=order_by)
+    assert error.value.status_code == 400
+
+
+def test_invalid_cursors(repo):
+    with session_scope():
+        _, cursor = repo.find_page(3)
+        with pytest.raises(InvalidCursorException):
+            repo.find_page(3, "not a cursor")
+        with pytest.raises(InvalidCursorException):
+            repo.find_page(3, cursor, descending=True)
+        with pytest.raises(InvalidCursorException):
+            repo.find_page(3, cursor, order_by="rank")
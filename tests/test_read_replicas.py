@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import create_engine, insert, select
+from fastapi_simplified.config.database_config import session_scope, use_primary
+from tests.conftest import Item, ModelBase
+
+
+@pytest.fixture
+def replica(configure, tmp_path):
+    """
+    A primary and a "replica" that don't replicate, holding different rows, so that every read
+    tells which of them answered it.
+    """
+    replica_url = f"sqlite:///{tmp_path / 'replica.sqlite'}"
+    configure(database_replica_urls=replica_url)
+    for url, name in [(f"sqlite:///{tmp_path / 'primary.sqlite'}", "primary"), (replica_url, "replica")]:
+        engine = create_engine(url)
+        ModelBase.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(insert(Item).values(name=name))
+        engine.dispose()
+
+
+def names(db) -> list[str]:
+    return db.scalars(select(Item.name).order_by(Item.id)).all()
+
+
+def test_reads_go_to_the_replica(replica):
+    with session_scope() as db:
+        assert names(db) == ["replica"]
+
+
+def test_reads_after_a_write_go_to_the_primary(replica):
+    with session_scope() as db:
+        assert names(db) == ["replica"]
+        db.add(Item(name="written"))
+        db.flush()
+        assert names(db) == ["primary", "written"]
+        db.commit()
+        # The session stays on the primary until it is closed
+        assert names(db) == ["primary", "written"]
+
+    with session_scope() as db:
+        assert names(db) == ["replica"]
+
+
+def test_for_update_goes_to_the_primary(replica):
+    with session_scope() as db:
+        assert db.scalars(select(Item.name).with_for_update()).all() == ["primary"]
+
+
+def test_use_primary(replica):
+    with session_scope() as db:
+        with use_primary():
+            assert names(db) == ["primary"]
+        assert names(db) == ["replica"]
@@ -0,0 +1,130 @@
+import asyncio
+import pytest
+from sqlalchemy import select
+from starlette.requests import Request
+from fastapi_simplified.config import database_config, tenancy
+from fastapi_simplified.config.database_config import session_scope
+from fastapi_simplified.config.tenancy import TenantEngineRegistry, resolve_tenant, tenant_scope
+from fastapi_simplified.exceptions.authentication_exceptions import BadCredentialsException
+from fastapi_simplified.exceptions.resource_exceptions import UnknownTenantException
+from fastapi_simplified.repositories.generics.async_generic_repository import AsyncGenericRepository
+from fastapi_simplified.security.service.authentication import get_current_user_information
+from fastapi_simplified.security.utils.jwt_utils import create_access_token
+from tests.conftest import Item, ModelBase
+
+
+@pytest.fixture
+def registry(configure, monkeypatch, tmp_path):
+    configure(tenant_database_url=f"sqlite:///{tmp_path}/{{tenant}}.sqlite", tenant_ids="a,b,c", tenant_max_engines=2)
+    registry = TenantEngineRegistry()
+    monkeypatch.setattr(tenancy, "tenant_registry", registry)
+    monkeypatch.setattr(database_config, "tenant_registry", registry)
+    yield registry
+    registry.dispose_all()
+
+
+def request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def bearer(**claims) -> str:
+    return "Bearer " + create_access_token({"sub": "bob", **claims})
+
+
+def test_each_tenant_gets_its_own_engine(registry):
+    a, b = registry.get_engine("a"), registry.get_engine("b")
+    assert a is not b
+    assert registry.get_engine("a") is a
+    assert registry.stats()["created"] == 2
+
+    for tenant in ["a", "b"]:
+        ModelBase.metadata.create_all(registry.get_engine(tenant))
+        with tenant_scope(tenant), session_scope() as db:
+            db.add(Item(name=tenant))
+            db.commit()
+    for tenant in ["a", "b"]:
+        with tenant_scope(tenant), session_scope() as db:
+            assert db.scalars(select(Item.name)).all() == [tenant]
+
+
+def test_eviction_keeps_the_engine_count_bounded(registry):
+    a = registry.get_engine("a")
+    registry.get_engine("b")
+    registry.get_engine("a")
+    registry.get_engine("c")
+    # "b" is the least recently used
+    assert list(registry._engines) == ["a", "c"]
+    assert registry.stats()["evicted"] == 1
+    assert registry.get_engine("a") is a
+
+
+def test_leased_engines_are_not_disposed_of(registry):
+    with tenant_scope("a"), session_scope() as db:
+        a = db.get_bind()
+        registry.get_engine("b")
+        registry.get_engine("c")
+        # "a" is leased by the session, so "b" goes instead, and evicting "a" waits for the session
+        assert list(registry._engines) == ["a", "c"]
+        assert registry.evict("a")
+        assert registry.stats()["leased"] == 1
+        assert a.pool.checkedout() == 0
+        assert db.get_bind() is a
+    assert registry.stats()["leased"] == 0
+    assert registry.get_engine("a") is not a
+
+
+@pytest.mark.parametrize("tenant", ["unknown", "../a", ""])
+def test_unknown_tenant_header(registry, tmp_path, tenant):
+    with pytest.raises(UnknownTenantException):
+        asyncio.run(resolve_tenant(request(x_tenant_id=tenant)))
+    assert registry.stats()["created"] == 0
+    assert not (tmp_path / f"{tenant}.sqlite").exists()
+
+
+def test_tenants_of_url_for(registry):
+    registry.url_for = lambda tenant: None
+    with pytest.raises(UnknownTenantException):
+        asyncio.run(resolve_tenant(request(x_tenant_id="a")))
+    with pytest.raises(UnknownTenantException):
+        registry.get_engine("a")
+
+
+def test_resolving_a_tenant_opens_no_database(registry):
+    assert asyncio.run(resolve_tenant(request(x_tenant_id="a"))) == "a"
+    assert registry.stats()["engines"] == 0
+
+
+def test_tenant_of_the_header_and_the_token(registry):
+    assert asyncio.run(resolve_tenant(request(x_tenant_id="a"))) == "a"
+    assert asyncio.run(resolve_tenant(request(authorization=bearer(tenant="a")))) == "a"
+    assert asyncio.run(resolve_tenant(request(x_tenant_id="a", authorization=bearer(tenant="a")))) == "a"
+    assert asyncio.run(resolve_tenant(request(authorization=bearer()))) is None
+
+
+@pytest.mark.parametrize("claims", [{"tenant": "b"}, {}])
+def test_tenant_mismatch_is_rejected(registry, claims):
+    with pytest.raises(BadCredentialsException):
+        asyncio.run(resolve_tenant(request(x_tenant_id="a", authorization=bearer(**claims))))
+
+
+def test_token_of_another_tenant_is_rejected(registry):
+    token = bearer(tenant="a")[7:]
+    with pytest.raises(BadCredentialsException):
+        asyncio.run(get_current_user_information(token))
+    with tenant_scope("b"), pytest.raises(BadCredentialsException):
+        asyncio.run(get_current_user_information(token))
+    with tenant_scope("a"), pytest.raises(BadCredentialsException):
+        asyncio.run(get_current_user_information(bearer()[7:]))
+
+
+def test_async_repositories_refuse_tenants(registry):
+    repo = AsyncGenericRepository(Item)
+    with tenant_scope("a"), pytest.raises(RuntimeError):
+        repo.get_db()
+    with tenant_scope("a"), pytest.raises(RuntimeError):
+        asyncio.run(repo.create_tables())
@@ -0,0 +1,74 @@
+import time
+from types import SimpleNamespace
+import pytest
+from fastapi_simplified.config.tenancy import tenant_scope
+from fastapi_simplified.security.utils.token_revocation import BloomFilter, RevocationList
+
+
+@pytest.fixture
+def revocations(configure):
+    configure(jwt_expires_in=1)
+    return RevocationList(bucket_seconds=10)
+
+
+def claims(sub:str = "alice", jti:str = None, iat:float = None, lifetime:float = 60, **extra) -> dict:
+    iat = time.time() - 1 if iat is None else iat
+    return {"sub": sub, "jti": jti, "iat": iat, "exp": iat + lifetime, **extra}
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(bits=1024, hashes=3)
+    items = [f"item{i}" for i in range(100)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+
+
+def test_revoke_a_token(revocations):
+    revoked, other = claims(jti="one"), claims(jti="two")
+    revocations.revoke(revoked)
+    assert revocations.is_revoked(revoked)
+    assert not revocations.is_revoked(other)
+    with pytest.raises(ValueError):
+        revocations.revoke(claims())
+
+
+def test_expired_revocations_are_purged(revocations):
+    expired = claims(jti="old", iat=time.time() - 120)
+    revocations.revoke(expired)
+    assert revocations.stats()["revoked_tokens"] == 0
+
+    revocations.revoke(claims(jti="one", lifetime=5))
+    revocations._purge(time.time() + 30)
+    assert revocations.stats()["buckets"] == 0
+
+
+def test_revoke_a_user(revocations):
+    before = claims(jti="before")
+    revocations.revoke_user("alice")
+    assert revocations.is_revoked(before)
+    assert not revocations.is_revoked(claims(jti="after", iat=time.time() + 1))
+    assert not revocations.is_revoked(claims(sub="bob"))
+
+
+def test_users_are_revoked_per_tenant(revocations):
+    with tenant_scope("a"):
+        revocations.revoke_user("alice")
+    assert revocations.is_revoked(claims(tenant="a"))
+    assert not revocations.is_revoked(claims(tenant="b"))
+    assert not revocations.is_revoked(claims())
+
+    revocations.revoke_user("bob")
+    assert revocations.is_revoked(claims(sub="bob"))
+    assert not revocations.is_revoked(claims(sub="bob", tenant="a"))
+
+
+def test_disabled_and_deleted_users_are_revoked_in_their_tenant(revocations):
+    with tenant_scope("a"):
+        revocations.on_write("update", [SimpleNamespace(username="alice", disabled=True),
+                                        SimpleNamespace(username="bob", disabled=False)])
+        revocations.on_write("delete", [SimpleNamespace(username="carol", disabled=False)])
+    assert revocations.is_revoked(claims(tenant="a"))
+    assert revocations.is_revoked(claims(sub="carol", tenant="a"))
+    assert not revocations.is_revoked(claims(sub="bob", tenant="a"))
+    assert not revocations.is_revoked(claims(tenant="b"))
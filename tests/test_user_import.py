@@ -0,0 +1,86 @@
+import asyncio
+import json
+import pytest
+from sqlalchemy import select
+from fastapi_simplified.config.database_config import session_scope
+from fastapi_simplified.models.custom_user import CustomUser
+from fastapi_simplified.services.user_service import UserService
+from fastapi_simplified.utils.ndjson import iter_ndjson
+
+
+class ImportedUser(CustomUser):
+    __tablename__ = "users"
+
+
+async def chunks(*parts:bytes):
+    for part in parts:
+        yield part
+
+
+def parse(*parts:bytes, max_line_length:int = 1024) -> list:
+    async def collect():
+        return [(index, record) async for index, record in iter_ndjson(chunks(*parts), max_line_length)]
+    return asyncio.run(collect())
+
+
+def user(username:str, **fields) -> bytes:
+    values = {"username": username, "password": "secret", "email": f"{username}@example.com",
+              "name": username, "surname": "test", **fields}
+    return json.dumps(values).encode() + b"\n"
+
+
+def test_lines_split_across_chunks():
+    assert parse(b'{"a": 1}\n{"b"', b': 2}\n\n', b'[3]') == [(0, {"a": 1}), (1, {"b": 2}), (2, [3])]
+
+
+def test_invalid_lines_are_reported():
+    records = parse(b'{"a": 1}\nnot json\n{"b": 2}\n')
+    assert records[0] == (0, {"a": 1}) and records[2] == (2, {"b": 2})
+    assert isinstance(records[1][1], ValueError)
+
+
+@pytest.mark.parametrize("parts", [
+    # Completed within one chunk
+    [b'{"a": 1}\n"' + b"x" * 20 + b'"\n{"b": 2}\n'],
+    # Spread over several chunks
+    [b'{"a": 1}\n"', b"x" * 20, b"x" * 20, b'x"\n{"b": 2}\n'],
+])
+def test_overlong_lines_are_reported_and_skipped(parts):
+    records = parse(*parts, max_line_length=16)
+    assert [index for index, _ in records] == [0, 1, 2]
+    assert records[0][1] == {"a": 1} and records[2][1] == {"b": 2}
+    assert isinstance(records[1][1], ValueError)
+
+
+@pytest.fixture
+def service(configure):
+    configure(bcrypt_rounds=4)
+    return UserService(ImportedUser)
+
+
+def import_users(service:UserService, *parts:bytes, chunk_size:int = 1000):
+    async def run():
+        return await service.import_users(chunks(*parts), chunk_size=chunk_size)
+    return asyncio.run(run())
+
+
+def test_import_users(service):
+    with session_scope() as db:
+        body = [user("a"), b"not json\n", user("b"), user("a", email="other@example.com"), b'{"username": "c"}\n', user("d")]
+        result = import_users(service, *body, chunk_size=2)
+        assert result.succeeded == 3
+        assert [error.index for error in result.failed] == [1, 3, 4]
+        assert db.scalars(select(ImportedUser.username).order_by(ImportedUser.id)).all() == ["a", "b", "d"]
+
+
+def test_import_reports_overlong_lines(service):
+    with session_scope() as db:
+        result = import_users(service, user("a"), user("b", name="x" * 2 * 1024 * 1024), user("c"))
+        assert result.succeeded == 2
+        assert [error.index for error in result.failed] == [1]
+        assert db.scalars(select(ImportedUser.username).order_by(ImportedUser.id)).all() == ["a", "c"]
+
+
+def test_import_chunk_size_must_be_positive(service):
+    with session_scope(), pytest.raises(ValueError):
+        import_users(service, user("a"), chunk_size=0)
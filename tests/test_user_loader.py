@@ -0,0 +1,64 @@
+import asyncio
+import threading
+from contextvars import ContextVar
+from fastapi_simplified.config.database_config import current_session
+from fastapi_simplified.config.tenancy import current_tenant
+from fastapi_simplified.security.service import authentication
+from fastapi_simplified.utils.batch_loader import BatchLoader
+
+request_id : ContextVar[int] = ContextVar("request_id", default=None)
+
+
+def test_concurrent_loads_are_batched():
+    batches = []
+
+    def batch_function(keys):
+        batches.append(sorted(keys))
+        return {key: key * 2 for key in keys}
+
+    loader = BatchLoader(batch_function, window=0.01, max_batch=10)
+
+    async def main():
+        return await asyncio.gather(*(loader.load(key) for key in [1, 2, 2, 3]))
+
+    assert asyncio.run(main()) == [2, 4, 4, 6]
+    assert batches == [[1, 2, 3]]
+    assert loader.stats() == {"loads": 4, "coalesced": 1, "batches": 1}
+
+
+def test_batches_run_in_a_fresh_context():
+    loader = BatchLoader(lambda keys: {key: request_id.get() for key in keys}, window=0.01, max_batch=10)
+
+    async def load(key):
+        request_id.set(key)
+        return await loader.load(key)
+
+    async def main():
+        return await asyncio.gather(*(load(key) for key in range(3)))
+
+    assert asyncio.run(main()) == [None, None, None]
+
+
+class SyncService:
+    def __init__(self):
+        self.calls = []
+
+    def get_by_usernames(self, usernames):
+        self.calls.append((threading.current_thread(), current_tenant(), current_session(), usernames))
+        return {username: username.upper() for username in usernames}
+
+
+def test_sync_services_are_called_off_the_event_loop(configure, monkeypatch):
+    configure()
+    service = SyncService()
+    monkeypatch.setattr(authentication, "user_service", service)
+
+    async def main():
+        return await authentication._load_users([("a", "bob"), (None, "alice")]), threading.current_thread()
+
+    users, loop_thread = asyncio.run(main())
+    assert {key: user for key, (user, _) in users.items()} == {("a", "bob"): "BOB", (None, "alice"): "ALICE"}
+    assert [(tenant, usernames) for _, tenant, _, usernames in service.calls] == [("a", ["bob"]), (None, ["alice"])]
+    for thread, _, session, _ in service.calls:
+        assert thread is not loop_thread
+        assert session is not None